@@ -0,0 +1,248 @@
+import argparse
+import csv
+import gc
+import logging
+import os
+import time
+from datetime import datetime as dt
+from typing import Callable
+import numpy as np
+import pandas as pd
+from colorama import Fore, Style
+
+from benchmarks.synthetic import BENCHMARK_FILES_CONFIG, generate_files, load_datasets, open_files_config
+from src.dataset.appointment import AppointmentDataSet
+from src.dataset.dataset import DataSet
+from src.dataset.enrollment import EnrollmentDataSet
+from src.dataset.referral import ReferralDataSet
+from src.dataset.survey import SurveyDataSet
+from src.reports.followup import Followup
+from src.reports.referrals import Referrals
+from src.reports.survey_results import SurveyResults
+from src.utils.df_utils import filter_by_time_diff, filter_target_pattern_isin, sort_columns_by_date
+from src.utils.metrics_utils import measure, start_metrics, stop_metrics, take_metrics
+from src.utils.type_utils import FilterType
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+TARGET_DATE_RANGES = "September 2023 - April 2026"
+
+# a benchmark is set up (outside of the timing) from the loaded DataSets, and returns the function that is timed
+Benchmark = Callable[[dict[str, DataSet]], Callable[[], pd.DataFrame | None]]
+
+
+def _get_dataset(datasets: dict[str, DataSet], dataset_class: type[DataSet], index: int = 0) -> DataSet:
+    matches = [dataset for dataset in datasets.values() if isinstance(dataset, dataset_class)]
+    if len(matches) <= index:
+        raise ValueError(f"The benchmark files config needs at least {index + 1} {dataset_class.type_name} files")
+    return matches[index]
+
+
+def _followup(datasets: dict[str, DataSet]) -> Callable[[], pd.DataFrame | None]:
+    report = Followup(
+        appointments=_get_dataset(datasets, AppointmentDataSet).deep_copy(),
+        valid_schools=FilterType(None, None),
+        target_date_ranges=TARGET_DATE_RANGES,
+        require_followup=FilterType("Walk-In", "Headshot"),
+        followup_types=FilterType(None, None)
+    )
+    return lambda: (report.run_report(), report.get_results())[1]
+
+
+def _referrals(datasets: dict[str, DataSet]) -> Callable[[], pd.DataFrame | None]:
+    enrollment = _get_dataset(datasets, EnrollmentDataSet)
+    report = Referrals(
+        referrals=_get_dataset(datasets, ReferralDataSet).deep_copy(),
+        appointment=_get_dataset(datasets, AppointmentDataSet).deep_copy(),
+        valid_departments=FilterType(None, None),
+        complete_types=FilterType(["Career Advising", "Resume Review"], None),
+        enrollment=enrollment.deep_copy(),
+        merge_on=enrollment.get_col_name(EnrollmentDataSet.Column.STUDENT_CARD_ID)
+    )
+    return lambda: (report.run_report(), report.get_results())[1]
+
+
+def _survey_results(datasets: dict[str, DataSet]) -> Callable[[], pd.DataFrame | None]:
+    report = SurveyResults(
+        appointments=_get_dataset(datasets, AppointmentDataSet).deep_copy(),
+        survey_results=_get_dataset(datasets, SurveyDataSet).deep_copy(),
+        day_range=7,
+        target_date_ranges=TARGET_DATE_RANGES,
+        staff_emails=FilterType(None, None)
+    )
+    return lambda: (report.run_report(), report.get_results())[1]
+
+
+def _survey_results_sweep(datasets: dict[str, DataSet]) -> Callable[[], pd.DataFrame | None]:
+    surveys = [dataset for dataset in datasets.values() if isinstance(dataset, SurveyDataSet)]
+    report = SurveyResults(
+        appointments=_get_dataset(datasets, AppointmentDataSet).deep_copy(),
+        survey_results=[survey.deep_copy() for survey in surveys],
+        day_range=[3, 7, 14, 30],
+        target_date_ranges=TARGET_DATE_RANGES,
+        staff_emails=FilterType(None, None)
+    )
+    return lambda: (report.run_report(), report.get_results())[1]
+
+
+def _sort_columns_by_date(datasets: dict[str, DataSet]) -> Callable[[], pd.DataFrame | None]:
+    appointments = _get_dataset(datasets, AppointmentDataSet)
+    df = appointments.get_df().copy()
+    return lambda: sort_columns_by_date(df, appointments.get_col_name(AppointmentDataSet.Column.DATE))
+
+
+def _filter_target_pattern_isin(datasets: dict[str, DataSet]) -> Callable[[], pd.DataFrame | None]:
+    appointments = _get_dataset(datasets, AppointmentDataSet)
+    df = appointments.get_df().copy()
+    return lambda: (filter_target_pattern_isin(df, appointments.get_col_name(AppointmentDataSet.Column.APPOINTMENT_TYPE), ["Walk-In", "Advising"]), df)[1]
+
+
+def _filter_by_time_diff(datasets: dict[str, DataSet]) -> Callable[[], pd.DataFrame | None]:
+    # the DataFrames are sorted by date first, like SurveyResults sorts them before merging
+    appointments = _get_dataset(datasets, AppointmentDataSet)
+    survey = _get_dataset(datasets, SurveyDataSet)
+    appointment_date = appointments.get_col_name(AppointmentDataSet.Column.DATE)
+    survey_date = survey.get_col_name(SurveyDataSet.Column.DATE)
+    email = appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
+    appointments_df = sort_columns_by_date(appointments.get_df().copy(), appointment_date)
+    survey_df = sort_columns_by_date(survey.get_df().rename(columns={survey.get_col_name(SurveyDataSet.Column.STUDENT_EMAIL): email}), survey_date)
+    return lambda: filter_by_time_diff(survey_df, survey_date, appointments_df, appointment_date, 7, email)
+
+
+BENCHMARKS: dict[str, Benchmark] = {
+    "Followup": _followup,
+    "Referrals": _referrals,
+    "SurveyResults": _survey_results,
+    "SurveyResults_day_ranges": _survey_results_sweep,
+    "sort_columns_by_date": _sort_columns_by_date,
+    "filter_target_pattern_isin": _filter_target_pattern_isin,
+    "filter_by_time_diff": _filter_by_time_diff,
+}
+
+
+class BenchmarkResult():
+    def __init__(self, name: str, rows: int, seconds: float, cpu_seconds: float, rows_out: int | None, peak_memory: int | None) -> None:
+        self.name = name
+        self.rows = rows
+        self.seconds = seconds
+        self.cpu_seconds = cpu_seconds
+        self.rows_out = rows_out
+        self.peak_memory = peak_memory
+
+    def to_dict(self) -> dict:
+        return {
+            "benchmark": self.name,
+            "rows": self.rows,
+            "seconds": self.seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "rows_out": self.rows_out,
+            "peak_memory": self.peak_memory,
+        }
+
+
+def run_benchmark(name: str, datasets: dict[str, DataSet], rows: int, repeat: int = 3) -> BenchmarkResult:
+    # the fastest of repeat runs, since slower runs are slowed by something other than the benchmark
+    best = None
+    for _ in range(repeat):
+        timed = BENCHMARKS[name](datasets)
+        gc.collect()
+        with measure(name, "benchmark") as metric:
+            results = timed()
+            metric.rows_out = len(results) if isinstance(results, pd.DataFrame) else None
+        take_metrics()
+        if best is None or metric.wall < best.wall:
+            best = metric
+    return BenchmarkResult(name, rows, best.wall, best.cpu, best.rows_out, best.peak_memory)
+
+
+def run_benchmarks(sizes: list[int], names: list[str] | None = None, repeat: int = 3, memory: bool = False,
+                   files_config: str = BENCHMARK_FILES_CONFIG, seed: int = 0) -> list[BenchmarkResult]:
+    names = names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Invalid benchmark {name}. Must be one of {list(BENCHMARKS)}")
+    files = open_files_config(files_config)
+    results = []
+    # the benchmarks measure themselves, so metrics are recorded even if the run isn't otherwise measured
+    start_metrics(memory)
+    try:
+        for rows in sizes:
+            print(f'{Fore.CYAN}Generating {Fore.LIGHTMAGENTA_EX}{rows}{Fore.CYAN} synthetic appointments...{Style.RESET_ALL}')
+            datasets = load_datasets(files, generate_files(files, rows, seed=seed))
+            for name in names:
+                result = run_benchmark(name, datasets, rows, repeat)
+                results.append(result)
+                logging.info(f"{name} on {rows} rows took {result.seconds:.3f}s")
+                print(f'\t{Fore.LIGHTYELLOW_EX}{name} {Fore.GREEN}on {Fore.LIGHTMAGENTA_EX}{rows} {Fore.GREEN}rows took {Fore.LIGHTMAGENTA_EX}{result.seconds:.3f}s{Style.RESET_ALL}')
+            del datasets
+    finally:
+        stop_metrics()
+    return results
+
+
+def get_scaling(results: list[BenchmarkResult]) -> dict[str, float]:
+    # the exponent k of the curve seconds = c * rows^k that fits each benchmark best. 1 is linear
+    scaling = {}
+    for name in dict.fromkeys(result.name for result in results):
+        points = [(result.rows, result.seconds) for result in results if result.name == name and result.seconds > 0]
+        if len({rows for rows, _ in points}) < 2:
+            continue
+        rows, seconds = zip(*points)
+        scaling[name] = float(np.polyfit(np.log(rows), np.log(seconds), 1)[0])
+    return scaling
+
+
+def project_seconds(results: list[BenchmarkResult], name: str, rows: int) -> float | None:
+    # extends the fitted curve from the largest benchmarked size to rows
+    scaling = get_scaling(results)
+    if name not in scaling:
+        return None
+    largest = max((result for result in results if result.name == name), key=lambda result: result.rows)
+    return largest.seconds * (rows / largest.rows) ** scaling[name]
+
+
+def save_results(results: list[BenchmarkResult], results_dir: str, run_name: str) -> str:
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"benchmark_{run_name}.csv")
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(BenchmarkResult("", 0, 0, 0, None, None).to_dict()))
+        writer.writeheader()
+        writer.writerows(result.to_dict() for result in results)
+    return path
+
+
+def print_summary(results: list[BenchmarkResult], growth: float, years: int) -> None:
+    scaling = get_scaling(results)
+    largest = max(result.rows for result in results)
+    projected_rows = int(largest * (1 + growth) ** years)
+    print(f'{Fore.CYAN}Scaling (1.0 is linear) and projected time for {Fore.LIGHTMAGENTA_EX}{projected_rows}{Fore.CYAN} rows '
+          f'({growth:.0%} growth for {years} years from {largest} rows){Style.RESET_ALL}')
+    for name in dict.fromkeys(result.name for result in results):
+        if name not in scaling:
+            continue
+        projected = project_seconds(results, name, projected_rows)
+        logging.info(f"{name} scales with rows^{scaling[name]:.2f} and would take {projected:.3f}s on {projected_rows} rows")
+        print(f'\t{Fore.LIGHTYELLOW_EX}{name}{Fore.GREEN}: rows^{Fore.LIGHTMAGENTA_EX}{scaling[name]:.2f}{Fore.GREEN}, '
+              f'{Fore.LIGHTMAGENTA_EX}{projected:.3f}s{Style.RESET_ALL}')
+
+
+def main(args: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Times each report and df_utils hot path on synthetic Handshake exports of increasing size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="the numbers of appointment rows to benchmark")
+    parser.add_argument("--benchmarks", nargs="+", default=None, help=f"the benchmarks to run (default: all of {list(BENCHMARKS)})")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of times each benchmark is run. The fastest run is kept")
+    parser.add_argument("--memory", action="store_true", help="record the peak memory of each benchmark (slows every benchmark down)")
+    parser.add_argument("--files-config", default=BENCHMARK_FILES_CONFIG)
+    parser.add_argument("--results-dir", default="benchmark_results")
+    parser.add_argument("--growth", type=float, default=0.2, help="the yearly growth in rows to project to")
+    parser.add_argument("--years", type=int, default=3, help="the number of years of growth to project to")
+    parser.add_argument("--seed", type=int, default=0)
+    parsed = parser.parse_args(args)
+    start = time.perf_counter()
+    results = run_benchmarks(parsed.sizes, parsed.benchmarks, parsed.repeat, parsed.memory, parsed.files_config, parsed.seed)
+    path = save_results(results, parsed.results_dir, dt.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    print_summary(results, parsed.growth, parsed.years)
+    print(f'{Fore.GREEN}Saved benchmark results to {Fore.LIGHTYELLOW_EX}{path}{Fore.GREEN} in {time.perf_counter() - start:.1f}s{Style.RESET_ALL}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import argparse
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from colorama import Fore, Style
+
+from src.config.files_config import FilesConfig
+from src.dataset.appointment import AppointmentDataSet
+from src.dataset.appointment_status import AppointmentStatus
+from src.dataset.dataset import DataSet
+from src.dataset.enrollment import EnrollmentDataSet
+from src.dataset.referral import ReferralDataSet
+from src.dataset.survey import SurveyDataSet
+from src.utils.file_utils import dir_format
+
+BENCHMARK_FILES_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "files.config.json")
+
+# the number of rows each file type has for every appointment row. Enrollment has one row per student
+ROWS_PER_APPOINTMENT = {
+    SurveyDataSet.type_name: 0.1,
+    ReferralDataSet.type_name: 0.05,
+}
+APPOINTMENTS_PER_STUDENT = 4
+START_DATE = pd.Timestamp("2023-08-01")
+END_DATE = pd.Timestamp("2026-05-01")
+
+APPOINTMENT_TYPES = ["Walk-In", "Walk-In Headshot", "Career Advising", "Resume Review", "Mock Interview", "Internship Advising"]
+APPOINTMENT_TYPE_WEIGHTS = [0.3, 0.05, 0.25, 0.2, 0.1, 0.1]
+STATUSES = [
+    AppointmentStatus.COMPLETED.value,
+    AppointmentStatus.APPROVED.value,
+    AppointmentStatus.CANCELLED.value,
+    AppointmentStatus.NO_SHOW.value,
+    AppointmentStatus.STARTED.value
+]
+STATUS_WEIGHTS = [0.6, 0.15, 0.12, 0.08, 0.05]
+COLLEGES = ["College of Arts and Sciences", "School of Business Administration", "School of Engineering and Computer Science",
+            "School of Education and Human Services", "School of Nursing", "School of Health Sciences"]
+MAJORS = ["Biology", "Psychology", "Accounting", "Marketing", "Computer Science", "Mechanical Engineering", "Nursing",
+          "Communication", "Elementary Education", "Health Sciences"]
+CLASSES = ["Freshman", "Sophomore", "Junior", "Senior", "Masters", "Doctorate"]
+DEPARTMENTS = ["Athletics", "Academic Advising", "Housing", "Counseling Center", "Honors College"]
+FIRST_NAMES = ["Ava", "Liam", "Noah", "Emma", "Mia", "Elijah", "Amir", "Sofia", "Maya", "Lucas", "Zoe", "Omar", "Priya", "Chen", "Jada"]
+LAST_NAMES = ["Smith", "Johnson", "Nguyen", "Garcia", "Patel", "Kim", "Brown", "Davis", "Lopez", "Haddad", "Wilson", "Chen"]
+SURVEY_QUESTIONS = [
+    "1. How satisfied were you with your appointment?",
+    "2. How likely are you to recommend this appointment to a friend?",
+    "3. What could we do better?"
+]
+STAFF_COUNT = 25
+
+
+class _Students():
+    # every file describes the same students, so their emails, card ids and names match between files
+    def __init__(self, count: int, rng: np.random.Generator) -> None:
+        self.count = count
+        self.college = rng.integers(0, len(COLLEGES), count)
+        self.major = rng.integers(0, len(MAJORS), count)
+        self.year = rng.integers(0, len(CLASSES), count)
+        self.preferred = rng.random(count) < 0.1
+
+    @staticmethod
+    def emails(students: np.ndarray) -> pd.Series:
+        return "student" + pd.Series(students).astype(str) + "@oakland.edu"
+
+    @staticmethod
+    def card_ids(students: np.ndarray) -> pd.Series:
+        return "G" + pd.Series(students).astype(str).str.zfill(8)
+
+    @staticmethod
+    def first_names(students: np.ndarray) -> np.ndarray:
+        return np.array(FIRST_NAMES)[(students * 7919) % len(FIRST_NAMES)]
+
+    @staticmethod
+    def last_names(students: np.ndarray) -> np.ndarray:
+        return np.array(LAST_NAMES)[(students * 104729) % len(LAST_NAMES)]
+
+    def preferred_names(self, students: np.ndarray) -> np.ndarray:
+        return np.where(self.preferred[students], np.array(FIRST_NAMES)[(students * 31) % len(FIRST_NAMES)], None)
+
+
+def _dates(rng: np.random.Generator, rows: int) -> pd.Series:
+    seconds = rng.integers(0, int((END_DATE - START_DATE).total_seconds()), rows)
+    return pd.Series(START_DATE + pd.to_timedelta(seconds, unit='s'))
+
+
+def _format_dates(dates: pd.Series) -> pd.Series:
+    return dates.dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _get_headers(file: dict) -> dict[str, str]:
+    # columns are written with the header they have in the export, which is renamed to "name" when it is loaded
+    return {column: config.get("map", config["name"]) for column, config in file["column_names"].items()}
+
+
+def _appointments(rng: np.random.Generator, rows: int, students: _Students) -> tuple[dict[str, pd.Series | np.ndarray], pd.DataFrame]:
+    # also returns the student and date of each appointment, so surveys can be answered after them
+    student = rng.integers(0, students.count, rows)
+    dates = _dates(rng, rows)
+    columns = {
+        AppointmentDataSet.Column.DATE.value: _format_dates(dates),
+        AppointmentDataSet.Column.ID.value: np.arange(1, rows + 1),
+        AppointmentDataSet.Column.STAFF_EMAIL.value: "staff" + pd.Series(rng.integers(0, STAFF_COUNT, rows)).astype(str) + "@oakland.edu",
+        AppointmentDataSet.Column.APPOINTMENT_TYPE.value: rng.choice(APPOINTMENT_TYPES, rows, p=APPOINTMENT_TYPE_WEIGHTS),
+        AppointmentDataSet.Column.STUDENT_EMAIL.value: students.emails(student),
+        AppointmentDataSet.Column.STUDENT_COLLEGE.value: np.array(COLLEGES)[students.college[student]],
+        AppointmentDataSet.Column.STUDENT_MAJOR.value: np.array(MAJORS)[students.major[student]],
+        AppointmentDataSet.Column.STUDENT_CLASS.value: np.array(CLASSES)[students.year[student]],
+        AppointmentDataSet.Column.STUDENT_CARD_ID.value: students.card_ids(student),
+        AppointmentDataSet.Column.STUDENT_FIRST_NAME.value: students.first_names(student),
+        AppointmentDataSet.Column.STUDENT_PREFERRED_NAME.value: students.preferred_names(student),
+        AppointmentDataSet.Column.STUDENT_LAST_NAME.value: students.last_names(student),
+        AppointmentDataSet.Column.STATUS.value: rng.choice(STATUSES, rows, p=STATUS_WEIGHTS),
+        AppointmentDataSet.Column.DATE_SCHEDULED.value: _format_dates(dates - pd.to_timedelta(rng.integers(0, 21 * 24 * 3600, rows), unit='s')),
+    }
+    return columns, pd.DataFrame({"student": student, "date": dates})
+
+
+def _survey(rng: np.random.Generator, rows: int, students: _Students, appointments: pd.DataFrame) -> dict[str, pd.Series | np.ndarray]:
+    # most responses are made a few days after one of the student's appointments, the rest at random times
+    answered = rng.integers(0, len(appointments), rows)
+    student = appointments["student"].to_numpy()[answered]
+    dates = pd.Series(appointments["date"].to_numpy()[answered]) + pd.to_timedelta(rng.integers(0, 10 * 24 * 3600, rows), unit='s')
+    unmatched = rng.random(rows) < 0.2
+    student[unmatched] = rng.integers(0, students.count, unmatched.sum())
+    dates[unmatched] = _dates(rng, int(unmatched.sum())).to_numpy()
+    columns = {
+        SurveyDataSet.Column.DATE.value: _format_dates(dates),
+        SurveyDataSet.Column.ID.value: np.arange(1, rows + 1),
+        SurveyDataSet.Column.STUDENT_EMAIL.value: students.emails(student),
+        SurveyDataSet.Column.STUDENT_FIRST_NAME.value: students.first_names(student),
+        SurveyDataSet.Column.STUDENT_LAST_NAME.value: students.last_names(student),
+    }
+    columns[SURVEY_QUESTIONS[0]] = rng.integers(1, 6, rows)
+    columns[SURVEY_QUESTIONS[1]] = rng.integers(0, 11, rows)
+    columns[SURVEY_QUESTIONS[2]] = np.where(rng.random(rows) < 0.3, "More appointment times", None)
+    return columns
+
+
+def _referrals(rng: np.random.Generator, rows: int, students: _Students) -> dict[str, pd.Series | np.ndarray]:
+    student = rng.integers(0, students.count, rows)
+    # referral emails are sometimes saved twice, so some rows repeat a unique referral id
+    unique = np.arange(1, rows + 1)
+    repeated = rng.random(rows) < 0.05
+    unique[repeated] = np.maximum(unique[repeated] - 1, 1)
+    return {
+        ReferralDataSet.Column.DATE.value: _format_dates(_dates(rng, rows)),
+        ReferralDataSet.Column.ID.value: np.arange(1, rows + 1),
+        ReferralDataSet.Column.STAFF_EMAIL.value: "referrer" + pd.Series(rng.integers(0, STAFF_COUNT, rows)).astype(str) + "@oakland.edu",
+        ReferralDataSet.Column.STUDENT_EMAIL.value: students.emails(student),
+        ReferralDataSet.Column.STUDENT_COLLEGE.value: np.array(COLLEGES)[students.college[student]],
+        ReferralDataSet.Column.STUDENT_MAJOR.value: np.array(MAJORS)[students.major[student]],
+        ReferralDataSet.Column.STUDENT_CLASS.value: np.array(CLASSES)[students.year[student]],
+        ReferralDataSet.Column.STUDENT_CARD_ID.value: students.card_ids(student),
+        ReferralDataSet.Column.STUDENT_FIRST_NAME.value: students.first_names(student),
+        ReferralDataSet.Column.STUDENT_PREFERRED_NAME.value: students.preferred_names(student),
+        ReferralDataSet.Column.STUDENT_LAST_NAME.value: students.last_names(student),
+        ReferralDataSet.Column.UNIQUE_REFERRAL.value: unique,
+        ReferralDataSet.Column.REFERRING_DEPARTMENT.value: rng.choice(DEPARTMENTS, rows),
+    }
+
+
+def _enrollment(rng: np.random.Generator, students: _Students) -> dict[str, pd.Series | np.ndarray]:
+    student = np.arange(students.count)
+    return {
+        EnrollmentDataSet.Column.DATE.value: _format_dates(pd.Series(START_DATE, index=range(students.count))),
+        EnrollmentDataSet.Column.ID.value: student + 1,
+        # enrollment card ids are numbers, like the referral card ids are once they are normalized
+        EnrollmentDataSet.Column.STUDENT_CARD_ID.value: student,
+        "Major": np.array(MAJORS)[students.major],
+        "Class Level": np.array(CLASSES)[students.year],
+        "Credits": rng.integers(0, 140, students.count),
+    }
+
+
+def _to_df(file: dict, dataset_class: type[DataSet], columns: dict[str, pd.Series | np.ndarray]) -> pd.DataFrame:
+    # configured columns are named with their export header, columns the file doesn't configure are left out, and
+    # other columns (like survey questions) are kept as they are
+    headers = _get_headers(file)
+    column_ids = {column.value for column in dataset_class.Column}
+    df = pd.DataFrame({headers.get(column, column): pd.Series(values).to_numpy() for column, values in columns.items()
+                       if column in headers or column not in column_ids})
+    for column, header in headers.items():
+        if header not in df.columns:
+            df[header] = None
+    return df
+
+
+def generate_files(files: list[dict], rows: int, students: int | None = None, seed: int = 0) -> dict[str, pd.DataFrame]:
+    """
+    Generates synthetic Handshake exports for each file in a files config.
+
+    Args:
+        files (list[dict]): The "files" of a files.config.json.
+        rows (int): The number of appointment rows. The other files are sized relative to it.
+        students (int | None): The number of students, or None for one student every APPOINTMENTS_PER_STUDENT appointments.
+        seed (int): The random seed, so the same arguments always generate the same files.
+
+    Returns:
+        dict[str, pd.DataFrame]: Each file's id mapped to its export, with the headers the files config expects.
+    """
+    if not isinstance(rows, int) or rows < 1:
+        raise ValueError("rows must be a positive integer")
+    if students is None:
+        students = max(rows // APPOINTMENTS_PER_STUDENT, 1)
+    rng = np.random.default_rng(seed)
+    population = _Students(students, rng)
+    appointment_columns, appointments = _appointments(rng, rows, population)
+    exports = {}
+    for file in files:
+        if file["type"] == AppointmentDataSet.type_name:
+            columns = appointment_columns
+        elif file["type"] == SurveyDataSet.type_name:
+            columns = _survey(rng, max(int(rows * ROWS_PER_APPOINTMENT[SurveyDataSet.type_name]), 1), population, appointments)
+        elif file["type"] == ReferralDataSet.type_name:
+            columns = _referrals(rng, max(int(rows * ROWS_PER_APPOINTMENT[ReferralDataSet.type_name]), 1), population)
+        elif file["type"] == EnrollmentDataSet.type_name:
+            columns = _enrollment(rng, population)
+        else:
+            raise ValueError(f'Cannot generate {file["type"]} file. Invalid type')
+        exports[file["id"]] = _to_df(file, FilesConfig.get_dataset_class(file["type"]), columns)
+    return exports
+
+
+def load_datasets(files: list[dict], exports: dict[str, pd.DataFrame]) -> dict[str, DataSet]:
+    # the DataSets FilesConfig would load from the exports, without writing them to files first
+    datasets = {}
+    for file in files:
+        rename_cols, cols = FilesConfig.map_column_config(file["column_names"])
+        dataset_class = FilesConfig.get_dataset_class(file["type"])
+        datasets[file["id"]] = dataset_class(file["id"], exports[file["id"]].rename(columns=rename_cols), cols)
+    return datasets
+
+
+def write_files(files: list[dict], exports: dict[str, pd.DataFrame], out_dir: str | None = None) -> list[str]:
+    # each export is saved to its file's dir (or out_dir) with a name FilesConfig will find
+    paths = []
+    for file in files:
+        file_dir = out_dir or dir_format(file["dir"])
+        os.makedirs(file_dir, exist_ok=True)
+        path = os.path.join(file_dir, f'{file["must_contain"]}_{len(exports[file["id"]])}.csv')
+        exports[file["id"]].to_csv(path, index=False)
+        paths.append(path)
+        logging.info(f'Wrote {len(exports[file["id"]])} synthetic {file["type"]} rows to {path}')
+        print(f'{Fore.GREEN}Wrote {Fore.LIGHTMAGENTA_EX}{len(exports[file["id"]])} {Fore.GREEN}synthetic {Fore.LIGHTWHITE_EX}{file["type"]}{Fore.GREEN} rows to {Fore.LIGHTBLACK_EX}{path}{Style.RESET_ALL}')
+    return paths
+
+
+def open_files_config(files_config: str) -> list[dict]:
+    with open(files_config) as json_file:
+        return json.load(json_file)["files"]
+
+
+def main(args: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Writes synthetic Handshake exports for the files in a files config")
+    parser.add_argument("--files-config", default=BENCHMARK_FILES_CONFIG, help="the files config to match (default: the benchmark files config)")
+    parser.add_argument("--rows", type=int, default=10_000, help="the number of appointment rows")
+    parser.add_argument("--students", type=int, default=None, help="the number of students")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", default=None, help="the directory to write every file to instead of each file's dir")
+    parsed = parser.parse_args(args)
+    files = open_files_config(parsed.files_config)
+    write_files(files, generate_files(files, parsed.rows, parsed.students, parsed.seed), parsed.out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,207 @@
-from src.reports.report import Report
-from src.config.config import Config
-from src.config.reports_config import ReportsConfig
+# the CLI only imports the modules that load data (and pandas) when it runs reports, so --help, --list and
+# --validate return right away
+from src.config.config import FILES_CONFIG_FILE, REPORTS_CONFIG_FILE, Config
+from src.config.report_selection import get_report_name, get_used_files, select_reports, validate_configs
+from src.utils.profile_utils import PROFILERS, ProfileConfig, get_profile_config, start_profiling, stop_profiling
+from colorama import Fore, Style
 from datetime import datetime as dt
+import argparse
 import logging
+import os
+import sys
 
-logfile = f"logs/{dt.now().strftime('%Y-%m-%d_%H-%M-%S')}.log"
-logging.basicConfig(filename=logfile, encoding='utf-8', level=logging.DEBUG, filemode='w', format='%(levelname)s:%(asctime)s:[%(module)s] %(message)s')
-logging.info("Log started")
+LOG_DIR = "logs"
 
 
-class Driver():
-    def __init__(self) -> None:
-        self._config = Config()
-        self._config.load_config()
+def configure_logging() -> str:
+    # returns the name of the run, which the log and any profiles are named with
+    run_name = dt.now().strftime('%Y-%m-%d_%H-%M-%S')
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logfile = f"{LOG_DIR}/{run_name}.log"
+    logging.basicConfig(filename=logfile, encoding='utf-8', level=logging.DEBUG, filemode='w', format='%(levelname)s:%(asctime)s:[%(module)s] %(message)s')
+    logging.info("Log started")
+    return run_name
 
-        self._reports_config = ReportsConfig()
-        self._reports_config.load_reports()
 
-    def run(self):
-        self._run_reports()
+def parse_args(args: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Runs the reports in reports.config.json")
+    parser.add_argument("reports", nargs="*", metavar="REPORT",
+                        help="the names of the reports to run (default: every report). Only the files these reports use are loaded")
+    parser.add_argument("--list", action="store_true", help="list the reports and the files they use without loading any files")
+    parser.add_argument("--validate", action="store_true", help="check reports.config.json and files.config.json without loading any files")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep the files loaded after running the reports, and run the reports that use a file again when it has a new export")
+    parser.add_argument("--interval", type=float, default=5.0, metavar="SECONDS", help="how often --watch checks for new exports (default: 5)")
+    parser.add_argument("--serve", action="store_true", help="load the files once and serve the reports over HTTP instead of saving them")
+    parser.add_argument("--host", default="127.0.0.1", help="the address --serve listens on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="the port --serve listens on (default: 8000)")
+    parser.add_argument("--restore", metavar="MANIFEST",
+                        help="put the archive an archive_store manifest lists back together, saving it next to the manifest as a CSV file")
+    parser.add_argument("--history", action="store_true",
+                        help="print the rows of each run of the reports from the archive index in config.json, without loading any files")
+    parser.add_argument("--by", metavar="COLUMN", help="count the rows --history prints by the values of an archived column")
+    parser.add_argument("--since", metavar="YYYY-MM-DD", help="the first day of runs --history prints")
+    parser.add_argument("--until", metavar="YYYY-MM-DD", help="the last day of runs --history prints")
+    parser.add_argument("--output", metavar="PATH", help="where --restore saves the archive, or a CSV file --history saves the runs to instead of printing them")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the last run of the reports if it stopped partway through, saving only the reports it didn't save")
+    parser.add_argument("--profile", action="store_true", help="profile loading and each report, saving the profiles next to the log")
+    parser.add_argument("--profiler", default="auto", choices=PROFILERS,
+                        help="the profiler --profile uses (default: pyinstrument if it's installed and cProfile otherwise)")
+    return parser.parse_args(args)
 
-    def _getReports(self) -> list[Report]:
-        return self._reports_config.get_reports()
 
-    def _run_reports(self):
-        if not self._getReports():
-            return False
-        for report in self._getReports():
+def open_configs() -> tuple[dict | None, dict | None]:
+    reports_config = Config(REPORTS_CONFIG_FILE)
+    reports_config.load_config()
+    files_config = Config(FILES_CONFIG_FILE)
+    files_config.load_config()
+    return reports_config.config, files_config.config
 
-            report.run_report()
 
-            logging.info(f"Successfully ran {report.report.__class__.__name__} report")
-            report.save_archive()
-            logging.info(f"Saved archive of {report.report.__class__.__name__} report to {report.archive_dir}")
-            report.save_results()
-            logging.info(f"Saved results of {report.report.__class__.__name__} report to {report.results_dir}")
-        return True
+def list_reports(report_names: list[str] | None = None) -> int:
+    reports_config, files_config = open_configs()
+    if not reports_config or not isinstance(reports_config.get("reports"), list):
+        print(f'{Fore.RED}ERROR! {Fore.LIGHTRED_EX}No reports found in {Fore.LIGHTBLACK_EX}{REPORTS_CONFIG_FILE}{Style.RESET_ALL}')
+        return 1
+    files = files_config.get("files", []) if files_config else []
+    for report_index, report in select_reports(reports_config["reports"], report_names):
+        file_ids = [file.get("id") for file in get_used_files([report], files)]
+        print(f'{Fore.LIGHTMAGENTA_EX}{report_index}{Fore.CYAN}: {Fore.LIGHTYELLOW_EX}{get_report_name(report, report_index)} '
+              f'{Fore.LIGHTWHITE_EX}{report.get("type")}{Fore.CYAN} using {Fore.LIGHTBLACK_EX}{", ".join(file_ids) or "no files"}{Style.RESET_ALL}')
+    return 0
 
 
-Driver().run()
+def validate() -> int:
+    errors = validate_configs(*open_configs())
+    for error in errors:
+        print(f'{Fore.RED}ERROR! {Fore.LIGHTRED_EX}{error}{Style.RESET_ALL}')
+    if errors:
+        return 1
+    print(f'{Fore.GREEN}{REPORTS_CONFIG_FILE} and {FILES_CONFIG_FILE} are valid{Style.RESET_ALL}')
+    return 0
+
+
+def restore(manifest: str, output: str | None = None) -> int:
+    from src.reports.archive_store import ArchiveStore
+    if not ArchiveStore.is_manifest(manifest):
+        raise ValueError(f"{manifest} is not an archive manifest. Archive manifests end with {ArchiveStore.MANIFEST_EXTENSION}")
+    output = output or manifest[:-len(ArchiveStore.MANIFEST_EXTENSION)] + ".csv"
+    try:
+        data = ArchiveStore.load(manifest)
+    except FileNotFoundError:
+        raise ValueError(f"Cannot find the archive manifest {manifest}")
+    with open(output, 'wb') as file:
+        file.write(data)
+    print(f'{Fore.GREEN}Restored archive {Fore.LIGHTBLACK_EX}{manifest}{Fore.GREEN} to {Fore.LIGHTYELLOW_EX}{output}{Style.RESET_ALL}')
+    return 0
+
+
+def history(report_names: list[str] | None = None, by: str | None = None, since: str | None = None, until: str | None = None, output: str | None = None) -> int:
+    from src.config.report_selection import get_file_prefixes
+    from src.reports.archive_index import REPORT_CLASS_NAMES, get_archive_index, parse_date
+    import pandas as pd
+    config = Config()
+    config.load_config()
+    archive_index = get_archive_index(config.config)
+    if archive_index is None:
+        raise ValueError("No archive_index in config.json. Set it to the path of the catalog file to index archives")
+    start, end = parse_date(since), parse_date(until, end=True)
+    reports_config, _ = open_configs()
+    if not reports_config or not isinstance(reports_config.get("reports"), list):
+        raise ValueError(f"No reports found in {REPORTS_CONFIG_FILE}")
+    prefixes = [prefix for report in reports_config["reports"] if "file_prefix" in report for prefix in get_file_prefixes(report)]
+    frames = []
+    for report_index, report in select_reports(reports_config["reports"], report_names):
+        if not report.get("archive_dir"):
+            continue
+        for file_prefix in get_file_prefixes(report):
+            # archives saved before the index was set up are added to it the first time they are asked for
+            archive_index.sync(report["archive_dir"], file_prefix, REPORT_CLASS_NAMES.get(report["type"]),
+                               [prefix for prefix in prefixes if prefix != file_prefix and prefix.startswith(file_prefix)])
+            runs = archive_index.query(file_prefix, by, start, end)
+            runs.insert(0, "report", get_report_name(report, report_index))
+            runs.insert(1, "file_prefix", file_prefix)
+            frames.append(runs)
+    runs = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["report", "file_prefix", "run", "rows"])
+    if output:
+        runs.to_csv(output, index=False)
+        print(f'{Fore.GREEN}Saved {Fore.LIGHTMAGENTA_EX}{len(runs)}{Fore.GREEN} runs to {Fore.LIGHTYELLOW_EX}{output}{Style.RESET_ALL}')
+    elif runs.empty:
+        print(f'{Fore.YELLOW}No archived runs found{Style.RESET_ALL}')
+    else:
+        print(runs.to_string(index=False))
+    return 0
+
+
+def save_profiles() -> None:
+    config = get_profile_config()
+    if config is None:
+        return
+    # worker processes save their own profiles, so only the directory is reported
+    stop_profiling()
+    print(f'{Fore.GREEN}Saved {Fore.LIGHTWHITE_EX}{config.profiler}{Fore.GREEN} profiles to {Fore.LIGHTYELLOW_EX}{config.profile_dir}{Style.RESET_ALL}')
+    logging.info(f"Saved {config.profiler} profiles to {config.profile_dir}")
+
+
+def run(report_names: list[str] | None = None, profiler: str | None = None, watch_interval: float | None = None, resume: bool = False) -> int:
+    # reports are run once, or run and then watched if watch_interval is given
+    run_name = configure_logging()
+    if profiler:
+        start_profiling(ProfileConfig(LOG_DIR, run_name, profiler))
+    from src.driver import Driver
+    try:
+        if watch_interval is None:
+            Driver(report_names, resume).run()
+        else:
+            from src.watcher import Watcher
+            # the files that didn't change are kept loaded for the reruns
+            Watcher(Driver(report_names, resume, keep_files=True), watch_interval).run()
+    finally:
+        save_profiles()
+    return 0
+
+
+def serve(report_names: list[str] | None = None, host: str = "127.0.0.1", port: int = 8000) -> int:
+    configure_logging()
+    from src.config.reports_config import ReportsConfig
+    from src.server import ReportServer
+    # only the files the selected reports use are loaded, and the selected reports are the ones that can be served
+    from src.utils.engine_utils import get_engine
+    config = Config()
+    config.load_config()
+    reports_config = ReportsConfig(report_names=report_names, engine=get_engine(config.config),
+                                   timeline_dir=config.config.get("timeline_dir") if config.config else None)
+    reports_config.load_data()
+    try:
+        server = ReportServer(reports_config, host, port)
+    except OSError as e:
+        raise ValueError(f"Could not serve reports at {host}:{port}: {str(e)}")
+    server.serve_forever()
+    return 0
+
+
+def main(args: list[str] | None = None) -> int:
+    parsed = parse_args(args)
+    report_names = parsed.reports or None
+    try:
+        if parsed.validate:
+            return validate()
+        if parsed.list:
+            return list_reports(report_names)
+        if parsed.restore:
+            return restore(parsed.restore, parsed.output)
+        if parsed.history:
+            return history(report_names, parsed.by, parsed.since, parsed.until, parsed.output)
+        if parsed.serve:
+            if parsed.watch or parsed.profile or parsed.resume:
+                raise ValueError("--serve can't be used with --watch, --profile or --resume")
+            return serve(report_names, parsed.host, parsed.port)
+        return run(report_names, parsed.profiler if parsed.profile else None, parsed.interval if parsed.watch else None, parsed.resume)
+    except ValueError as e:
+        print(f'{Fore.RED}ERROR! {Fore.LIGHTRED_EX}{str(e)}{Style.RESET_ALL}')
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
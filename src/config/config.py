@@ -2,6 +2,8 @@ import json
 import logging
 
 DEFAULT_ENV_PATH = ".env"
+REPORTS_CONFIG_FILE = "reports.config.json"
+FILES_CONFIG_FILE = "files.config.json"
 
 
 class Config:
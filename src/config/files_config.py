@@ -1,23 +1,40 @@
 import logging
+import os
+import pandas as pd
 from colorama import Fore, Style
 
+from src.dataset.checkpoint import StageCheckpoint
 from src.dataset.dataset import DataSet
 from src.dataset.appointment import AppointmentDataSet
 from src.dataset.enrollment import EnrollmentDataSet
 from src.dataset.referral import ReferralDataSet
 from src.dataset.survey import SurveyDataSet
-from src.utils.df_utils import load_df
-from src.utils.file_utils import dir_format, filter_files, get_most_recent_file
-from src.config.config import Config
-
-FILES_CONFIG_FILE = "files.config.json"
+from src.utils.df_utils import get_csv_columns, load_df, read_df_chunks
+from src.utils.file_utils import dir_format, filter_files, get_file_fingerprint, get_most_recent_export, get_most_recent_file
+from src.utils.general_utils import get_canonical_hash
+from src.utils.metrics_utils import measure
+from src.utils.profile_utils import profile
+from src.utils.spill_utils import LinkedKeys, SpilledFrame, get_chunksize, get_partition_count, make_spill_dir, read_partition, spill_frame
+from src.utils.type_utils import ColumnProjection
+from src.config.config import FILES_CONFIG_FILE, Config
 
 
 class FilesConfig(Config):
+    # files that are split by student when they don't fit in memory. Survey responses and enrollment are loaded whole
+    PARTITIONED_TYPES = [AppointmentDataSet.type_name, ReferralDataSet.type_name]
+
     def __init__(self, config_file: str = FILES_CONFIG_FILE) -> None:
         super().__init__(config_file)
         self._files = []
         self._config = None
+        # the columns reports save from each file (by file id), so other columns aren't loaded
+        self.projections: dict[str, ColumnProjection] = {}
+        # the name, modified time and size of the export each file was loaded from (by file id)
+        self.exports: dict[str, tuple[str, float, int]] = {}
+        # the spill files of split files and the DataSets of files loaded whole (by file id), when files are partitioned
+        self._partitioned: dict[str, SpilledFrame | DataSet] = {}
+        # loaded files are read from the checkpoint instead of their exports while they don't change, if there is one
+        self.checkpoint: StageCheckpoint | None = None
 
     @property
     def files(self) -> list[DataSet]:
@@ -47,65 +64,312 @@ class FilesConfig(Config):
             cols[column] = column_config[column]["name"]
         return rename_cols, cols
 
+    def open_config(self) -> bool:
+        return self._open_config()
+
     def load_config(self) -> bool:
-        if not self._open_config():
+        if not self.open_config():
             raise ValueError("Cannot load config file")
         return self.load_files() is not None
 
-    def load_files(self) -> list[DataSet] | None:
+    @staticmethod
+    def get_dataset_class(type_name: str) -> type[DataSet] | None:
+        for dataset_class in [AppointmentDataSet, EnrollmentDataSet, ReferralDataSet, SurveyDataSet]:
+            if dataset_class.type_name == type_name:
+                return dataset_class
+        return None
+
+    @staticmethod
+    def get_loaded_columns(file: dict) -> dict[str, str]:
+        # maps each column in the file's header to its name once it is loaded
+        rename_cols, _ = FilesConfig.map_column_config(file["column_names"])
+        dataset_class = FilesConfig.get_dataset_class(file["type"]) or DataSet
+        columns = get_csv_columns(file_dir=dir_format(file["dir"]), must_contain=file["must_contain"])
+        return {column: dataset_class.normalize_column(rename_cols.get(column, column)) for column in columns}
+
+    def get_usecols(self, file: dict, headers: dict[str, dict[str, str]]) -> list[str] | None:
+        if file["id"] not in self.projections or file["id"] not in headers:
+            return None
+        _, cols = FilesConfig.map_column_config(file["column_names"])
+        # configured columns are used to filter and merge, and columns in other files may be merge keys or renamed by a merge
+        other_columns = set().union(*(set(header.values()) for file_id, header in headers.items() if file_id != file["id"]))
+        projection = self.projections[file["id"]].keep(set(cols.values()) | other_columns)
+        header = headers[file["id"]]
+        usecols = [column for column, loaded_column in header.items() if projection.wants(loaded_column)]
+        if len(usecols) == len(header):
+            return None
+        return usecols
+
+    def _get_headers(self, files: list[dict]) -> dict[str, dict[str, str]]:
+        headers = {}
+        if not self.projections:
+            return headers
+        for file in files:
+            try:
+                headers[file["id"]] = FilesConfig.get_loaded_columns(file)
+            except Exception as e:
+                logging.debug(f'Could not read the header of {file["id"]}, loading every column: {str(e)}')
+        return headers
+
+    def load_files(self, file_ids: list[str] | None = None) -> list[DataSet] | None:
+        # only the files in file_ids are loaded, if it is given
+        with profile("load"):
+            return self._load_files(file_ids)
+
+    def _load_files(self, file_ids: list[str] | None = None) -> list[DataSet] | None:
         logging.debug("Loading files...")
         if not self.config:
             self.files = []
             return None
 
         self.files = []
-        files = self.config["files"]
+        files = [file for file in self.config["files"] if file_ids is None or file["id"] in file_ids]
+        headers = self._get_headers(files)
         for file in files:
-            rename_cols, cols = FilesConfig.map_column_config(file["column_names"])
-            message = f'Loading new {file["type"]} file...'
-            logging.debug(f'{message}\n\t{file}')
-            print(f'{Fore.CYAN}Loading new {Fore.LIGHTWHITE_EX}{file["type"]}{Fore.CYAN} file...{Style.RESET_ALL}')
-            file["dir"] = dir_format(file["dir"])
-            valid_files = filter_files(
-                file_dir=file["dir"],
-                must_contain=file["must_contain"],
-                file_type=".csv"
-            )
-            if not valid_files:
-                logging.error(f'Cannot load {file["type"]} file. No valid files were found in {file["type"]["dir"]}')
+            dataset = self._load_file(file, headers)
+            if dataset is None:
                 break
+            self.files.append(dataset)
+
+        return self.files
+
+    def get_file_config(self, file_id: str) -> dict | None:
+        if not self.config:
+            return None
+        for file in self.config["files"]:
+            if file["id"] == file_id:
+                return file
+        return None
+
+    @staticmethod
+    def get_fingerprint(file: dict, file_loc: str) -> str:
+        return get_canonical_hash({
+            "file": get_file_fingerprint(file["dir"] + "\\" + file_loc),
+            "config": file
+        })
+
+    def reload_files(self, file_ids: list[str]) -> list[str]:
+        """
+        Loads the most recent export of loaded files again, keeping the other files loaded.
+
+        Args:
+            file_ids (list[str]): The ids of the files to load again.
+
+        Returns:
+            list[str]: The ids of the files that were loaded again. Files whose most recent export has the same
+            contents as the loaded DataSet are not loaded again.
+        """
+        reloaded = []
+        for file_id in file_ids:
+            file = self.get_file_config(file_id)
+            index = next((index for index, dataset in enumerate(self.files) if dataset.get_id() == file_id), None)
+            if file is None or index is None:
+                logging.warning(f"WARNING! Cannot reload {file_id}. It was not loaded")
+                continue
+            export = get_most_recent_export(file["dir"], file["must_contain"], ".csv")
+            if export is None or self.files[index].fingerprint == FilesConfig.get_fingerprint(file, export[0]):
+                logging.info(f"The most recent {file_id} file has not changed. It will not be loaded again")
+                self.exports[file_id] = export
+                continue
+            # the headers of the other loaded files are read too, since their columns may be merge keys
+            headers = self._get_headers([self.get_file_config(loaded.get_id()) for loaded in self.files])
+            with profile(f"reload_{file_id}"):
+                dataset = self._load_file(file, headers)
+            if dataset is None:
+                continue
+            self.files[index] = dataset
+            reloaded.append(file_id)
+        return reloaded
+
+    def _find_export(self, file: dict) -> str | None:
+        # the name of the most recent export of a file, or None if there isn't one
+        message = f'Loading new {file["type"]} file...'
+        logging.debug(f'{message}\n\t{file}')
+        print(f'{Fore.CYAN}Loading new {Fore.LIGHTWHITE_EX}{file["type"]}{Fore.CYAN} file...{Style.RESET_ALL}')
+        file["dir"] = dir_format(file["dir"])
+        valid_files = filter_files(
+            file_dir=file["dir"],
+            must_contain=file["must_contain"],
+            file_type=".csv"
+        )
+        if not valid_files:
+            logging.error(f'Cannot load {file["type"]} file. No valid files were found in {file["type"]["dir"]}')
+            return None
+        else:
+            logging.debug(f'Found valid file at {file["dir"]}')
+
+        file_loc = get_most_recent_file(valid_files)
+        logging.debug(f'\tFound most recent {file["type"]} file: {file_loc}')
+        print(f'\t{Fore.LIGHTGREEN_EX}Found most recent {Fore.LIGHTYELLOW_EX}{file["type"]}{Fore.LIGHTGREEN_EX} file: {Fore.LIGHTBLACK_EX}{file_loc}{Style.RESET_ALL}')
+        return file_loc
+
+    @staticmethod
+    def _make_dataset(file: dict, df: pd.DataFrame, cols: dict) -> DataSet | None:
+        dataset_class = FilesConfig.get_dataset_class(file["type"])
+        if dataset_class is None:
+            message = f'ERROR: Cannot load {file["type"]} file. Invalid type.'
+            logging.error(message)
+            print(f'{Fore.RED}ERROR: {Fore.LIGHTRED_EX}Cannot load {Fore.LIGHTYELLOW_EX}{file["type"]}{Fore.LIGHTRED_EX} file. Invalid type.{Style.RESET_ALL}')
+            return None
+        return dataset_class(file["id"], df, cols)
+
+    def _load_file(self, file: dict, headers: dict[str, dict[str, str]]) -> DataSet | None:
+        rename_cols, cols = FilesConfig.map_column_config(file["column_names"])
+        file_loc = self._find_export(file)
+        if file_loc is None:
+            return None
+        # the export is recorded before it is read, so a newer copy written while it loads is still seen as new
+        stat = os.stat(os.path.join(file["dir"], file_loc))
+        export = (file_loc, stat.st_mtime, stat.st_size)
+
+        usecols = self.get_usecols(file, headers)
+        if usecols is not None:
+            logging.debug(f'\tLoading {len(usecols)} of {len(headers[file["id"]])} columns from {file_loc}')
+        fingerprint = FilesConfig.get_fingerprint(file, file_loc)
+        load_key = StageCheckpoint.get_load_key(fingerprint, usecols)
+        with measure(f'{file["id"]}.load', "load") as metric:
+            df = self._load_checkpoint(file, load_key)
+            if df is None:
+                df = load_df(
+                    file_dir=file["dir"],
+                    must_contain=file["must_contain"],
+                    rename_columns=rename_cols,
+                    usecols=usecols
+                )
+                if self.checkpoint is not None:
+                    self.checkpoint.store(StageCheckpoint.get_key(load_key, []), df, {})
+            if metric:
+                metric.rows_out = len(df)
+        dataset = FilesConfig._make_dataset(file, df, cols)
+        if dataset is None:
+            return None
+        dataset.fingerprint = fingerprint
+        dataset.load_key = load_key
+        self.exports[file["id"]] = export
+        logging.debug(f'\tLoaded {dataset.__class__.__name__} from file: {file_loc}')
+        print(f'\t{Fore.GREEN}Loaded {Fore.LIGHTYELLOW_EX}{dataset.__class__.__name__}{Fore.GREEN} from file: {Fore.LIGHTBLACK_EX}{file_loc}{Style.RESET_ALL}')
+        return dataset
+
+    def _load_checkpoint(self, file: dict, load_key: str) -> pd.DataFrame | None:
+        # the DataFrame an export with the same contents was loaded into, if it was checkpointed
+        if self.checkpoint is None:
+            return None
+        loaded = self.checkpoint.load(StageCheckpoint.get_key(load_key, []))
+        if loaded is None:
+            return None
+        logging.debug(f'\tLoaded {file["id"]} from the checkpoint of its export')
+        return loaded[0]
+
+    def get_partition_count(self, file_ids: list[str], memory_budget: int) -> int:
+        # the partitions the files need to be split into for the memory budget (in MB), from the size of their exports
+        partitioned_bytes = 0
+        whole_bytes = 0
+        for file_id in file_ids:
+            file = self.get_file_config(file_id)
+            export = get_most_recent_export(dir_format(file["dir"]), file["must_contain"], ".csv") if file else None
+            if export is None:
+                continue
+            if file["type"] in FilesConfig.PARTITIONED_TYPES:
+                partitioned_bytes += export[2]
             else:
-                logging.debug(f'Found valid file at {file["dir"]}')
+                whole_bytes += export[2]
+        return get_partition_count(partitioned_bytes, whole_bytes, memory_budget)
 
-            file_loc = get_most_recent_file(valid_files)
-            logging.debug(f'\tFound most recent {file["type"]} file: {file_loc}')
-            print(f'\t{Fore.LIGHTGREEN_EX}Found most recent {Fore.LIGHTYELLOW_EX}{file["type"]}{Fore.LIGHTGREEN_EX} file: {Fore.LIGHTBLACK_EX}{file_loc}{Style.RESET_ALL}')
+    def spill_files(self, file_ids: list[str], partitions: int, memory_budget: int, spill_dir: str | None = None) -> None:
+        """
+        Splits the files that are split by student into partitions on disk, and loads the other files whole. The
+        DataSets of a partition are made by load_partition.
 
-            dataset = None
-            dataset_config = (
-                file["id"],
-                load_df(
+        Args:
+            file_ids (list[str]): The ids of the files to load.
+            partitions (int): The number of partitions the files are split into.
+            memory_budget (int): The memory reports can use, in MB, which sets how many rows are read at a time.
+            spill_dir (str | None): The directory spill files are written to. The system temp directory if None.
+        """
+        logging.info(f"Splitting files into {partitions} partitions to fit the memory budget of {memory_budget} MB")
+        print(f'{Fore.CYAN}Splitting files into {Fore.LIGHTMAGENTA_EX}{partitions}{Fore.CYAN} partitions to fit the memory budget of {Fore.LIGHTMAGENTA_EX}{memory_budget} MB{Style.RESET_ALL}')
+        self.files = []
+        self._partitioned = {}
+        path = make_spill_dir(spill_dir)
+        files = [file for file in self.config["files"] if file["id"] in file_ids]
+        headers = self._get_headers(files)
+        key_map = self._get_linked_students([file for file in files if file["type"] == ReferralDataSet.type_name], memory_budget)
+        for file in files:
+            if file["type"] not in FilesConfig.PARTITIONED_TYPES:
+                loaded = self._load_file(file, headers)
+            else:
+                loaded = self._spill_file(file, headers, partitions, memory_budget, path, key_map)
+            if loaded is None:
+                break
+            self._partitioned[file["id"]] = loaded
+
+    def _get_linked_students(self, files: list[dict], memory_budget: int) -> dict:
+        # referrals reports remove duplicate unique referrals even if they were saved for different students, so the
+        # students that share a unique referral are put in the same partition
+        linked = LinkedKeys()
+        for file in files:
+            rename_cols, cols = FilesConfig.map_column_config(file["column_names"])
+            if ReferralDataSet.Column.UNIQUE_REFERRAL.value not in cols:
+                continue
+            file_loc = get_most_recent_export(dir_format(file["dir"]), file["must_contain"], ".csv")
+            if file_loc is None:
+                continue
+            email_col = cols[ReferralDataSet.Column.STUDENT_EMAIL.value]
+            unique_col = cols[ReferralDataSet.Column.UNIQUE_REFERRAL.value]
+            file_columns = {name: column for column, name in rename_cols.items()}
+            for chunk in read_df_chunks(
+                file_dir=dir_format(file["dir"]),
+                must_contain=file["must_contain"],
+                rename_columns=rename_cols,
+                usecols=[file_columns.get(email_col, email_col), file_columns.get(unique_col, unique_col)],
+                chunksize=get_chunksize(dir_format(file["dir"]) + "\\" + file_loc[0], memory_budget)
+            ):
+                linked.add(chunk[email_col], chunk[unique_col])
+        return linked.get_map()
+
+    def _spill_file(self, file: dict, headers: dict[str, dict[str, str]], partitions: int, memory_budget: int, spill_dir: str, key_map: dict | None = None) -> SpilledFrame | None:
+        rename_cols, cols = FilesConfig.map_column_config(file["column_names"])
+        if AppointmentDataSet.Column.STUDENT_EMAIL.value not in cols:
+            raise ValueError(f'Cannot split {file["id"]} by student. It has no {AppointmentDataSet.Column.STUDENT_EMAIL.value} column')
+        file_loc = self._find_export(file)
+        if file_loc is None:
+            return None
+        stat = os.stat(os.path.join(file["dir"], file_loc))
+        export = (file_loc, stat.st_mtime, stat.st_size)
+
+        usecols = self.get_usecols(file, headers)
+        with measure(f'{file["id"]}.spill', "load") as metric:
+            spilled = spill_frame(
+                chunks=read_df_chunks(
                     file_dir=file["dir"],
                     must_contain=file["must_contain"],
-                    rename_columns=rename_cols
+                    rename_columns=rename_cols,
+                    usecols=usecols,
+                    chunksize=get_chunksize(file["dir"] + "\\" + file_loc, memory_budget)
                 ),
-                cols
+                key=cols[AppointmentDataSet.Column.STUDENT_EMAIL.value],
+                partitions=partitions,
+                spill_dir=spill_dir,
+                name=file["id"],
+                key_map=key_map
             )
-            if file["type"] == AppointmentDataSet.type_name:
-                dataset = AppointmentDataSet(*dataset_config)
-            elif file["type"] == EnrollmentDataSet.type_name:
-                dataset = EnrollmentDataSet(*dataset_config)
-            elif file["type"] == ReferralDataSet.type_name:
-                dataset = ReferralDataSet(*dataset_config)
-            elif file["type"] == SurveyDataSet.type_name:
-                dataset = SurveyDataSet(*dataset_config)
-            else:
-                message = f'ERROR: Cannot load {file["type"]} file. Invalid type.'
-                logging.error(message)
-                print(f'{Fore.RED}ERROR: {Fore.LIGHTRED_EX}Cannot load {Fore.LIGHTYELLOW_EX}{file["type"]}{Fore.LIGHTRED_EX} file. Invalid type.{Style.RESET_ALL}')
-                break
-            self.files.append(dataset)
-            logging.debug(f'\tLoaded {dataset.__class__.__name__} from file: {file_loc}')
-            print(f'\t{Fore.GREEN}Loaded {Fore.LIGHTYELLOW_EX}{dataset.__class__.__name__}{Fore.GREEN} from file: {Fore.LIGHTBLACK_EX}{file_loc}{Style.RESET_ALL}')
+            if metric:
+                metric.rows_out = spilled.rows
+        self.exports[file["id"]] = export
+        logging.debug(f'\tSplit {file["type"]} file into {partitions} partitions: {file_loc}')
+        print(f'\t{Fore.GREEN}Split {Fore.LIGHTYELLOW_EX}{file["type"]}{Fore.GREEN} file into {Fore.LIGHTMAGENTA_EX}{partitions}{Fore.GREEN} partitions: {Fore.LIGHTBLACK_EX}{file_loc}{Style.RESET_ALL}')
+        return spilled
 
+    def load_partition(self, partition: int) -> list[DataSet]:
+        # the rows of the split files for one partition's students, and every row of the files loaded whole
+        self.files = []
+        files = []
+        for file_id, loaded in self._partitioned.items():
+            if isinstance(loaded, SpilledFrame):
+                file = self.get_file_config(file_id)
+                _, cols = FilesConfig.map_column_config(file["column_names"])
+                # a partition has only some of the file's rows, so its results are never cached as the file's
+                loaded = FilesConfig._make_dataset(file, read_partition(loaded, partition), cols)
+            files.append(loaded)
+        self.files = files
         return self.files
@@ -0,0 +1,223 @@
+import os
+from src.utils.file_utils import dir_format
+
+# the file and report type names are kept here instead of being read from the DataSet and Report classes, so reports
+# can be listed, selected and validated without importing pandas
+APPOINTMENTS = 'appointments'
+SURVEY_RESULTS = 'survey_results'
+REFERRAL = 'referral'
+ENROLLMENT = 'enrollment'
+FILE_TYPES = [APPOINTMENTS, SURVEY_RESULTS, REFERRAL, ENROLLMENT]
+
+REPORT_TYPE_NAMES = ["survey_results", "followup", "referrals"]
+REQUIRED_FILE_KEYS = ["id", "type", "dir", "must_contain", "column_names"]
+PARTITION_TERMS = ["files", "column"]
+DEFAULT_ROWS_PER_CHUNK = 256
+# report keys that only change how results are saved, not the results a report makes
+OUTPUT_KEYS = ["name", "results_dir", "archive_dir", "remove_cols", "rename_cols", "final_cols", "results_format",
+               "archive_format", "partition_by", "delta", "archive_store"]
+REQUIRED_REPORT_KEYS = ["type", "file_prefix", "results_dir"]
+REQUIRED_REPORT_TYPE_KEYS = {
+    "survey_results": ["survey_id", "day_range"],
+    "followup": ["require_followup"],
+    "referrals": []
+}
+
+
+def get_report_name(report: dict, report_index: int) -> str:
+    # reports are named by their "name" key, or their file_prefix if it is a string
+    if report.get("name"):
+        return report["name"]
+    if isinstance(report.get("file_prefix"), str) and report["file_prefix"]:
+        return report["file_prefix"]
+    return f'{report.get("type")}_{report_index}'
+
+
+def get_survey_ids(report: dict) -> list[str]:
+    return report.get("survey_id") if isinstance(report.get("survey_id"), list) else [report.get("survey_id")]
+
+
+def get_survey_file_prefix(file_prefix: str | dict, survey_id: str | None = None, day_range: int | None = None) -> str:
+    if isinstance(file_prefix, dict):
+        if survey_id not in file_prefix:
+            raise ValueError(f"No file_prefix specified for survey {survey_id}")
+        file_prefix = file_prefix[survey_id]
+    elif survey_id is not None:
+        file_prefix = f"{file_prefix}{survey_id}_"
+    if day_range is not None:
+        file_prefix = f"{file_prefix}{day_range}days_"
+    return file_prefix
+
+
+def get_file_prefixes(report: dict) -> list[str]:
+    # the file prefixes a report's files are saved with. Survey results reports with a list of surveys or day ranges
+    # save one set of files for each
+    if report.get("type") != "survey_results":
+        return [report["file_prefix"]]
+    survey_ids = report.get("survey_id") if isinstance(report.get("survey_id"), list) else [None]
+    day_ranges = report.get("day_range") if isinstance(report.get("day_range"), list) else [None]
+    if survey_ids == [None] and day_ranges == [None]:
+        return [report["file_prefix"]]
+    return [get_survey_file_prefix(report["file_prefix"], survey_id, day_range) for survey_id in survey_ids for day_range in day_ranges]
+
+
+def select_reports(reports: list[dict], report_names: list[str] | None = None) -> list[tuple[int, dict]]:
+    """
+    Selects reports from a reports config by name.
+
+    Args:
+        reports (list[dict]): The "reports" of a reports.config.json.
+        report_names (list[str] | None): The names of the reports to select, or None to select every report.
+
+    Returns:
+        list[tuple[int, dict]]: Each selected report with its index (starting at 1) in the reports config.
+
+    Raises:
+        ValueError: If no report has one of the names.
+    """
+    indexed = [(report_index, report) for report_index, report in enumerate(reports, start=1)]
+    if report_names is None:
+        return indexed
+    names = {get_report_name(report, report_index) for report_index, report in indexed}
+    missing = [name for name in report_names if name not in names]
+    if missing:
+        raise ValueError(f"No reports named {', '.join(missing)}. Must be one of {sorted(names)}")
+    return [(report_index, report) for report_index, report in indexed if get_report_name(report, report_index) in report_names]
+
+
+def uses_file(report: dict, file: dict) -> bool:
+    if report.get("type") == "survey_results":
+        return file["type"] == APPOINTMENTS or (file["type"] == SURVEY_RESULTS and file["id"] in get_survey_ids(report))
+    if report.get("type") == "followup":
+        return file["type"] == APPOINTMENTS
+    if report.get("type") == "referrals":
+        return file["type"] in [REFERRAL, APPOINTMENTS, ENROLLMENT]
+    return False
+
+
+def get_used_files(reports: list[dict], files: list[dict]) -> list[dict]:
+    # the files at least one of the reports needs, in the order they are configured
+    return [file for file in files if any(uses_file(report, file) for report in reports)]
+
+
+def validate_files(files_config: dict | None) -> list[str]:
+    if not isinstance(files_config, dict) or not isinstance(files_config.get("files"), list):
+        return ["The files config must have a list of \"files\""]
+    errors = []
+    ids = set()
+    for file_index, file in enumerate(files_config["files"], start=1):
+        missing = [key for key in REQUIRED_FILE_KEYS if key not in file]
+        if missing:
+            errors.append(f"File {file_index} is missing {', '.join(missing)}")
+            continue
+        if file["id"] in ids:
+            errors.append(f'File {file_index} has the same id as another file: {file["id"]}')
+        ids.add(file["id"])
+        if file["type"] not in FILE_TYPES:
+            errors.append(f'File {file["id"]} has an invalid type {file["type"]}. Must be one of {FILE_TYPES}')
+        if not isinstance(file["column_names"], dict) or not all(isinstance(column, dict) and "name" in column for column in file["column_names"].values()):
+            errors.append(f'File {file["id"]} must map each column to a dictionary with a "name"')
+        if not os.path.isdir(dir_format(file["dir"])):
+            errors.append(f'File {file["id"]} has a dir that does not exist: {file["dir"]}')
+    return errors
+
+
+def validate_reports(reports_config: dict | None, files: list[dict]) -> list[str]:
+    if not isinstance(reports_config, dict) or not isinstance(reports_config.get("reports"), list):
+        return ["The reports config must have a list of \"reports\""]
+    errors = []
+    file_types = {file.get("type") for file in files}
+    survey_ids = {file.get("id") for file in files if file.get("type") == SURVEY_RESULTS}
+    for report_index, report in enumerate(reports_config["reports"], start=1):
+        name = get_report_name(report, report_index)
+        if report.get("type") not in REPORT_TYPE_NAMES:
+            errors.append(f'Report {name} has an invalid type {report.get("type")}. Must be one of {REPORT_TYPE_NAMES}')
+            continue
+        missing = [key for key in REQUIRED_REPORT_KEYS + REQUIRED_REPORT_TYPE_KEYS[report["type"]] if key not in report]
+        if missing:
+            errors.append(f'Report {name} is missing {", ".join(missing)}')
+            continue
+        if report["type"] == "survey_results":
+            unknown = [survey_id for survey_id in get_survey_ids(report) if survey_id not in survey_ids]
+            if unknown:
+                errors.append(f'Report {name} uses surveys that are not in the files config: {", ".join(map(str, unknown))}')
+        if report.get("partition_terms") is not None:
+            if report["type"] == "referrals":
+                errors.append(f"Report {name} can't be partitioned by term. Referrals reports have no target_date_ranges")
+            elif report["partition_terms"] not in PARTITION_TERMS:
+                errors.append(f'Report {name} has an invalid partition_terms {report["partition_terms"]}. Must be one of {PARTITION_TERMS}')
+            elif not report.get("target_date_ranges"):
+                errors.append(f"Report {name} must have target_date_ranges to be partitioned by term")
+        try:
+            get_partition_by(report)
+        except ValueError:
+            errors.append(f'Report {name} has an invalid partition_by {report["partition_by"]}. Must be a column name or a list of column names')
+        try:
+            if get_delta(report)[0] and not report.get("archive_dir"):
+                errors.append(f"Report {name} must have an archive_dir to save a delta")
+        except ValueError:
+            errors.append(f'Report {name} has an invalid delta {report["delta"]}. Must be true or a dictionary with a "key"')
+        try:
+            if get_archive_store(report) and not report.get("archive_dir"):
+                errors.append(f"Report {name} must have an archive_dir to store archives as chunks")
+        except ValueError:
+            errors.append(f'Report {name} has an invalid archive_store {report["archive_store"]}. Must be true or a dictionary with a "rows_per_chunk"')
+        needed = {APPOINTMENTS} | ({REFERRAL, ENROLLMENT} if report["type"] == "referrals" else set())
+        if not needed <= file_types:
+            errors.append(f'Report {name} needs {", ".join(sorted(needed - file_types))} files')
+    return errors
+
+
+def get_run_config(report: dict) -> dict:
+    # the keys of a report config entry that change the results it makes, so results can be reused when only the
+    # way they are saved changes. The columns a report loads depend on its saved columns, which cached results are
+    # checked for when they are loaded
+    return {key: value for key, value in report.items() if key not in OUTPUT_KEYS}
+
+
+def get_partition_by(report: dict) -> list[str]:
+    # the results columns (named after rename_cols is applied) a report's results are split into files by
+    partition_by = report.get("partition_by")
+    if partition_by is None:
+        return []
+    if isinstance(partition_by, str):
+        partition_by = [partition_by]
+    if not isinstance(partition_by, list) or not partition_by or not all(isinstance(col, str) and col for col in partition_by):
+        raise ValueError(f"Invalid partition_by {partition_by}. Must be a column name or a list of column names")
+    return partition_by
+
+
+def get_delta(report: dict) -> tuple[bool, list[str] | None]:
+    # whether only the changes since the last archive are saved, and the results columns (named after rename_cols is
+    # applied) rows are matched by. The report's own row key is used if "delta" is true instead of a dictionary
+    delta = report.get("delta")
+    if delta is None or delta is False:
+        return False, None
+    if delta is True:
+        return True, None
+    key = delta.get("key") if isinstance(delta, dict) else None
+    if isinstance(key, str):
+        key = [key]
+    if not isinstance(key, list) or not key or not all(isinstance(col, str) and col for col in key):
+        raise ValueError(f"Invalid delta {delta}. Must be true or a dictionary with a \"key\" column name or list of column names")
+    return True, key
+
+
+def get_archive_store(report: dict) -> int | None:
+    # the average number of rows in each chunk archives are stored in, or None if archives are saved as whole files
+    archive_store = report.get("archive_store")
+    if archive_store is None or archive_store is False:
+        return None
+    if archive_store is True:
+        return DEFAULT_ROWS_PER_CHUNK
+    rows_per_chunk = archive_store.get("rows_per_chunk", DEFAULT_ROWS_PER_CHUNK) if isinstance(archive_store, dict) else None
+    if not isinstance(rows_per_chunk, int) or isinstance(rows_per_chunk, bool) or rows_per_chunk < 1:
+        raise ValueError(f"Invalid archive_store {archive_store}. Must be true or a dictionary with a \"rows_per_chunk\" greater than or equal to 1")
+    return rows_per_chunk
+
+
+def validate_configs(reports_config: dict | None, files_config: dict | None) -> list[str]:
+    # the problems with the configs that would keep reports from loading, without loading any files
+    errors = validate_files(files_config)
+    files = files_config["files"] if isinstance(files_config, dict) and isinstance(files_config.get("files"), list) else []
+    return errors + validate_reports(reports_config, files)
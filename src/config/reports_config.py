@@ -2,30 +2,59 @@ import json
 import logging
 from colorama import Style, Fore
 
-from src.config.config import Config
+from src.config.config import REPORTS_CONFIG_FILE, Config
 from src.config.files_config import FilesConfig
+from src.config.report_selection import PARTITION_TERMS, get_archive_store, get_delta, get_partition_by, get_report_name, get_run_config, get_survey_file_prefix, get_used_files, select_reports, uses_file
 
+from src.reports.archive_store import ArchiveStore
+from src.reports.cache import ResultCache
+from src.reports.executor import ParallelReportExecutor, ReportExecutor
 from src.reports.followup import Followup
+from src.reports.output import OutputSink
 from src.reports.referrals import Referrals
 from src.reports.report import Report
+from src.reports.stages import StageGraph
 from src.dataset.appointment import AppointmentDataSet
+from src.dataset.checkpoint import StageCheckpoint
 from src.dataset.dataset import DataSet
 from src.dataset.enrollment import EnrollmentDataSet
 from src.dataset.referral import ReferralDataSet
 from src.dataset.survey import SurveyDataSet
-from src.reports.survey_results import SurveyResults
-from src.utils.type_utils import FilterType
+from src.dataset.timeline import Timeline, get_timeline
+from src.reports.survey_results import SurveyResults, SurveyResultsView
+from src.utils.engine_utils import PANDAS
+from src.utils.general_utils import get_canonical_hash
+from src.utils.type_utils import ColumnProjection, FilterType
 
-REPORTS_CONFIG_FILE = "reports.config.json"
+REPORT_TYPES: dict[str, type[Report]] = {
+    "survey_results": SurveyResults,
+    "followup": Followup,
+    "referrals": Referrals
+}
 
 
 class ReportsConfig(Config):
-    def __init__(self, config_file: str = REPORTS_CONFIG_FILE, files_config_file: str | None = None) -> None:
+    def __init__(self, config_file: str = REPORTS_CONFIG_FILE, files_config_file: str | None = None, report_names: list[str] | None = None,
+                 engine: str = PANDAS, memory_budget: int | None = None, spill_dir: str | None = None, timeline_dir: str | None = None,
+                 checkpoint: StageCheckpoint | None = None) -> None:
+        # only the configs are read here. Files are loaded by load_data (or load_reports), and only the files the
+        # selected reports (named by report_names, or every report) use are loaded
         super().__init__(config_file)
-        if files_config_file:
-            self._files = FilesConfig(files_config_file)
-        else:
-            self._files = FilesConfig()
+        self._report_names = report_names
+        # followup and referrals reports run with this engine. Survey results reports always run with pandas
+        self._engine = engine
+        # files that don't fit in the memory budget (in MB) are split by student into partitions, written to spill_dir
+        self._memory_budget = memory_budget
+        self._spill_dir = spill_dir
+        # the timeline of the loaded files is saved to timeline_dir, and loaded from it while the files don't change
+        self._timeline_dir = timeline_dir
+        self._timeline = None
+        # loaded files and the DataSets their stages make are checkpointed, if there is a checkpoint
+        self._checkpoint = checkpoint
+        self._partitions = 1
+        self._partition = 0
+        self._loaded_report_names = None
+        self._data_loaded = False
         self._referrals = None
         self._surveys = None
         self._appointments = None
@@ -42,12 +71,81 @@ class ReportsConfig(Config):
             self.config = None
         finally:
             self._reports = None
+            self._stage_graph = None
             if files_config_file:
                 self._files = FilesConfig(files_config_file)
             else:
                 self._files = FilesConfig()
-            self._files.load_config()
+            self._files.checkpoint = checkpoint
+
+    def get_selected_reports(self) -> list[tuple[int, dict]]:
+        if not self.config or "reports" not in self.config:
+            return []
+        return select_reports(self.config["reports"], self._report_names)
+
+    def load_data(self) -> list[DataSet]:
+        if not self._files.open_config():
+            raise ValueError("Cannot load config file")
+        files = self._files.config["files"] if self._files.config else []
+        used_files = get_used_files([report for _, report in self.get_selected_reports()], files)
+        if len(used_files) < len(files):
+            logging.info(f"Loading {len(used_files)} of {len(files)} files for the selected reports")
+        self._files.projections = self.get_file_projections(used_files)
+        file_ids = [file["id"] for file in used_files]
+        self._partitions = self._files.get_partition_count(file_ids, self._memory_budget) if self._memory_budget else 1
+        if self._partitions > 1:
+            self._files.spill_files(file_ids, self._partitions, self._memory_budget, self._spill_dir)
+            self._files.load_partition(0)
+        else:
+            self._files.load_files(file_ids)
+        self._partition = 0
+        self.load_files()
+        self._data_loaded = True
+        return self.get_files()
+
+    def get_files_config(self) -> FilesConfig:
+        return self._files
+
+    def reload_files(self, file_ids: list[str]) -> list[str]:
+        if self._partitions > 1:
+            # a partition only has some of a file's rows, so every file is split again
+            self.load_data()
+            return file_ids
+        # the other loaded files are kept, so only the changed files are parsed again
+        reloaded = self._files.reload_files(file_ids)
         self.load_files()
+        return reloaded
+
+    def get_dependent_reports(self, file_ids: list[str]) -> list[str]:
+        # the names of the selected reports that use any of the files
+        files = [file for file in (self._files.config["files"] if self._files.config else []) if file["id"] in file_ids]
+        return [get_report_name(report, report_index) for report_index, report in self.get_selected_reports() if get_used_files([report], files)]
+
+    def get_partition_count(self) -> int:
+        # the number of partitions the files are split into, 1 if they fit in the memory budget
+        return self._partitions
+
+    def load_partition(self, partition: int) -> tuple[list[Report], StageGraph]:
+        """
+        Loads the reports of the last load_reports call on one partition of the files.
+
+        Args:
+            partition (int): The partition to load.
+
+        Returns:
+            tuple[list[Report], StageGraph]: The reports, in the same order for every partition, and their stage graph.
+        """
+        if partition != self._partition:
+            # the loaded partition is let go before the next one is read
+            self._reports = None
+            self._stage_graph = None
+            self._files.files = []
+            self.load_files()
+            self._files.load_partition(partition)
+            self._partition = partition
+            self.load_files()
+            self.load_reports(self._loaded_report_names)
+        return self.get_reports(), self.get_stage_graph()
 
     def get_files(self) -> list[DataSet]:
         if not self._files:
@@ -59,11 +157,28 @@ class ReportsConfig(Config):
             raise ValueError("Reports not initialized")
         return self._reports
 
+    def get_stage_graph(self) -> StageGraph:
+        if not self._stage_graph:
+            raise ValueError("Reports not initialized")
+        return self._stage_graph
+
     def load_config(self):
         super().load_config()
         self.load_files()
 
+    def get_timeline(self) -> Timeline:
+        # built the first time a report uses it, once for every report of the loaded files
+        if self._timeline is None:
+            # a partition only has some of a file's rows, so its timeline isn't saved
+            self._timeline = get_timeline(self.get_files(), self._timeline_dir if self._partitions == 1 else None)
+        return self._timeline
+
+    def release_timeline(self) -> None:
+        # the reports that use the timeline keep it until they are let go, so it's let go with the last of them
+        self._timeline = None
+
     def load_files(self):
+        self._timeline = None
         self._appointments = []
         self._surveys = []
         self._enrollment = None
@@ -105,66 +220,149 @@ class ReportsConfig(Config):
         return None
 
     # TODO: Allow for specification in config of what file(s) to load each report for (use list of files.config.json ids)
-    def load_reports(self) -> list[Report] | None:
+    def load_reports(self, report_names: list[str] | None = None) -> list[Report] | None:
+        # only the selected reports in report_names are loaded, if it is given
         if not self.config:
             logging.error("ERROR! No reports config initialized. Cannot load reports")
             print(f'{Fore.RED}ERROR! {Fore.LIGHTRED_EX}No {Fore.LIGHTWHITE_EX}reports config {Fore.LIGHTRED_EX}initialized. Cannot load reports.{Style.RESET_ALL}')
             return None
 
+        reports = self.get_selected_reports()
+        if report_names is not None:
+            reports = [(report_index, report) for report_index, report in reports if get_report_name(report, report_index) in report_names]
+        if not self._data_loaded:
+            self.load_data()
+        self._loaded_report_names = report_names
         self._reports = []
 
-        reports = self.config["reports"]
-
         logging.info(f"Loading {len(reports)} reports from {self.config_file}")
         print(f'{Fore.CYAN}Loading {Fore.LIGHTMAGENTA_EX}{len(reports)}{Fore.CYAN} reports from {Fore.LIGHTBLACK_EX}{self.config_file}{Style.RESET_ALL}')
 
-        report_index = 0
-        for report in reports:
-            report_index += 1
-            # TODO: Refactor this to use a function for key checking
-            required_keys = ["type", "file_prefix", "results_dir"]
-
-            if not self.validate_keys(
-                required_keys=required_keys,
-                warning_keys=[],
-                report=report,
-                report_index=report_index
-            ):
-                logging.error(f"\tERROR! Report {report_index} could not be loaded due to missing essential keys")
-                print(f'\t{Fore.RED}ERROR! {Fore.LIGHTRED_EX}Report {Fore.LIGHTMAGENTA_EX}{report_index} {Fore.LIGHTRED_EX}could not be loaded due to missing essential keys{Style.RESET_ALL}')
+        for report_index, report in reports:
+            if not self._load_report(report, report_index):
                 break
+        self._set_projections()
+        self._set_timeline()
+        self._set_checkpoint()
+        # reports that start with the same filters on the same file share the filtered DataSets
+        self._stage_graph = StageGraph(self._reports, self._checkpoint)
+        return self._reports
 
-            logging.debug(f"\tLoading {report['type']} report from {self.config_file} at index {report_index}")
-            print(f'\t{Fore.CYAN}Loading {Fore.LIGHTWHITE_EX}{report["type"]}{Fore.CYAN} report from {Fore.LIGHTBLACK_EX}{self.config_file}{Fore.CYAN} at index {Fore.LIGHTMAGENTA_EX}{report_index}{Style.RESET_ALL}')
-            if report["type"] == "survey_results":
-                for appointment in self.get_appointments():
-                    self.load_survey_results_report(report, report_index, appointment)
-            elif report["type"] == "followup":
+    def _load_report(self, report: dict, report_index: int) -> bool:
+        # adds the reports for a config entry to the loaded reports. Returns False if the entry is missing essential keys
+        # TODO: Refactor this to use a function for key checking
+        required_keys = ["type", "file_prefix", "results_dir"]
+
+        if not self.validate_keys(
+            required_keys=required_keys,
+            warning_keys=[],
+            report=report,
+            report_index=report_index
+        ):
+            logging.error(f"\tERROR! Report {report_index} could not be loaded due to missing essential keys")
+            print(f'\t{Fore.RED}ERROR! {Fore.LIGHTRED_EX}Report {Fore.LIGHTMAGENTA_EX}{report_index} {Fore.LIGHTRED_EX}could not be loaded due to missing essential keys{Style.RESET_ALL}')
+            return False
+
+        logging.debug(f"\tLoading {report['type']} report from {self.config_file} at index {report_index}")
+        print(f'\t{Fore.CYAN}Loading {Fore.LIGHTWHITE_EX}{report["type"]}{Fore.CYAN} report from {Fore.LIGHTBLACK_EX}{self.config_file}{Fore.CYAN} at index {Fore.LIGHTMAGENTA_EX}{report_index}{Style.RESET_ALL}')
+        if report["type"] == "survey_results":
+            for appointment in self.get_appointments():
+                self.load_survey_results_report(report, report_index, appointment)
+        elif report["type"] == "followup":
+            for appointment in self.get_appointments():
+                self.load_followup_report(report, report_index, appointment)
+        elif report["type"] == "referrals":
+            for referral in self.get_referrals():
                 for appointment in self.get_appointments():
-                    self.load_followup_report(report, report_index, appointment)
-            elif report["type"] == "referrals":
-                for referral in self.get_referrals():
-                    for appointment in self.get_appointments():
-                        self.load_referrals_report(report, report_index, referral, appointment)
-            else:
-                logging.error(f"\tWARNING: Report {report_index} could not be loaded. Invalid type {report['type']}. This report will be skipped")
-                print(f'\t{Fore.YELLOW}WARNING: {Fore.LIGHTYELLOW_EX}Report {Fore.LIGHTMAGENTA_EX}{report_index} {Fore.LIGHTYELLOW_EX}could not be loaded. Invalid type {Fore.LIGHTWHITE_EX}{report["type"]}{Fore.LIGHTYELLOW_EX}. This report will be skipped{Style.RESET_ALL}')
-                continue
-        return self._reports
+                    self.load_referrals_report(report, report_index, referral, appointment)
+        else:
+            logging.error(f"\tWARNING: Report {report_index} could not be loaded. Invalid type {report['type']}. This report will be skipped")
+            print(f'\t{Fore.YELLOW}WARNING: {Fore.LIGHTYELLOW_EX}Report {Fore.LIGHTMAGENTA_EX}{report_index} {Fore.LIGHTYELLOW_EX}could not be loaded. Invalid type {Fore.LIGHTWHITE_EX}{report["type"]}{Fore.LIGHTYELLOW_EX}. This report will be skipped{Style.RESET_ALL}')
+        return True
+
+    def build_reports(self, report: dict, report_index: int = 0) -> list[Report]:
+        """
+        Makes the reports for a config entry from the loaded files, without changing the loaded reports.
+
+        Args:
+            report (dict): A report config entry, like the entries of reports.config.json.
+            report_index (int): The index the entry is logged with.
+
+        Returns:
+            list[Report]: The reports for the entry (more than one if it has multiple surveys or day ranges).
 
-    def run_reports(self):
+        Raises:
+            ValueError: If no reports could be made from the entry.
+        """
+        loaded_reports = self._reports
+        self._reports = []
+        try:
+            self._load_report(report, report_index)
+            if not self._reports:
+                raise ValueError(f"No {report.get('type')} reports could be made from the given parameters")
+            self._set_projections()
+            self._set_timeline()
+            self._set_checkpoint()
+            return self._reports
+        finally:
+            self._reports = loaded_reports
+
+    def _set_projections(self) -> None:
+        # reports that share a run (e.g. the surveys of a multi-survey report) keep the columns any of them save
+        projections: dict[int, tuple[Report, ColumnProjection]] = {}
+        for report in self.get_reports():
+            shared_report = report.report.get_shared_report()
+            projection = report.get_projection()
+            if id(shared_report) in projections:
+                projection = projections[id(shared_report)][1].union(projection)
+            projections[id(shared_report)] = (shared_report, projection)
+        for shared_report, projection in projections.values():
+            if not projection.is_all():
+                shared_report.set_projection(projection)
+
+    def _set_timeline(self) -> None:
+        for report in self.get_reports():
+            shared_report = report.report.get_shared_report()
+            if shared_report.uses_timeline():
+                shared_report.set_timeline(self.get_timeline())
+
+    def _set_checkpoint(self) -> None:
+        if self._checkpoint is None:
+            return
+        for report in self.get_reports():
+            report.report.get_shared_report().set_checkpoint(self._checkpoint)
+
+    @staticmethod
+    def uses_file(report: dict, file: dict) -> bool:
+        return uses_file(report, file)
+
+    def get_file_projections(self, files: list[dict]) -> dict[str, ColumnProjection]:
+        # the columns each file needs for the reports that use it. Files no report uses are loaded in full
+        projections: dict[str, ColumnProjection] = {}
+        for _, report in self.get_selected_reports():
+            if report.get("type") not in REPORT_TYPES:
+                continue
+            keep_cols = get_partition_by(report) + (get_delta(report)[1] or [])
+            projection = ColumnProjection.from_report(report.get("final_cols"), report.get("remove_cols"), report.get("rename_cols") or None, keep_cols)
+            merge_on = report.get("merge_enrollment") if report.get("type") == "referrals" else None
+            for file in files:
+                if not ReportsConfig.uses_file(report, file):
+                    continue
+                file_projection = projection.with_suffixes(REPORT_TYPES[report["type"]].merge_suffixes.get(file["type"], []))
+                if merge_on:
+                    file_projection = file_projection.keep([merge_on] if isinstance(merge_on, str) else merge_on)
+                if file["id"] in projections:
+                    file_projection = projections[file["id"]].union(file_projection)
+                projections[file["id"]] = file_projection
+        return {file_id: projection for file_id, projection in projections.items() if not projection.is_all()}
+
+    def run_reports(self, workers: int = 1, cache: ResultCache | None = None):
         if not self._reports:
             raise ValueError("Reports not initialized. \"load_reports()\" must be called first")
-        for report in self._reports:
-            if not isinstance(report, Report):
-                raise ValueError("Reports must be of type Report")
-            report.run_report()
-
-            logging.info(f"Successfully ran {report.__class__.__name__} report")
-            report.save_archive()
-            logging.info(f"Saved archive of {report.__class__.__name__} report to {report.archive_dir}")
-            report.save_results()
-            logging.info(f"Saved results of {report.__class__.__name__} report to {report.results_dir}")
+        if workers == 1:
+            ReportExecutor(self._reports, self._stage_graph, cache).run()
+        else:
+            ParallelReportExecutor(self._reports, workers, self._stage_graph, cache).run()
 
     def load_survey_results_report(self, report: dict, report_index: int, appointment: AppointmentDataSet):
         if not isinstance(self._reports, list):
@@ -179,18 +377,24 @@ class ReportsConfig(Config):
         ):
             return
 
-        survey_id = report["survey_id"]
-        survey = self.get_survey_by_id(survey_id)
-        if survey is None:
-            logging.error(f"ERROR! No survey was found with the ID "
-                          f"{survey_id}")
-            return
-        else:
+        multi_survey = isinstance(report["survey_id"], list)
+        survey_ids = report["survey_id"] if multi_survey else [report["survey_id"]]
+        surveys = []
+        for survey_id in survey_ids:
+            survey = self.get_survey_by_id(survey_id)
+            if survey is None:
+                logging.error(f"ERROR! No survey was found with the ID "
+                              f"{survey_id}")
+                continue
             logging.info(f"Found survey with id {survey_id}")
+            surveys.append(survey)
+        if not surveys:
+            return
 
+        # a list of survey ids shares one appointments copy and a single merge for all of the surveys
         report_obj = SurveyResults(
             appointments=appointment.deep_copy(),
-            survey_results=survey.deep_copy(),
+            survey_results=[survey.deep_copy() for survey in surveys] if multi_survey else surveys[0].deep_copy(),
             day_range=report["day_range"],
             target_date_ranges=report["target_date_ranges"],
             staff_emails=FilterType.get_include_exclude(
@@ -201,18 +405,77 @@ class ReportsConfig(Config):
                 report_index=report_index,
                 report_type="SurveyResults"
             ),
+            partition_terms=ReportsConfig.get_partition_terms(report) is not None
         )
+        multi_day_range = isinstance(report["day_range"], list)
+        if not multi_survey and not multi_day_range:
+            self._add_survey_results_report(report, report["file_prefix"], report_obj)
+        else:
+            # one results file is saved for each survey and day range
+            for survey in surveys:
+                for day_range in report_obj.day_ranges:
+                    self._add_survey_results_report(
+                        report,
+                        ReportsConfig.get_survey_file_prefix(
+                            file_prefix=report["file_prefix"],
+                            survey_id=survey.get_id() if multi_survey else None,
+                            day_range=day_range if multi_day_range else None
+                        ),
+                        SurveyResultsView(report_obj, survey.get_id(), day_range)
+                    )
+        print(f'\t\t{Fore.LIGHTGREEN_EX}Loaded {Fore.LIGHTYELLOW_EX}{report_obj.__class__.__name__} {Fore.LIGHTGREEN_EX}report from {Fore.LIGHTBLACK_EX}{self.config_file} {Fore.LIGHTGREEN_EX}at index {Fore.LIGHTMAGENTA_EX}{report_index}{Style.RESET_ALL}')
+        logging.info(f"\t\tLoaded {report_obj.__class__.__name__} report from {self.config_file} at index {report_index}")
+
+    def _add_survey_results_report(self, report: dict, file_prefix: str, report_obj: Report) -> None:
+        if not isinstance(self._reports, list):
+            raise ValueError("Reports must be a list. Reports may not have been initialized. \"load_reports()\" must be called first")
         self._reports.append(Report(
-            file_prefix=report["file_prefix"],
+            file_prefix=file_prefix,
             archive_dir=report["archive_dir"],
             results_dir=report["results_dir"],
             report=report_obj,
             remove_cols=report["remove_cols"] + ['Time_Difference'] if "remove_cols" in report else ['Time_Difference'],
             rename_cols=report["rename_cols"] if "rename_cols" in report else None,
-            final_cols=report["final_cols"] if "final_cols" in report else None
+            final_cols=report["final_cols"] if "final_cols" in report else None,
+            config_hash=get_canonical_hash(get_run_config(report)),
+            partition_cols=ReportsConfig.get_partition_cols(report),
+            **ReportsConfig.get_output_sinks(report),
+            **ReportsConfig.get_delta_options(report)
         ))
-        print(f'\t\t{Fore.LIGHTGREEN_EX}Loaded {Fore.LIGHTYELLOW_EX}{report_obj.__class__.__name__} {Fore.LIGHTGREEN_EX}report from {Fore.LIGHTBLACK_EX}{self.config_file} {Fore.LIGHTGREEN_EX}at index {Fore.LIGHTMAGENTA_EX}{report_index}{Style.RESET_ALL}')
-        logging.info(f"\t\tLoaded {report_obj.__class__.__name__} report from {self.config_file} at index {report_index}")
+
+    @staticmethod
+    def get_partition_terms(report: dict) -> str | None:
+        # "files" saves the results of each date range to its own file, and "column" saves them together with a Term column
+        partition_terms = report.get("partition_terms")
+        if partition_terms is not None and partition_terms not in PARTITION_TERMS:
+            raise ValueError(f"Invalid partition_terms {partition_terms}. Must be one of {PARTITION_TERMS}")
+        return partition_terms
+
+    @staticmethod
+    def get_partition_cols(report: dict) -> list[str] | None:
+        # the results are saved to one file for each term (if partition_terms is "files") and each partition_by value
+        partition_cols = [Report.term_col] if ReportsConfig.get_partition_terms(report) == "files" else []
+        partition_cols += get_partition_by(report)
+        return partition_cols or None
+
+    @staticmethod
+    def get_delta_options(report: dict) -> dict:
+        delta, delta_key = get_delta(report)
+        return {"delta": delta, "delta_key": delta_key}
+
+    @staticmethod
+    def get_output_sinks(report: dict) -> dict[str, OutputSink | ArchiveStore | None]:
+        # results default to CSV with the index and archives to CSV without it
+        rows_per_chunk = get_archive_store(report)
+        return {
+            "results_sink": OutputSink.from_config(report.get("results_format"), index=True),
+            "archive_sink": OutputSink.from_config(report.get("archive_format"), index=False),
+            "archive_store": ArchiveStore(rows_per_chunk) if rows_per_chunk else None
+        }
+
+    @staticmethod
+    def get_survey_file_prefix(file_prefix: str | dict, survey_id: str | None = None, day_range: int | None = None) -> str:
+        return get_survey_file_prefix(file_prefix, survey_id, day_range)
 
     def load_followup_report(self, report: dict, report_index: int, appointment: AppointmentDataSet):
         if not isinstance(self._reports, list):
@@ -255,7 +518,9 @@ class ReportsConfig(Config):
                 config_file=self.config_file,
                 report_index=report_index,
                 report_type="Followup"
-            )
+            ),
+            partition_terms=ReportsConfig.get_partition_terms(report) is not None,
+            engine=self._engine
         )
         self._reports.append(Report(
             file_prefix=report["file_prefix"],
@@ -264,7 +529,11 @@ class ReportsConfig(Config):
             report=report_obj,
             remove_cols=report["remove_cols"] if "remove_cols" in report else None,
             rename_cols=report["rename_cols"] if "rename_cols" in report else None,
-            final_cols=report["final_cols"] if "final_cols" in report else None
+            final_cols=report["final_cols"] if "final_cols" in report else None,
+            config_hash=get_canonical_hash(get_run_config(report)),
+            partition_cols=ReportsConfig.get_partition_cols(report),
+            **ReportsConfig.get_output_sinks(report),
+            **ReportsConfig.get_delta_options(report)
         ))
         logging.info(f"\t\tLoaded {report_obj.__class__.__name__} report from {self.config_file} at index {report_index}")
         print(f'\t\t{Fore.LIGHTGREEN_EX}Loaded {Fore.LIGHTYELLOW_EX}{report_obj.__class__.__name__} {Fore.LIGHTGREEN_EX}report from {Fore.LIGHTBLACK_EX}{self.config_file}{Fore.LIGHTGREEN_EX} at index {Fore.LIGHTMAGENTA_EX}{report_index}{Style.RESET_ALL}')
@@ -302,7 +571,8 @@ class ReportsConfig(Config):
                 report_type="Referrals"
             ),
             enrollment=self.get_enrollment().deep_copy(),
-            merge_on=report["merge_enrollment"]
+            merge_on=report["merge_enrollment"],
+            engine=self._engine
         )
         self._reports.append(Report(
             file_prefix=report["file_prefix"],
@@ -311,7 +581,11 @@ class ReportsConfig(Config):
             report=report_obj,
             remove_cols=report["remove_cols"] if "remove_cols" in report else None,
             rename_cols=report["rename_cols"] if "rename_cols" in report else None,
-            final_cols=report["final_cols"] if "final_cols" in report else None
+            final_cols=report["final_cols"] if "final_cols" in report else None,
+            config_hash=get_canonical_hash(get_run_config(report)),
+            partition_cols=ReportsConfig.get_partition_cols(report),
+            **ReportsConfig.get_output_sinks(report),
+            **ReportsConfig.get_delta_options(report)
         ))
         logging.info(f"\t\tLoaded {report_obj.__class__.__name__} report from {self.config_file} at index {report_index}")
         print(f'\t\t{Fore.LIGHTGREEN_EX}Loaded {Fore.LIGHTYELLOW_EX}{report_obj.__class__.__name__} {Fore.LIGHTGREEN_EX}report from {Fore.LIGHTBLACK_EX}{self.config_file}{Fore.LIGHTGREEN_EX} at index {Fore.LIGHTMAGENTA_EX}{report_index}{Style.RESET_ALL}')
@@ -0,0 +1,119 @@
+import importlib.util
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+from src.utils.general_utils import get_canonical_hash
+
+# bump when the DataFrames a file or its stages make change, so older checkpoints aren't loaded
+CHECKPOINT_VERSION = 1
+
+
+class StageCheckpoint():
+    """
+    The DataFrames of loaded files and of the stages applied to them, saved to checkpoint_dir by the file they were
+    loaded from and the keys of their stages. A run that stops partway through (or a rerun whose late stages or saved
+    columns change) reads them instead of parsing the files and filtering them again.
+
+    Checkpoints are saved as Parquet files if pyarrow is installed, and as pickles otherwise or when Parquet can't
+    store a DataFrame (like columns of mixed types).
+    """
+    PARQUET = 'parquet'
+    PICKLE = 'pickle'
+    EXTENSIONS = {PARQUET: '.parquet', PICKLE: '.pkl'}
+
+    def __init__(self, checkpoint_dir: str) -> None:
+        if not checkpoint_dir or not isinstance(checkpoint_dir, str):
+            raise ValueError("checkpoint_dir must be a valid directory")
+        self.checkpoint_dir = checkpoint_dir
+        self.format = StageCheckpoint.PARQUET if importlib.util.find_spec('pyarrow') is not None else StageCheckpoint.PICKLE
+
+    @staticmethod
+    def get_load_key(fingerprint: str | None, usecols: list[str] | None) -> str | None:
+        # a file's DataFrame depends on its contents and config (its fingerprint) and the columns read from it
+        if fingerprint is None:
+            return None
+        return get_canonical_hash({"file": fingerprint, "usecols": usecols})
+
+    @staticmethod
+    def get_key(load_key: str | None, stages: list[tuple]) -> str | None:
+        # the key of the DataFrame made by applying stages (by their keys) to a loaded file
+        if load_key is None:
+            return None
+        return get_canonical_hash({"version": CHECKPOINT_VERSION, "load": load_key, "stages": stages})
+
+    def _get_path(self, key: str, extension: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"v{CHECKPOINT_VERSION}_{key}{extension}")
+
+    def has(self, key: str) -> bool:
+        # the info file is written last, so a checkpoint is only complete once it exists
+        return os.path.exists(self._get_path(key, '.json'))
+
+    def load(self, key: str) -> tuple[pd.DataFrame, dict] | None:
+        """
+        Reads a checkpoint.
+
+        Args:
+            key (str): The key of the checkpoint.
+
+        Returns:
+            tuple[pd.DataFrame, dict] | None: The DataFrame and the info it was stored with, or None if there is no
+            complete checkpoint with the key or it can't be read.
+        """
+        if not self.has(key):
+            return None
+        try:
+            with open(self._get_path(key, '.json')) as file:
+                info = json.load(file)
+            path = self._get_path(key, StageCheckpoint.EXTENSIONS[info["format"]])
+            if info["format"] == StageCheckpoint.PARQUET:
+                df = StageCheckpoint._from_parquet(pd.read_parquet(path))
+            else:
+                df = pd.read_pickle(path)
+        except Exception as e:
+            logging.warning(f"Could not load the checkpoint {key}: {str(e)}")
+            return None
+        if [str(dtype) for dtype in df.dtypes] != info["dtypes"]:
+            logging.debug(f"The checkpoint {key} was read with different column types, and isn't used")
+            return None
+        return df, info
+
+    def store(self, key: str, df: pd.DataFrame, info: dict) -> None:
+        """
+        Saves a checkpoint.
+
+        Args:
+            key (str): The key of the checkpoint.
+            df (pd.DataFrame): The DataFrame to save.
+            info (dict): Values to save with it, which can be written to JSON.
+        """
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        # written to temporary files first so a cancelled run (or another worker saving the same checkpoint) never
+        # leaves a partial checkpoint
+        suffix = f".{os.getpid()}.tmp"
+        file_format = self.format
+        if file_format == StageCheckpoint.PARQUET:
+            try:
+                df.to_parquet(self._get_path(key, '.parquet') + suffix, index=True)
+            except Exception as e:
+                logging.debug(f"Could not save the checkpoint {key} as Parquet, saving it as a pickle: {str(e)}")
+                file_format = StageCheckpoint.PICKLE
+        if file_format == StageCheckpoint.PICKLE:
+            pd.to_pickle(df, self._get_path(key, '.pkl') + suffix)
+        path = self._get_path(key, StageCheckpoint.EXTENSIONS[file_format])
+        os.replace(path + suffix, path)
+        with open(self._get_path(key, '.json') + suffix, 'w') as file:
+            json.dump({**info, "format": file_format, "dtypes": [str(dtype) for dtype in df.dtypes]}, file)
+        os.replace(self._get_path(key, '.json') + suffix, self._get_path(key, '.json'))
+        logging.debug(f"Saved the checkpoint {key} with {len(df)} rows to {path}")
+
+    @staticmethod
+    def _from_parquet(df: pd.DataFrame) -> pd.DataFrame:
+        # missing values of object columns are read as None, and are NaN in DataFrames read from CSV files
+        for position in np.flatnonzero((df.dtypes == object).to_numpy()):
+            col = df.iloc[:, position]
+            if col.isna().any():
+                df.isetitem(position, col.where(col.notna(), np.nan))
+        return df
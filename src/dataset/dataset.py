@@ -1,10 +1,14 @@
 from datetime import date
 import logging
 from typing import Self
+import numpy as np
 import pandas as pd
 
 from src.utils.df_utils import sort_columns_by_date
 from src.utils.general_utils import get_month_range, int_month_to_str
+from src.utils.shm_utils import SharedFrame, attach_frame, get_shared_handle
+from src.dataset.checkpoint import StageCheckpoint
+from src.dataset.stage import Stage
 
 from enum import Enum
 
@@ -26,6 +30,46 @@ class DataSet:
         self.id = id
         self.df = df
         self.cols = cols
+        self._stages = []
+        # identifies the source file and column config, so results made from it can be cached
+        self.fingerprint: str | None = None
+        # identifies the DataFrame the file was loaded into (its fingerprint and the columns read), so the DataFrames
+        # its stages make can be checkpointed
+        self.load_key: str | None = None
+        # whether the rows were numbered again (like by reset_index), so their labels are no longer the ones they were
+        # loaded with
+        self._relabeled = False
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df is None:
+            if self._parent is None:
+                raise ValueError(f"{self.id} was released and can no longer be used")
+            # deep copies are made the first time they are used, so unused copies never hold their own DataFrame
+            self._df = self._parent.get_df().copy(deep=True)
+            self._sort_keys = self._parent._sort_keys
+            self._parent = None
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame) -> None:
+        self._df = df
+        self._parent = None
+        # the columns the DataFrame is sorted by, in order. A new DataFrame's order isn't known
+        self._sort_keys: tuple[str, ...] = ()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        if self._df is not None:
+            handle = get_shared_handle(self._df)
+            if handle is not None:
+                state["_df"] = handle
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        if isinstance(state["_df"], SharedFrame):
+            state["_df"] = attach_frame(state["_df"])
+        self.__dict__.update(state)
 
     def __str__(self) -> str:
         return self.id
@@ -36,7 +80,75 @@ class DataSet:
         return False
 
     def deep_copy(self) -> Self:
-        return self.__class__(self.id, self.df.copy(deep=True), self.cols.copy())
+        copy = self.__class__.__new__(self.__class__)
+        copy.__dict__.update(self.__dict__)
+        copy.cols = self.cols.copy()
+        copy._stages = self._stages.copy()
+        copy._df = None
+        copy._parent = self.get_origin()
+        return copy
+
+    def rebase(self, dataset: "DataSet") -> None:
+        # use a DataSet that already applied some of this DataSet's stages instead of the DataSet it was copied from
+        if self.is_copied():
+            raise ValueError("Only DataSets that have not been used can be rebased")
+        self._parent = dataset.get_origin()
+        self._stages = dataset.get_stages()
+
+    def get_stages(self) -> list[tuple]:
+        return self._stages.copy()
+
+    def apply_stages(self, stages: list[Stage], checkpoint: StageCheckpoint | None = None) -> None:
+        keys = [stage.get_key() for stage in stages]
+        if keys[:len(self._stages)] != self._stages:
+            raise ValueError(f"Stages {stages} do not continue the stages already applied to {self.id}")
+        if checkpoint is not None and len(keys) > len(self._stages):
+            self._load_checkpoint(checkpoint, keys)
+        applied = len(self._stages)
+        for stage in stages[len(self._stages):]:
+            stage.apply(self)
+            self._stages.append(stage.get_key())
+            logging.debug(f"Applied {stage} to {self.id}")
+        # stages that didn't change the DataFrame (like sorting sorted rows) made nothing new to save
+        if checkpoint is not None and applied < len(keys) and self.is_copied():
+            key = StageCheckpoint.get_key(self.load_key, self._stages)
+            if key is not None:
+                checkpoint.store(key, self.get_df(), {"sort_keys": list(self.get_sort_keys()), "relabeled": self._relabeled})
+
+    def _load_checkpoint(self, checkpoint: StageCheckpoint, keys: list[tuple]) -> None:
+        # continues from the checkpoint of the most stages there is one of
+        for count in range(len(keys), len(self._stages), -1):
+            key = StageCheckpoint.get_key(self.load_key, keys[:count])
+            if key is None:
+                return
+            loaded = checkpoint.load(key)
+            if loaded is None:
+                continue
+            df, info = loaded
+            self.df = df
+            self._sort_keys = tuple(info["sort_keys"])
+            self._relabeled = info["relabeled"]
+            self._stages = keys[:count]
+            logging.debug(f"Loaded {self.id} after {count} of {len(keys)} stages from the checkpoint {key}")
+            return
+
+    def release(self) -> None:
+        # lets go of the DataFrame (or the DataSet it was copied from) once nothing will use this DataSet again
+        self._df = None
+        self._parent = None
+        self._sort_keys = ()
+
+    def is_released(self) -> bool:
+        return self._df is None and self._parent is None
+
+    def is_copied(self) -> bool:
+        return self._df is not None
+
+    def get_origin(self) -> "DataSet":
+        # the DataSet whose DataFrame this DataSet uses until it is first modified
+        if self._df is None:
+            return self._parent
+        return self
 
     def same_type(self, __value: object) -> bool:
         if isinstance(__value, self.__class__):
@@ -49,14 +161,89 @@ class DataSet:
     def get_df(self) -> pd.DataFrame:
         return self.df
 
-    def get_col(self, col_id: Enum) -> pd.Series:
+    def has_loaded_labels(self) -> bool:
+        # whether the DataFrame's row labels are the labels its rows were loaded with, which find them in the file
+        return not self._relabeled
+
+    def get_row_count(self) -> int:
+        # doesn't make a deep copy's DataFrame
+        return len(self.get_origin().get_df())
+
+    def get_sort_keys(self) -> tuple[str, ...]:
+        # copies that haven't been used have the order of the DataSet they were copied from
+        return self.get_origin()._sort_keys
+
+    def is_sorted(self, by: list[str]) -> bool:
+        # whether the rows are in ascending order of the columns, with rows that have the same values in their order
+        # from before they were sorted
+        return bool(by) and self.get_sort_keys()[:len(by)] == tuple(by)
+
+    def _set_sort_keys(self, keys: tuple[str, ...]) -> None:
+        # only columns the DataFrame still has are kept. Anything after a column that was dropped isn't sorted
+        columns = set(self.get_df().columns)
+        kept = []
+        for key in keys:
+            if key not in columns:
+                break
+            kept.append(key)
+        self._sort_keys = tuple(kept)
+
+    def get_range(self, col: str) -> tuple | None:
+        """
+        The min and max of the column the rows are sorted by first, from its first and last values.
+
+        Args:
+            col (str): The column.
+
+        Returns:
+            tuple | None: The min and max of the column, or None if the rows aren't sorted by it first or it has no values.
+        """
+        if not self.is_sorted([col]):
+            return None
+        values = self.get_origin().get_df()[col]
+        # missing values are sorted after every other value
+        last = len(values) - 1
+        if last >= 0 and pd.isna(values.iloc[last]):
+            last = values.notna().to_numpy().nonzero()[0][-1] if values.notna().any() else -1
+        if last < 0:
+            return None
+        return values.iloc[0], values.iloc[last]
+
+    def _get_sorted_dates(self) -> np.ndarray | None:
+        # the dates of the rows as datetime64 values, if the rows are sorted by them, so date ranges can be found by
+        # binary search instead of comparing every row
+        date_col = self.get_col_name(DataSet.Column.DATE)
+        if not self.is_sorted([date_col]):
+            return None
+        dates = self.get_origin().get_df()[date_col]
+        if not pd.api.types.is_datetime64_dtype(dates.dtype):
+            return None
+        return dates.to_numpy()
+
+    @staticmethod
+    def _search_dates(dates: np.ndarray, start_date: date, end_date: date) -> tuple[int, int]:
+        # the positions of the first row on or after start_date and the first row on or after end_date. Missing dates
+        # are sorted last, so they are never in a range
+        start = int(np.searchsorted(dates, np.datetime64(start_date, 'ns'), side='left'))
+        end = int(np.searchsorted(dates, np.datetime64(end_date, 'ns'), side='left'))
+        return start, max(start, end)
+
+    def get_fingerprint(self) -> str | None:
+        return self.fingerprint
+
+    def get_columns(self) -> pd.Index:
+        return self.get_origin().get_df().columns
+
+    def validate_col(self, col_id: Enum) -> None:
         if not isinstance(col_id, Enum):
             raise ValueError("col_id must be an Enum")
         if col_id.value not in self.cols:
             raise ValueError("col_id must be a defined column")
-        if self.get_col_name(col_id) not in self.get_df().columns:
+        if self.get_col_name(col_id) not in self.get_columns():
             raise ValueError("col_id must be in DataFrame")
 
+    def get_col(self, col_id: Enum) -> pd.Series:
+        self.validate_col(col_id)
         return self.get_df()[self.get_col_name(col_id)]
 
     def get_col_name(self, col_id: Enum) -> str | None:
@@ -70,15 +257,37 @@ class DataSet:
     def set_df(self, df) -> None:
         self.df = df
 
+    @classmethod
+    def normalize_column(cls, column: str) -> str:
+        # the name a file's column has once it is loaded into this type of DataSet
+        return column
+
+    def project_columns(self, columns: list[str]) -> None:
+        columns_before = len(self.get_columns())
+        # selecting from the origin doesn't copy the columns that are dropped
+        sort_keys = self.get_sort_keys()
+        self.df = self.get_origin().get_df()[list(columns)].copy()
+        self._set_sort_keys(sort_keys)
+        logging.debug(f"Projected {self.id} from {columns_before} to {len(columns)} columns")
+
     def sort_date(self) -> None:
+        date_col = self.get_col_name(DataSet.Column.DATE)
+        if self._get_sorted_dates() is not None:
+            # already sorted (like a copy of a sorted DataSet), so the copy isn't made either
+            logging.debug(f"{self.id} is already sorted by {date_col}")
+            return
         try:
             self.get_col(DataSet.Column.DATE)
         except ValueError:
             raise ValueError("DataFrame must have a date column")
-        self.set_df(sort_columns_by_date(self.get_df(), self.get_col_name(DataSet.Column.DATE)))
+        self.set_df(sort_columns_by_date(self.get_df(), date_col))
+        self._set_sort_keys((date_col,))
 
     def reset_index(self) -> None:
+        sort_keys = self.get_sort_keys()
         self.set_df(self.get_df().reset_index(drop=True))
+        self._set_sort_keys(sort_keys)
+        self._relabeled = True
 
     def filter_months(self, *months: str) -> None:
         if not months:
@@ -168,6 +377,10 @@ class DataSet:
         logging.debug(f"Filtered out {rows_before - len(self.get_df())} rows")
 
     def filter_dates(self, *date_ranges: tuple[date, date]):
+        dates = self._get_sorted_dates()
+        if dates is not None and date_ranges:
+            self._slice_dates(dates, *date_ranges)
+            return
         rows_before = len(self.get_df())
 
         self.get_df()[self.get_col_name(DataSet.Column.DATE)] = pd.to_datetime(self.get_col(DataSet.Column.DATE)).dt.date
@@ -180,6 +393,52 @@ class DataSet:
 
         logging.debug(f"Filtered out {rows_before - len(self.get_df())} rows")
 
+    def _slice_dates(self, dates: np.ndarray, *date_ranges: tuple[date, date]) -> None:
+        # the rows in every range are one slice of the sorted rows. Only the rows kept are copied and have their
+        # dates converted, the same as filter_dates
+        date_col = self.get_col_name(DataSet.Column.DATE)
+        bounds = [DataSet._search_dates(dates, start_date, end_date) for start_date, end_date in date_ranges]
+        start = max(start for start, _ in bounds)
+        end = max(start, min(end for _, end in bounds))
+        sort_keys = self.get_sort_keys()
+        df = self.get_origin().get_df().iloc[start:end]
+        self.df = df.assign(**{date_col: df[date_col].dt.date})
+        self._set_sort_keys(sort_keys)
+        logging.debug(f"Filtered out {len(dates) - len(self.df)} rows")
+
+    def tag_date_ranges(self, col: str, *date_ranges: tuple[str, date, date]) -> None:
+        # unlike filter_dates, rows in any of the date ranges are kept, and each row is labeled with its range in col.
+        # A row in more than one range is kept once for each range it is in
+        if not date_ranges:
+            raise ValueError("At least one date range must be given")
+        rows_before = len(self.get_df())
+        sort_keys = self.get_sort_keys()
+        dates = self._get_sorted_dates()
+
+        self.get_df()[self.get_col_name(DataSet.Column.DATE)] = pd.to_datetime(self.get_col(DataSet.Column.DATE)).dt.date
+
+        positions = []
+        labels = []
+        for label, start_date, end_date in date_ranges:
+            if dates is not None:
+                in_range = np.arange(*DataSet._search_dates(dates, start_date, end_date))
+            else:
+                in_range = np.flatnonzero(self.get_col(DataSet.Column.DATE).between(left=start_date, right=end_date, inclusive='left').to_numpy())
+            positions.append(in_range)
+            labels.append(np.full(len(in_range), label, dtype=object))
+        # the rows stay in the same order they were in
+        positions = np.concatenate(positions)
+        order = np.argsort(positions, kind='stable')
+        df = self.get_df().iloc[positions[order]].assign(**{col: np.concatenate(labels)[order]})
+        if not df.index.is_unique:
+            df = df.reset_index(drop=True)
+            self._relabeled = True
+        self.set_df(df)
+        # rows are kept in order, with a row in more than one range once for each range
+        self._set_sort_keys(sort_keys)
+
+        logging.debug(f"Tagged {len(df)} rows with {len(date_ranges)} date ranges, filtering out {rows_before - len(set(positions))} rows")
+
     def filter_by_col(self, col: Enum, filter: FilterType):
         rows_before = len(self.get_df())
         if not filter:
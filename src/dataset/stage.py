@@ -0,0 +1,26 @@
+from src.utils.metrics_utils import measure
+from src.utils.type_utils import FilterType
+
+
+class Stage():
+    def __init__(self, method: str, *args) -> None:
+        self.method = method
+        self.args = args
+
+    def __repr__(self) -> str:
+        return f"{self.method}{self.get_key()[1]}"
+
+    def get_key(self) -> tuple:
+        return (self.method, tuple(Stage._arg_key(arg) for arg in self.args))
+
+    @staticmethod
+    def _arg_key(arg) -> object:
+        if isinstance(arg, FilterType):
+            return arg.get_key()
+        if isinstance(arg, (list, tuple)):
+            return tuple(Stage._arg_key(item) for item in arg)
+        return arg
+
+    def apply(self, dataset: "DataSet") -> None:  # noqa: F821
+        with measure(f"{dataset.id}.{self.method}", "dataset_stage", dataset.get_row_count):
+            getattr(dataset, self.method)(*self.args)
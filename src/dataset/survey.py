@@ -22,6 +22,10 @@ class SurveyDataSet(DataSet):
     def _remove_numbers_from_column(column_name):
         return re.sub(r'^[0-9\W]+', '', column_name)
 
+    @classmethod
+    def normalize_column(cls, column: str) -> str:
+        return SurveyDataSet._remove_numbers_from_column(column)
+
     def _remove_numbers_from_columns(self) -> None:
         self.get_df().columns = self.get_df().columns.map(
             SurveyDataSet._remove_numbers_from_column
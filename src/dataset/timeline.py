@@ -0,0 +1,358 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+from src.dataset.dataset import DataSet
+from src.utils.general_utils import get_canonical_hash
+
+# bump when the arrays a timeline is saved with change, so older saved timelines aren't loaded
+TIMELINE_VERSION = 3
+
+
+class Timeline():
+    """
+    Every loaded file's rows as events of the students they are about, built once for every report of a run. Students
+    are numbered in the order of their emails, so reports can group and match rows by student with integer codes
+    instead of hashing emails, and each student's events are in one sorted slice of the event table, which reports
+    scan instead of grouping or merging rows by student.
+    """
+    def __init__(self, students: np.ndarray, kinds: list[str], codes: dict[str, np.ndarray], labels: dict[str, pd.Index],
+                 events: dict[str, np.ndarray]) -> None:
+        # student emails, sorted, so a student's code is the position of their email
+        self.students = students
+        # the id of the file each kind of event comes from
+        self.kinds = kinds
+        # the student code of each row of each file (-1 if the row has no student email), by position
+        self.codes = codes
+        # the index of each file as it was loaded, to find the rows of a filtered DataSet
+        self.labels = labels
+        # the event table (student, time, kind and source row), sorted by student, time, kind and source row, with
+        # the start of each student's events in offsets
+        self.events = events
+
+    @staticmethod
+    def get_email_col(dataset: DataSet) -> str | None:
+        email_id = getattr(dataset.Column, 'STUDENT_EMAIL', None)
+        if email_id is None:
+            return None
+        col = dataset.get_col_name(email_id)
+        return col if col in dataset.get_columns() else None
+
+    @staticmethod
+    def get_date_col(dataset: DataSet) -> str | None:
+        col = dataset.get_col_name(DataSet.Column.DATE)
+        return col if col in dataset.get_columns() else None
+
+    @staticmethod
+    def get_key(datasets: list[DataSet]) -> str | None:
+        # timelines are saved by the contents of the files they are built from (and the columns of them that are loaded)
+        fingerprints = [
+            (dataset.get_id(), dataset.get_fingerprint(), dataset.get_row_count(), Timeline.get_email_col(dataset),
+             Timeline.get_date_col(dataset))
+            for dataset in datasets
+        ]
+        if not fingerprints or any(fingerprint[1] is None for fingerprint in fingerprints):
+            return None
+        return get_canonical_hash({"version": TIMELINE_VERSION, "files": fingerprints})
+
+    @staticmethod
+    def build(datasets: list[DataSet]) -> "Timeline":
+        """
+        Builds the timeline of the files that have student emails.
+
+        Args:
+            datasets (list[DataSet]): The loaded files.
+
+        Returns:
+            Timeline: The timeline.
+        """
+        sources = [(dataset, Timeline.get_email_col(dataset)) for dataset in datasets]
+        sources = [(dataset, email_col) for dataset, email_col in sources if email_col is not None]
+        kinds = [dataset.get_id() for dataset, _ in sources]
+        frames = [dataset.get_origin().get_df() for dataset, _ in sources]
+        emails = pd.concat([df[email_col] for df, (_, email_col) in zip(frames, sources)], ignore_index=True) if frames else pd.Series(dtype=object)
+        # every file's emails are numbered at once, so a student has the same code in every file
+        all_codes, students = pd.factorize(emails.to_numpy(), sort=True)
+        all_codes = all_codes.astype(np.int32)
+        # source rows are positions in their file, which fit in 32 bits unless a file has more rows than that
+        row_type = np.int32 if max((len(df) for df in frames), default=0) < 2 ** 31 else np.int64
+        codes, labels, starts = {}, {}, 0
+        times, kind_codes, rows = [], [], []
+        for kind, (df, (dataset, _)) in enumerate(zip(frames, sources)):
+            codes[dataset.get_id()] = all_codes[starts:starts + len(df)]
+            labels[dataset.get_id()] = df.index
+            starts += len(df)
+            date_col = Timeline.get_date_col(dataset)
+            if date_col is not None:
+                dates = pd.to_datetime(df[date_col], errors='coerce')
+                if isinstance(dates.dtype, pd.DatetimeTZDtype):
+                    dates = dates.dt.tz_localize(None)
+                times.append(dates.to_numpy(dtype='datetime64[ns]'))
+            else:
+                times.append(np.full(len(df), np.datetime64('NaT'), dtype='datetime64[ns]'))
+            kind_codes.append(np.full(len(df), kind, dtype=np.int8))
+            rows.append(np.arange(len(df), dtype=row_type))
+        time = np.concatenate(times) if times else np.array([], dtype='datetime64[ns]')
+        kind = np.concatenate(kind_codes) if kind_codes else np.array([], dtype=np.int8)
+        row = np.concatenate(rows) if rows else np.array([], dtype=row_type)
+        # rows without a student aren't events of any student
+        has_student = all_codes >= 0
+        student, time, kind, row = all_codes[has_student], time[has_student], kind[has_student], row[has_student]
+        order = np.lexsort((row, kind, time, student))
+        student = student[order]
+        events = {
+            "student": student,
+            "time": time[order],
+            "kind": kind[order],
+            "row": row[order],
+            "offsets": np.searchsorted(student, np.arange(len(students) + 1)).astype(np.int64)
+        }
+        logging.debug(f"Built a timeline of {len(student)} events of {len(students)} students from {len(kinds)} files")
+        return Timeline(np.asarray(students, dtype=object), kinds, codes, labels, events)
+
+    def get_student_count(self) -> int:
+        return len(self.students)
+
+    def get_event_count(self) -> int:
+        return len(self.events["student"])
+
+    def get_positions(self, dataset: DataSet, index: pd.Index | None = None) -> np.ndarray | None:
+        """
+        The positions in their file of a DataSet's rows.
+
+        Args:
+            dataset (DataSet): A DataSet made from one of the files (like a filtered copy of it).
+            index (pd.Index | None): The index of the rows, taken from the DataSet's DataFrame. Every row if it isn't given.
+
+        Returns:
+            np.ndarray | None: The position of each row, or None if the file isn't in the timeline or the rows can't
+            be found in it (like rows numbered again by reset_index).
+        """
+        labels = self.labels.get(dataset.get_id())
+        if labels is None or not dataset.has_loaded_labels() or not labels.is_unique:
+            return None
+        index = dataset.get_df().index if index is None else index
+        positions = labels.get_indexer(index)
+        if (positions == -1).any():
+            return None
+        return positions
+
+    def get_codes(self, dataset: DataSet, index: pd.Index | None = None) -> np.ndarray | None:
+        """
+        The student codes of a DataSet's rows.
+
+        Args:
+            dataset (DataSet): A DataSet made from one of the files (like a filtered copy of it).
+            index (pd.Index | None): The index of the rows, taken from the DataSet's DataFrame. Every row if it isn't given.
+
+        Returns:
+            np.ndarray | None: The code of each row (-1 for rows without a student email), or None if the file isn't
+            in the timeline or the rows can't be found in it.
+        """
+        positions = self.get_positions(dataset, index)
+        if positions is None:
+            return None
+        return self.codes[dataset.get_id()][positions]
+
+    def get_student_counts(self, dataset: DataSet, index: pd.Index) -> np.ndarray | None:
+        """
+        Counts each student's rows of a DataSet by scanning their slice of the event table.
+
+        Args:
+            dataset (DataSet): A DataSet made from one of the files.
+            index (pd.Index): The index of the rows to count, taken from the DataSet's DataFrame.
+
+        Returns:
+            np.ndarray | None: The number of rows of each student, by student code, or None if the rows can't be found
+            in the timeline.
+        """
+        rows = self._get_event_rows(dataset, index)
+        if rows is None:
+            return None
+        selected = np.concatenate(([0], np.cumsum(rows >= 0)))
+        offsets = self.events["offsets"]
+        return selected[offsets[1:]] - selected[offsets[:-1]]
+
+    def get_latest(self, dataset: DataSet, dates: pd.Series) -> np.ndarray | None:
+        """
+        Finds each student's row with the latest date, the same as grouping the rows by student email and taking the
+        max of dates. Each student's events are in time order, so their latest row is the last one in their slice of
+        the event table.
+
+        Args:
+            dataset (DataSet): A DataSet made from one of the files.
+            dates (pd.Series): The date column of the rows, taken from the DataSet's DataFrame.
+
+        Returns:
+            np.ndarray | None: The position in dates of each student's latest row (-1 if they have none with a date),
+            by student code, or None if the rows can't be found in the timeline or their dates aren't in its order.
+        """
+        rows = self._get_event_rows(dataset, dates.index)
+        times = Timeline._get_times(dates)
+        if rows is None or times is None:
+            return None
+        selected = rows >= 0
+        keys = np.full(len(rows), np.datetime64('NaT'), dtype='datetime64[ns]')
+        keys[selected] = times[rows[selected]]
+        has_date = selected & ~np.isnat(keys)
+        if not Timeline._is_sorted(self.events["student"][has_date], keys[has_date]):
+            return None
+        last = np.maximum.accumulate(np.where(has_date, np.arange(len(rows)), -1)) if len(rows) else rows
+        offsets = self.events["offsets"]
+        ends = last[offsets[1:] - 1]
+        return np.where(ends >= offsets[:-1], rows[np.maximum(ends, 0)] if len(rows) else ends, -1)
+
+    def match_latest(self, left: list[tuple[DataSet, pd.Series]], right: tuple[DataSet, pd.Series],
+                     tolerance: pd.Timedelta | None = None) -> np.ndarray | None:
+        """
+        Matches rows with the same student's latest row on or before their date, the same as pd.merge_asof with
+        direction='backward' by student email. The right rows are taken from the event table, where they are already
+        in order by student and then by date, so each left row's match is found with one binary search instead of
+        sorting and grouping both sides by email.
+
+        Args:
+            left (list[tuple[DataSet, pd.Series]]): The date columns of the rows to match, with the DataSet each one is
+                taken from.
+            right (tuple[DataSet, pd.Series]): The date column of the rows to match them with, in the order merge_asof
+                would be given them, with the DataSet it is taken from.
+            tolerance (pd.Timedelta | None): How long before a row its match can be, if there is a limit.
+
+        Returns:
+            np.ndarray | None: The position in right's dates of each left row's match (-1 if it has none), for the
+            left rows one DataSet after another, or None if the rows can't be found in the timeline, a left row has no
+            student, or the dates aren't in the timeline's order.
+        """
+        right_dataset, right_dates = right
+        right_rows = self._get_event_rows(right_dataset, right_dates.index)
+        right_times = Timeline._get_times(right_dates)
+        if right_rows is None or right_times is None:
+            return None
+        is_right = right_rows >= 0
+        right_students, right_positions = self.events["student"][is_right], right_rows[is_right]
+        right_keys = right_times[right_positions]
+        # ties are matched with the last of them in right's order, so each student's rows must be in the same order
+        # in right as in the table
+        if np.isnat(right_keys).any() or not Timeline._is_sorted(right_students, right_keys) or \
+                not Timeline._is_sorted(right_students, right_positions, strict=True):
+            return None
+
+        lefts = []
+        for dataset, dates in left:
+            rows = self._get_event_rows(dataset, dates.index)
+            times = Timeline._get_times(dates)
+            if rows is None or times is None:
+                return None
+            is_left = rows >= 0
+            # rows without a student email aren't events, and are only matched by merging on the email
+            if np.count_nonzero(is_left) != len(dates):
+                return None
+            positions = rows[is_left]
+            if np.isnat(times).any():
+                return None
+            lefts.append((self.events["student"][is_left], times[positions], positions, len(dates)))
+
+        # dates are ranked together, so a (student, date) pair can be compared as one integer
+        all_keys = np.concatenate([right_keys] + [keys for _, keys, _, _ in lefts]).view(np.int64)
+        unique_keys, ranks = np.unique(all_keys, return_inverse=True)
+        width = max(len(unique_keys), 1)
+        right_pairs = right_students.astype(np.int64) * width + ranks[:len(right_keys)]
+        matches, start = [], len(right_keys)
+        for students, keys, positions, count in lefts:
+            pairs = students.astype(np.int64) * width + ranks[start:start + len(keys)]
+            start += len(keys)
+            found = np.searchsorted(right_pairs, pairs, side='right') - 1
+            is_match = found >= 0
+            is_match[is_match] = right_students[found[is_match]] == students[is_match]
+            if tolerance is not None:
+                is_match[is_match] = (keys[is_match] - right_keys[found[is_match]]) <= tolerance.to_timedelta64()
+            match = np.full(count, -1, dtype=np.int64)
+            match[positions] = np.where(is_match, right_positions[np.maximum(found, 0)] if len(right_keys) else -1, -1)
+            matches.append(match)
+        return np.concatenate(matches) if matches else np.array([], dtype=np.int64)
+
+    def save(self, path: str) -> None:
+        # written to a temporary file first so a cancelled run never leaves a partial timeline
+        arrays = {f"event_{name}": values for name, values in self.events.items()}
+        for position, kind in enumerate(self.kinds):
+            arrays[f"codes_{position}"] = self.codes[kind]
+            arrays[f"labels_{position}"] = self.labels[kind].to_numpy()
+        with open(path + ".tmp", 'wb') as file:
+            np.savez_compressed(file, students=self.students.astype(str), kinds=np.asarray(self.kinds, dtype=str), **arrays)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def load(path: str) -> "Timeline":
+        with np.load(path, allow_pickle=False) as data:
+            kinds = [str(kind) for kind in data["kinds"]]
+            events = {name[len("event_"):]: data[name] for name in data.files if name.startswith("event_")}
+            codes = {kind: data[f"codes_{position}"] for position, kind in enumerate(kinds)}
+            labels = {kind: Timeline._to_index(data[f"labels_{position}"]) for position, kind in enumerate(kinds)}
+            return Timeline(data["students"].astype(object), kinds, codes, labels, events)
+
+    def _get_event_rows(self, dataset: DataSet, index: pd.Index) -> np.ndarray | None:
+        # the position in index of each event's row, or -1 for events of other rows and files
+        positions = self.get_positions(dataset, index)
+        if positions is None:
+            return None
+        rows = np.full(len(self.labels[dataset.get_id()]), -1, dtype=np.int64)
+        rows[positions] = np.arange(len(positions))
+        if not np.array_equal(rows[positions], np.arange(len(positions))):
+            # a row taken more than once (like a row in two terms) is still one event
+            return None
+        is_kind = self.events["kind"] == self.kinds.index(dataset.get_id())
+        event_rows = np.full(len(is_kind), -1, dtype=np.int64)
+        event_rows[is_kind] = rows[self.events["row"][is_kind]]
+        return event_rows
+
+    @staticmethod
+    def _get_times(dates: pd.Series) -> np.ndarray | None:
+        # the dates as datetimes, which are ordered the same way as the dates. Other values (like strings) are
+        # compared as they are, not by time, so they aren't ordered by the table
+        if pd.api.types.is_datetime64_dtype(dates.dtype):
+            return dates.to_numpy(dtype='datetime64[ns]')
+        if dates.dtype == object and pd.api.types.infer_dtype(dates, skipna=True) == 'date':
+            return pd.to_datetime(dates).to_numpy(dtype='datetime64[ns]')
+        return None
+
+    @staticmethod
+    def _is_sorted(students: np.ndarray, values: np.ndarray, strict: bool = False) -> bool:
+        # whether each student's values are in order, given the students are in order
+        steps = np.diff(values.view(np.int64) if values.dtype.kind == 'M' else values)
+        in_order = steps > 0 if strict else steps >= 0
+        return bool((in_order | (students[1:] != students[:-1])).all())
+
+    @staticmethod
+    def _to_index(labels: np.ndarray) -> pd.Index:
+        # files loaded whole have a RangeIndex, which finds rows by position
+        if len(labels) and np.array_equal(labels, np.arange(len(labels))):
+            return pd.RangeIndex(len(labels))
+        return pd.Index(labels)
+
+
+def get_timeline(datasets: list[DataSet], timeline_dir: str | None = None) -> Timeline:
+    """
+    Builds the timeline of the loaded files, or loads it from timeline_dir if it was saved from the same files.
+
+    Args:
+        datasets (list[DataSet]): The loaded files.
+        timeline_dir (str | None): The directory timelines are saved to between runs, if any.
+
+    Returns:
+        Timeline: The timeline.
+    """
+    key = Timeline.get_key(datasets) if timeline_dir else None
+    path = os.path.join(timeline_dir, f"timeline_v{TIMELINE_VERSION}_{key}.npz") if key else None
+    if path and os.path.exists(path):
+        try:
+            timeline = Timeline.load(path)
+            logging.debug(f"Loaded the timeline from {path}")
+            return timeline
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not load the timeline from {path}: {str(e)}")
+    timeline = Timeline.build(datasets)
+    if path:
+        os.makedirs(timeline_dir, exist_ok=True)
+        timeline.save(path)
+        logging.debug(f"Saved the timeline to {path}")
+    return timeline
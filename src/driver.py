@@ -0,0 +1,141 @@
+from src.dataset.checkpoint import StageCheckpoint
+from src.reports.archive_index import get_archive_index
+from src.reports.cache import ResultCache, RunJournal
+from src.reports.executor import ParallelReportExecutor, PartitionedReportExecutor, ReportExecutor
+from src.reports.report import Report
+from src.config.config import Config
+from src.config.files_config import FilesConfig
+from src.config.reports_config import ReportsConfig
+from src.utils.engine_utils import get_engine
+from src.utils.metrics_utils import save_metrics, start_metrics, stop_metrics
+from src.utils.spill_utils import get_memory_budget
+from colorama import Fore, Style
+from datetime import datetime as dt
+import logging
+import os
+
+
+class Driver():
+    def __init__(self, report_names: list[str] | None = None, resume: bool = False, keep_files: bool = False) -> None:
+        self._config = Config()
+        self._config.load_config()
+        # the first run continues the last run of the reports if it stopped partway through
+        if resume and self._get_cache() is None:
+            raise ValueError("--resume needs a cache_dir in config.json to keep the results of each report")
+        self._resume = resume
+        # the loaded files are let go after the last report that uses them, unless they're kept for reruns
+        self._keep_files = keep_files
+
+        # metrics are started before the files are loaded so loading is measured too
+        self._start_run()
+
+        self._reports_config = ReportsConfig(
+            report_names=report_names,
+            engine=get_engine(self._config.config),
+            memory_budget=get_memory_budget(self._config.config),
+            spill_dir=self._config.config.get("spill_dir") if self._config.config else None,
+            timeline_dir=self._config.config.get("timeline_dir") if self._config.config else None,
+            checkpoint=self._get_checkpoint()
+        )
+        self._reports_config.load_reports()
+
+    def run(self):
+        try:
+            self._run_reports()
+        finally:
+            self._save_metrics()
+
+    def rerun(self, file_ids: list[str]) -> list[str]:
+        """
+        Loads changed files again and runs only the reports that use them. The other files stay loaded.
+
+        Args:
+            file_ids (list[str]): The ids of the files that have a new export.
+
+        Returns:
+            list[str]: The names of the reports that were run.
+        """
+        if not self._keep_files:
+            raise ValueError("Reports can only be rerun by a Driver that keeps its files loaded")
+        self._start_run()
+        try:
+            reloaded = self._reports_config.reload_files(file_ids)
+            report_names = self._reports_config.get_dependent_reports(reloaded)
+            if report_names:
+                self._reports_config.load_reports(report_names)
+                self._run_reports()
+        finally:
+            self._save_metrics()
+        return report_names
+
+    def get_files_config(self) -> FilesConfig:
+        return self._reports_config.get_files_config()
+
+    def _start_run(self) -> None:
+        self._run_name = dt.now().strftime('%Y-%m-%d_%H-%M-%S')
+        if self._get_metrics_dir():
+            start_metrics()
+
+    def _getReports(self) -> list[Report]:
+        return self._reports_config.get_reports()
+
+    def _get_workers(self) -> int:
+        if not self._config.config or "workers" not in self._config.config:
+            return 1
+        return self._config.config["workers"]
+
+    def _get_cache(self) -> ResultCache | None:
+        # results are only cached when a cache_dir is configured
+        if not self._config.config or not self._config.config.get("cache_dir"):
+            return None
+        return ResultCache(self._config.config["cache_dir"])
+
+    def _get_checkpoint(self) -> StageCheckpoint | None:
+        # loaded files and the DataSets their stages make are checkpointed in the cache_dir too
+        cache = self._get_cache()
+        if cache is None:
+            return None
+        return StageCheckpoint(os.path.join(cache.cache_dir, "stages"))
+
+    def _get_metrics_dir(self) -> str | None:
+        # stage metrics are only recorded when a metrics_dir is configured
+        if not self._config.config:
+            return None
+        return self._config.config.get("metrics_dir")
+
+    def _save_metrics(self) -> None:
+        metrics_dir = self._get_metrics_dir()
+        if not metrics_dir:
+            return
+        trace = bool(self._config.config.get("metrics_trace", False))
+        path = save_metrics(stop_metrics(), metrics_dir, self._run_name, trace)
+        print(f'{Fore.GREEN}Saved stage metrics to {Fore.LIGHTYELLOW_EX}{path}{Style.RESET_ALL}')
+        logging.info(f"Saved stage metrics to {path}")
+
+    def _run_reports(self):
+        if not self._getReports():
+            return False
+        workers = self._get_workers()
+        stage_graph = self._reports_config.get_stage_graph()
+        cache = self._get_cache()
+        partitions = self._reports_config.get_partition_count()
+        archive_index = get_archive_index(self._config.config)
+        resume, self._resume = self._resume, False
+        if partitions > 1 and resume:
+            # partitioned runs aren't cached or journaled, so there is nothing to resume from
+            raise ValueError("--resume can't be used when the memory_budget splits the files into partitions")
+        if not self._keep_files:
+            self._reports_config.release_timeline()
+        if partitions > 1:
+            # a partition's results aren't the file's results, and workers would each hold a partition in memory
+            if workers != 1 or cache is not None:
+                print(f'{Fore.YELLOW}WARNING: {Fore.LIGHTYELLOW_EX}Files are split into {partitions} partitions, so reports are run one at a time without cached results{Style.RESET_ALL}')
+                logging.warning(f"WARNING! Files are split into {partitions} partitions, so workers and cache_dir aren't used")
+            PartitionedReportExecutor(self._getReports(), partitions, self._reports_config.load_partition, archive_index).run()
+            return True
+        journal = RunJournal(cache.cache_dir, self._getReports()) if cache is not None else None
+        if workers == 1:
+            ReportExecutor(self._getReports(), stage_graph, cache, archive_index, journal, resume, release_sources=not self._keep_files).run()
+        else:
+            ParallelReportExecutor(self._getReports(), workers, stage_graph, cache, archive_index, journal, resume).run()
+        return True
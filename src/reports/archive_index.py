@@ -0,0 +1,233 @@
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime as dt
+import pandas as pd
+
+from src.reports.archive_store import ArchiveStore
+from src.reports.delta import get_archive_format, read_archive, to_text
+from src.reports.output import OutputSink
+from src.reports.report import Report
+
+# columns with at most this many values have their rows counted by value when an archive is indexed
+MAX_GROUPS = 100
+# the report types of the reports config, by the name of their class
+REPORT_CLASS_NAMES = {"survey_results": "SurveyResults", "followup": "Followup", "referrals": "Referrals"}
+_TIMESTAMP = r'\d{8}-\d{6}'
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    file_prefix TEXT NOT NULL,
+    report_type TEXT,
+    partition TEXT,
+    timestamp TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    columns TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS archives_by_prefix ON archives (file_prefix, timestamp);
+CREATE TABLE IF NOT EXISTS counted_columns (
+    archive_id INTEGER NOT NULL,
+    col TEXT NOT NULL,
+    PRIMARY KEY (archive_id, col)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS value_counts (
+    archive_id INTEGER NOT NULL,
+    col TEXT NOT NULL,
+    value TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    PRIMARY KEY (archive_id, col, value)
+) WITHOUT ROWID;
+"""
+
+
+def get_archive_index(config: dict | None) -> "ArchiveIndex | None":
+    # the catalog of archives, from the "archive_index" key of config.json. Archives aren't indexed if it isn't set
+    path = (config or {}).get("archive_index")
+    if path is None:
+        return None
+    if not isinstance(path, str) or not path:
+        raise ValueError(f"Invalid archive_index {path}. Must be the path of the catalog file")
+    return ArchiveIndex(path)
+
+
+def parse_date(value: str | None, end: bool = False) -> str | None:
+    # a YYYY-MM-DD date as the first (or last) timestamp of that day
+    if value is None:
+        return None
+    try:
+        date = dt.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Invalid date {value}. Must be YYYY-MM-DD")
+    return date.strftime('%Y%m%d') + ('-235959' if end else '-000000')
+
+
+class ArchiveIndex():
+    """
+    A catalog of archived results, with the row count of each archive and the rows with each value of its columns
+    that have few values (like colleges or terms). Time series of archived results are answered from the catalog, and
+    archives are only read for counts it doesn't have yet, which are then added to it.
+    """
+    def __init__(self, path: str) -> None:
+        if not path or not isinstance(path, str):
+            raise ValueError("The archive index must be a valid file path")
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, report: Report) -> None:
+        # indexes the archives report.save_archive just saved, from the results still in memory
+        if not report.archive_dir or report.results is None or report.results.empty:
+            return
+        partitions = report.get_partitions(report.results)
+        with closing(self._connect()) as connection, connection:
+            for path, (partition, results) in zip(report.get_archive_paths(), partitions):
+                self._add(connection, path, report.file_prefix, report.report.get_class_name(), partition, report.get_timestamp(), results, report.archive_sink)
+        logging.debug(f"Indexed {len(partitions)} archives of {report.report.get_class_name()} in {self.path}")
+
+    def _add(self, connection: sqlite3.Connection, path: str, file_prefix: str, report_type: str | None,
+             partition: str | None, timestamp: str, results: pd.DataFrame, sink: OutputSink) -> None:
+        connection.execute("DELETE FROM value_counts WHERE archive_id IN (SELECT id FROM archives WHERE path = ?)", (path,))
+        connection.execute("DELETE FROM counted_columns WHERE archive_id IN (SELECT id FROM archives WHERE path = ?)", (path,))
+        connection.execute("DELETE FROM archives WHERE path = ?", (path,))
+        cursor = connection.execute(
+            "INSERT INTO archives (path, file_prefix, report_type, partition, timestamp, rows, columns) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, file_prefix, report_type, partition, timestamp, len(results), json.dumps([str(col) for col in results.columns]))
+        )
+        # results can have the same column more than once after a merge, and only the first is read back by name
+        columns = list(results.columns)
+        for position, col in enumerate(columns):
+            if columns.index(col) != position:
+                continue
+            counts = results.iloc[:, position].value_counts(dropna=False, sort=False)
+            if len(counts) <= MAX_GROUPS:
+                # values are counted as they are saved, so they are the same as the values of archives read from disk
+                values = to_text(pd.DataFrame({col: counts.index}), sink)[str(col)] if sink else counts.index.astype(str)
+                self._add_counts(connection, cursor.lastrowid, str(col), zip(values, counts.to_numpy()))
+
+    @staticmethod
+    def _add_counts(connection: sqlite3.Connection, archive_id: int, col: str, counts) -> None:
+        # the same text can come from more than one value (like 1 and 1.0 in an object column)
+        totals: dict[str, int] = {}
+        for value, rows in counts:
+            totals[value] = totals.get(value, 0) + int(rows)
+        connection.execute("INSERT OR REPLACE INTO counted_columns (archive_id, col) VALUES (?, ?)", (archive_id, col))
+        connection.executemany("INSERT OR REPLACE INTO value_counts (archive_id, col, value, rows) VALUES (?, ?, ?, ?)",
+                               [(archive_id, col, value, rows) for value, rows in totals.items()])
+
+    def sync(self, archive_dir: str, file_prefix: str, report_type: str | None = None, exclude_prefixes: list[str] | None = None) -> int:
+        """
+        Indexes the archives of a report that were saved without the index, like the ones saved before it was set up.
+
+        Args:
+            archive_dir (str): The report's archive directory.
+            file_prefix (str): The file prefix the report's archives are saved with.
+            report_type (str | None): The class name of the report.
+            exclude_prefixes (list[str] | None): Longer file prefixes of other reports, whose archives also start with file_prefix.
+
+        Returns:
+            int: The number of archives indexed.
+        """
+        pattern = re.escape(file_prefix) + f"(?:(.+)_)?({_TIMESTAMP})(\\..+)"
+        with closing(self._connect()) as connection:
+            indexed = {path for path, in connection.execute("SELECT path FROM archives WHERE path LIKE ? ESCAPE '!'",
+                                                            (self._escape_like(archive_dir + "\\") + "%",))}
+        paths = set(glob.glob(glob.escape(archive_dir + "\\" + file_prefix) + "*"))
+        added = 0
+        for path in sorted(paths - indexed):
+            name = path[len(archive_dir) + 1:]
+            match = re.fullmatch(pattern, name)
+            if not match or any(name.startswith(prefix) for prefix in exclude_prefixes or []):
+                continue
+            partition, timestamp, extension = match.groups()
+            if not ArchiveStore.is_manifest(path):
+                if get_archive_format(path) is None:
+                    continue
+                # archives restored from a manifest are already indexed by their manifest
+                if path[:-len(extension)] + ArchiveStore.MANIFEST_EXTENSION in paths:
+                    continue
+            try:
+                results = read_archive(path)
+            except (OSError, ValueError) as e:
+                logging.warning(f"WARNING! Cannot index archive {path}: {str(e)}")
+                continue
+            with closing(self._connect()) as connection, connection:
+                self._add(connection, path, file_prefix, report_type, partition, timestamp, results, None)
+            added += 1
+        if added:
+            logging.info(f"Indexed {added} archives of {file_prefix} in {archive_dir}")
+        return added
+
+    @staticmethod
+    def _escape_like(value: str) -> str:
+        return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+    def query(self, file_prefix: str, by: str | None = None, start: str | None = None, end: str | None = None) -> pd.DataFrame:
+        """
+        The rows of a report's results over time, from the archives of each run.
+
+        Args:
+            file_prefix (str): The file prefix the report's archives are saved with.
+            by (str | None): A results column (as archived, before rename_cols) to count the rows of each value of.
+            start (str | None): The first timestamp to include.
+            end (str | None): The last timestamp to include.
+
+        Returns:
+            pd.DataFrame: The run, (the value of by,) and rows of each run, with the rows of every partition of a run
+            added together.
+        """
+        conditions = ["file_prefix = ?"]
+        params: list = [file_prefix]
+        if start:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            conditions.append("timestamp <= ?")
+            params.append(end)
+        where = " AND ".join(conditions)
+        with closing(self._connect()) as connection, connection:
+            if by is None:
+                rows = connection.execute(f"SELECT timestamp, SUM(rows) FROM archives WHERE {where} GROUP BY timestamp ORDER BY timestamp", params).fetchall()
+                return self._to_frame(rows, ["run", "rows"])
+            self._count_column(connection, where, params, by)
+            rows = connection.execute(
+                f"SELECT archives.timestamp, value_counts.value, SUM(value_counts.rows) FROM archives "
+                f"JOIN value_counts ON value_counts.archive_id = archives.id AND value_counts.col = ? "
+                f"WHERE {where} GROUP BY archives.timestamp, value_counts.value ORDER BY archives.timestamp, value_counts.value",
+                [by] + params
+            ).fetchall()
+            return self._to_frame(rows, ["run", by, "rows"])
+
+    def _count_column(self, connection: sqlite3.Connection, where: str, params: list, col: str) -> None:
+        # archives that have the column but not its counts are read, only that column of them
+        missing = connection.execute(
+            f"SELECT id, path, columns FROM archives WHERE {where} AND id NOT IN (SELECT archive_id FROM counted_columns WHERE col = ?)",
+            params + [col]
+        ).fetchall()
+        for archive_id, path, columns in missing:
+            if col not in json.loads(columns):
+                continue
+            try:
+                values = read_archive(path, [col])[col]
+            except (OSError, ValueError) as e:
+                logging.warning(f"WARNING! Cannot read {col} from archive {path}: {str(e)}")
+                continue
+            counts = values.value_counts(sort=False)
+            self._add_counts(connection, archive_id, col, zip(counts.index, counts.to_numpy()))
+
+    @staticmethod
+    def _to_frame(rows: list[tuple], columns: list[str]) -> pd.DataFrame:
+        df = pd.DataFrame(rows, columns=columns)
+        df["run"] = pd.to_datetime(df["run"], format='%Y%m%d-%H%M%S')
+        df["rows"] = df["rows"].astype('int64')
+        return df
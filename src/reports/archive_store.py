@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zlib
+import pandas as pd
+
+from src.config.report_selection import DEFAULT_ROWS_PER_CHUNK
+from src.reports.output import OutputSink, serialize_csv
+
+
+class ArchiveStore():
+    """
+    Saves archives as chunks of rows that are stored once, however many archives they are in, and a manifest for each
+    archive that lists its chunks. Chunks end after rows picked by their contents, so rows added or removed between
+    runs only change the chunks around them, and the other chunks are the same files as in the last archive.
+    """
+    MANIFEST_EXTENSION = '.manifest.json'
+    CHUNK_EXTENSION = '.csv.gz'
+
+    def __init__(self, rows_per_chunk: int = DEFAULT_ROWS_PER_CHUNK) -> None:
+        if not isinstance(rows_per_chunk, int) or isinstance(rows_per_chunk, bool) or rows_per_chunk < 1:
+            raise ValueError("rows_per_chunk must be an integer greater than or equal to 1")
+        # chunks have this many rows on average, and between a quarter and four times as many
+        self.rows_per_chunk = rows_per_chunk
+
+    def __repr__(self) -> str:
+        return f"ArchiveStore(rows_per_chunk={self.rows_per_chunk})"
+
+    @staticmethod
+    def is_manifest(path: str) -> bool:
+        return path.endswith(ArchiveStore.MANIFEST_EXTENSION)
+
+    @staticmethod
+    def get_chunk_path(archive_dir: str, digest: str) -> str:
+        return archive_dir + "\\" + f"chunk_{digest}{ArchiveStore.CHUNK_EXTENSION}"
+
+    @staticmethod
+    def split_records(data: bytes) -> list[bytes]:
+        # a line ends a row unless it is inside a quoted value, which has an odd number of quotes before its end
+        records = []
+        start = line_start = quotes = 0
+        while True:
+            position = data.find(b'\n', line_start)
+            if position == -1:
+                break
+            quotes += data.count(b'"', line_start, position)
+            line_start = position + 1
+            if quotes % 2 == 0:
+                records.append(data[start:line_start])
+                start = line_start
+        if start < len(data):
+            records.append(data[start:])
+        return records
+
+    def get_chunks(self, records: list[bytes]) -> list[bytes]:
+        # a chunk ends after a row whose checksum is a multiple of rows_per_chunk, so chunks are cut in the same
+        # places whatever rows come before them
+        min_rows = max(1, self.rows_per_chunk // 4)
+        max_rows = self.rows_per_chunk * 4
+        chunks = []
+        chunk: list[bytes] = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= max_rows or (len(chunk) >= min_rows and zlib.crc32(record) % self.rows_per_chunk == 0):
+                chunks.append(b''.join(chunk))
+                chunk = []
+        if chunk:
+            chunks.append(b''.join(chunk))
+        return chunks
+
+    def save(self, df: pd.DataFrame, path: str, sink: OutputSink | None = None) -> dict:
+        """
+        Saves an archive as chunks and a manifest. The archive is the CSV file the sink would save, so it can be
+        put back together exactly.
+
+        Args:
+            df (pd.DataFrame): The results to archive.
+            path (str): The path of the manifest, in the archive directory the chunks are saved to.
+            sink (OutputSink | None): The sink the archive would be saved with, which sets whether the index is saved.
+
+        Returns:
+            dict: The manifest.
+        """
+        sink = sink or OutputSink(index=False)
+        if sink.format != OutputSink.CSV:
+            raise ValueError(f"Archives can only be stored as chunks of CSV files, not {sink.format} files")
+        archive_dir = path.rsplit("\\", 1)[0]
+        data = serialize_csv(df, sink.index)
+        records = ArchiveStore.split_records(data)
+        # the header is kept in the manifest, so a change of columns doesn't change every chunk
+        header, chunks = (records[0], self.get_chunks(records[1:])) if records else (b'', [])
+        digests = []
+        new_chunks = 0
+        for chunk in chunks:
+            digest = hashlib.sha256(chunk).hexdigest()
+            digests.append(digest)
+            if self._save_chunk(ArchiveStore.get_chunk_path(archive_dir, digest), chunk):
+                new_chunks += 1
+        manifest = {
+            "header": header.decode('utf-8'),
+            "chunks": digests,
+            "rows": len(df),
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest()
+        }
+        with open(path, 'w') as file:
+            json.dump(manifest, file, indent=4)
+        logging.debug(f"Stored archive {path} in {len(digests)} chunks, {new_chunks} of them new")
+        return manifest
+
+    @staticmethod
+    def _save_chunk(path: str, chunk: bytes) -> bool:
+        # returns False if the chunk was already stored
+        if os.path.exists(path):
+            return False
+        directory, name = os.path.split(path)
+        # chunks are written to a temporary file first, so a chunk another thread is writing is never read half written
+        descriptor, temp_path = tempfile.mkstemp(prefix=name, dir=directory or None)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(gzip.compress(chunk, mtime=0))
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return True
+
+    @staticmethod
+    def load(path: str) -> bytes:
+        """
+        Puts an archive back together from its manifest and chunks.
+
+        Args:
+            path (str): The path of the manifest.
+
+        Returns:
+            bytes: The CSV file the archive was saved from.
+
+        Raises:
+            ValueError: If a chunk is missing or the archive isn't the same as the one that was saved.
+        """
+        archive_dir = path.rsplit("\\", 1)[0]
+        with open(path) as file:
+            manifest = json.load(file)
+        parts = [manifest["header"].encode('utf-8')]
+        for digest in manifest["chunks"]:
+            chunk_path = ArchiveStore.get_chunk_path(archive_dir, digest)
+            try:
+                with open(chunk_path, 'rb') as file:
+                    parts.append(gzip.decompress(file.read()))
+            except FileNotFoundError:
+                raise ValueError(f"Cannot load archive {path}. Chunk {chunk_path} is missing")
+        data = b''.join(parts)
+        if hashlib.sha256(data).hexdigest() != manifest["sha256"]:
+            raise ValueError(f"Cannot load archive {path}. Its chunks don't match the archive that was saved")
+        return data
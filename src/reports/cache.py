@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import threading
+import pandas as pd
+from colorama import Fore, Style
+
+from src.reports.report import Report
+from src.utils.general_utils import get_canonical_hash
+
+# bump when the results a report makes from the same inputs change, so older cached results aren't reused
+CACHE_VERSION = 3
+
+
+class ResultCache():
+    """
+    The results of each report, saved after it runs and before its files are saved, so a run that stops while saving
+    (or in a later report) doesn't run them again. Results are cached by the report's inputs, without the config keys
+    that only change how they are saved (like rename_cols, final_cols or the output format), so a report whose saved
+    columns or formats change is saved from its cached results.
+    """
+    def __init__(self, cache_dir: str) -> None:
+        if not cache_dir or not isinstance(cache_dir, str):
+            raise ValueError("cache_dir must be a valid directory")
+        self.cache_dir = cache_dir
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"v{CACHE_VERSION}_{key}.pkl")
+
+    @staticmethod
+    def has_columns(cached: list[list[str]], projected: list[list[str]]) -> bool:
+        # results cached with every column a report now runs with have the columns it saves. Extra columns are the
+        # ones the report no longer saves, which are removed when its results are saved
+        if len(cached) != len(projected):
+            return False
+        return all(set(cols) <= set(cached_cols) for cached_cols, cols in zip(cached, projected))
+
+    def load(self, report: Report) -> bool:
+        key = report.get_cache_key()
+        if key is None or not os.path.exists(self._get_path(key)):
+            return False
+        try:
+            cached = pd.read_pickle(self._get_path(key))
+        except Exception as e:
+            logging.warning(f"Could not load cached results of {report.report.get_class_name()} report: {str(e)}")
+            return False
+        if not ResultCache.has_columns(cached["columns"], report.get_projected_columns()):
+            logging.debug(f"\tCached results of {report.report.get_class_name()} report don't have the columns it saves")
+            return False
+        report.results = cached["results"]
+        logging.debug(f"\tUsing cached results of {report.report.get_class_name()} report with {len(report.results)} results")
+        print(f'\t{Fore.GREEN}Using cached results of {Fore.LIGHTYELLOW_EX}{report.report.get_class_name()} {Fore.GREEN}report with {Fore.LIGHTMAGENTA_EX}{len(report.results)} {Fore.GREEN}results{Style.RESET_ALL}')
+        return True
+
+    def store(self, report: Report) -> None:
+        key = report.get_cache_key()
+        if key is None:
+            return
+        results = report.results
+        if results is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # written to a temporary file first so a cancelled run never leaves a partial cache entry
+        path = self._get_path(key)
+        pd.to_pickle({"columns": report.get_projected_columns(), "results": results}, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        logging.debug(f"Cached results of {report.report.get_class_name()} report to {path}")
+
+
+class RunJournal():
+    """
+    The timestamp of a run and the reports it has saved, kept in the cache directory until the run finishes. A run
+    that stops partway through is resumed with the same timestamp, saving only the reports it hadn't saved yet (from
+    their cached results, if they were run).
+    """
+    def __init__(self, cache_dir: str, reports: list[Report]) -> None:
+        if not cache_dir or not isinstance(cache_dir, str):
+            raise ValueError("cache_dir must be a valid directory")
+        # runs of different reports have their own journals
+        key = get_canonical_hash([RunJournal.get_name(report) for report in reports])
+        self.path = os.path.join(cache_dir, f"run_{key}.json")
+        self.timestamp: str | None = None
+        self.saved: list[str] = []
+        self._finished = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_name(report: Report) -> str:
+        return f"{report.report.get_class_name()} {report.file_prefix}"
+
+    def start(self, timestamp: str, resume: bool = False) -> str:
+        """
+        Starts the journal of a run.
+
+        Args:
+            timestamp (str): The timestamp of the run.
+            resume (bool): Whether to resume the last run of the same reports, if it didn't finish.
+
+        Returns:
+            str: The timestamp the run's files are saved with, which is the stopped run's if it is resumed.
+        """
+        if resume:
+            try:
+                with open(self.path) as file:
+                    journal = json.load(file)
+                self.timestamp, self.saved = journal["timestamp"], journal["saved"]
+                logging.info(f"Resuming the run from {self.timestamp}, which saved {len(self.saved)} reports")
+                print(f'{Fore.CYAN}Resuming the run from {Fore.LIGHTYELLOW_EX}{self.timestamp}{Fore.CYAN}, which saved {Fore.LIGHTMAGENTA_EX}{len(self.saved)}{Fore.CYAN} reports{Style.RESET_ALL}')
+                return self.timestamp
+            except FileNotFoundError:
+                logging.info("No stopped run of these reports to resume")
+                print(f'{Fore.YELLOW}No stopped run of these reports to resume. Running every report{Style.RESET_ALL}')
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Could not read the run journal {self.path}: {str(e)}")
+        self.timestamp, self.saved = timestamp, []
+        self._write()
+        return self.timestamp
+
+    def is_saved(self, report: Report) -> bool:
+        return RunJournal.get_name(report) in self.saved
+
+    def mark_saved(self, report: Report) -> None:
+        # called once the report's files are written, which can be on an output thread
+        with self._lock:
+            if self._finished:
+                return
+            self.saved.append(RunJournal.get_name(report))
+            self._write()
+
+    def finish(self) -> None:
+        # a run that finished has nothing to resume
+        with self._lock:
+            self._finished = True
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _write(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", 'w') as file:
+            json.dump({"timestamp": self.timestamp, "saved": self.saved}, file)
+        os.replace(self.path + ".tmp", self.path)
@@ -0,0 +1,140 @@
+import glob
+import io
+import json
+import logging
+import re
+import numpy as np
+import pandas as pd
+
+from src.reports.archive_store import ArchiveStore
+from src.reports.output import OutputSink
+
+# the column that numbers rows with the same key, so every row has a unique key
+_OCCURRENCE = '__occurrence'
+_TIMESTAMP = r'\d{8}-\d{6}'
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+DELTA_KINDS = [ADDED, REMOVED, CHANGED]
+
+
+def read_text(source: str | io.BytesIO, format: str, compression: str | None = None, columns: list[str] | None = None) -> pd.DataFrame:
+    # every value as the text it was saved as, so results read back from an archive compare equal to the results saved.
+    # Only columns are read, if they are given
+    if format == OutputSink.CSV:
+        return pd.read_csv(source, dtype=str, keep_default_na=False, compression=compression or 'infer', usecols=columns)
+    if format == OutputSink.PARQUET:
+        return pd.read_parquet(source, columns=columns).astype(str)
+    return pd.read_feather(source, columns=columns).astype(str)
+
+
+def get_archive_format(path: str) -> str | None:
+    # the format is found from the extension, since the archive format may have changed since it was saved
+    for format, extension in OutputSink.EXTENSIONS.items():
+        if path.endswith(extension) or any(path.endswith(extension + suffix) for suffix in OutputSink.COMPRESSION_EXTENSIONS.values()):
+            return format
+    return None
+
+
+def read_archive(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    if ArchiveStore.is_manifest(path):
+        return read_text(io.BytesIO(ArchiveStore.load(path)), OutputSink.CSV, columns=columns)
+    format = get_archive_format(path)
+    if format is not None:
+        return read_text(path, format, columns=columns)
+    raise ValueError(f"Cannot read archive {path}. Unknown format")
+
+
+def to_text(df: pd.DataFrame, sink: OutputSink) -> pd.DataFrame:
+    # the results as they are read back from a file the sink saved
+    return read_text(io.BytesIO(sink.serialize(df)), sink.format, sink.compression)
+
+
+def get_row_keys(df: pd.DataFrame, key: list[str]) -> pd.MultiIndex:
+    # rows with the same key are told apart by the order they are in
+    occurrence = df.groupby(key, sort=False, dropna=False).cumcount()
+    return pd.MultiIndex.from_frame(df[key].assign(**{_OCCURRENCE: occurrence.to_numpy()}))
+
+
+def compare_results(previous: pd.DataFrame, current: pd.DataFrame, key: list[str]) -> dict[str, np.ndarray]:
+    """
+    Compares results by a row key. Both DataFrames should have their values as text (like read_text gives them), so
+    values compare the way they are saved.
+
+    Args:
+        previous (pd.DataFrame): The previous results.
+        current (pd.DataFrame): The current results.
+        key (list[str]): The columns that identify a row in both results.
+
+    Returns:
+        dict[str, np.ndarray]: The positions of the added rows (in current), removed rows (in previous) and changed
+        rows (in current). A row is changed if any of the current columns has another value, or wasn't saved before.
+    """
+    previous = previous.reindex(columns=current.columns)
+    current_keys = get_row_keys(current, key)
+    previous_keys = get_row_keys(previous, key)
+    matches = previous_keys.get_indexer(current_keys)
+    matched = np.flatnonzero(matches != -1)
+    differs = (current.iloc[matched].to_numpy() != previous.iloc[matches[matched]].to_numpy()).any(axis=1)
+    return {
+        ADDED: np.flatnonzero(matches == -1),
+        REMOVED: np.flatnonzero(current_keys.get_indexer(previous_keys) == -1),
+        CHANGED: matched[differs]
+    }
+
+
+def find_files(directory: str, pattern: str) -> list[tuple[str, str]]:
+    # the paths of files in directory whose name matches pattern, with the timestamp the pattern captures
+    found = []
+    for path in glob.glob(glob.escape(directory + "\\") + "*"):
+        match = re.fullmatch(pattern, path[len(directory) + 1:])
+        if match:
+            found.append((path, match.group(1)))
+    return found
+
+
+def get_manifest_pattern(file_prefix: str) -> str:
+    return re.escape(file_prefix) + f"delta_({_TIMESTAMP})" + re.escape(".json")
+
+
+def find_previous_archives(results_dir: str, archive_dir: str, file_prefix: str, extension: str, timestamp: str) -> tuple[str | None, list[str]]:
+    """
+    Finds the archive files of the last run before timestamp. The delta manifest of the last run lists them, and if
+    there isn't one (like the first time a delta is saved) the most recent archive file is used.
+
+    Args:
+        results_dir (str): The directory delta manifests are saved to.
+        archive_dir (str): The directory archives are saved to.
+        file_prefix (str): The file prefix of the report.
+        extension (str): The extension of the report's archive files.
+        timestamp (str): The timestamp of the current run.
+
+    Returns:
+        tuple[str | None, list[str]]: The timestamp of the last run, and its archive files. (None, []) if there isn't one.
+    """
+    manifests = [(path, found) for path, found in find_files(results_dir, get_manifest_pattern(file_prefix)) if found < timestamp]
+    if manifests:
+        path, found = max(manifests, key=lambda manifest: manifest[1])
+        with open(path) as file:
+            return found, json.load(file)["archives"]
+    pattern = re.escape(file_prefix) + f"({_TIMESTAMP})" + re.escape(extension)
+    archives = [(path, found) for path, found in find_files(archive_dir, pattern) if found < timestamp]
+    if not archives:
+        return None, []
+    path, found = max(archives, key=lambda archive: archive[1])
+    return found, [path]
+
+
+def load_archives(paths: list[str]) -> pd.DataFrame | None:
+    # the archive files of a run, as one DataFrame. None if any of them is missing, since a delta against part of a
+    # run's results would report the rest as added
+    frames = []
+    for path in paths:
+        try:
+            frames.append(read_archive(path))
+        except FileNotFoundError:
+            logging.warning(f"WARNING! Cannot find the previous archive {path}. Every row will be saved as added")
+            return None
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,309 @@
+import io
+import logging
+import multiprocessing
+import tracemalloc
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime as dt
+import pandas as pd
+from colorama import Fore, Style
+
+from src.reports.archive_index import ArchiveIndex
+from src.reports.cache import ResultCache, RunJournal
+from src.reports.lifecycle import ReportLifecycle
+from src.reports.output import OutputWriter
+from src.reports.report import Report
+from src.reports.stages import StageGraph
+from src.utils.metrics_utils import StageMetric, add_metrics, is_measuring, measure, start_metrics, take_metrics
+from src.utils.profile_utils import ProfileConfig, get_profile_config, start_profiling
+from src.utils.shm_utils import release_shared_frames, share_frame
+from src.utils.spill_utils import release_spill_files
+
+
+class ReportExecutor():
+    def __init__(self, reports: list[Report], stage_graph: StageGraph | None = None, cache: ResultCache | None = None, archive_index: ArchiveIndex | None = None,
+                 journal: RunJournal | None = None, resume: bool = False, release_sources: bool = False) -> None:
+        if not isinstance(reports, list) or not all(isinstance(report, Report) for report in reports):
+            raise ValueError("Reports must be a list of type Report")
+        if resume and journal is None:
+            raise ValueError("A run can only be resumed with a run journal")
+        self.reports = reports
+        self.stage_graph = stage_graph
+        self.cache = cache
+        # saved archives are added to the archive index, if there is one
+        self.archive_index = archive_index
+        # the reports saved by the run are recorded in the journal, and the last run is continued if resume is set
+        self.journal = journal
+        self.resume = resume
+        # the loaded DataSets are let go after the last report that uses them, if nothing else will use them again
+        self.release_sources = release_sources
+
+    def _load_cached(self, reports: list[Report]) -> list[Report]:
+        # returns the reports that still need to be run
+        if self.cache is None:
+            return reports
+        pending = [report for report in reports if not self.cache.load(report)]
+        if len(pending) < len(reports):
+            logging.info(f"Using cached results for {len(reports) - len(pending)} of {len(reports)} reports")
+        return pending
+
+    def _start_journal(self) -> list[Report]:
+        # returns the reports that still need to be saved, which is all of them unless a stopped run is resumed
+        if self.journal is None or not self.reports:
+            return self.reports
+        timestamp = self.journal.start(self.reports[0].timestamp, self.resume)
+        for report in self.reports:
+            report.timestamp = timestamp
+        unsaved = [report for report in self.reports if not self.journal.is_saved(report)]
+        if len(unsaved) < len(self.reports):
+            logging.info(f"Skipping {len(self.reports) - len(unsaved)} reports the resumed run already saved")
+        return unsaved
+
+    def _finish_journal(self) -> None:
+        if self.journal is not None:
+            self.journal.finish()
+
+    def _cache_report(self, report: Report) -> None:
+        if self.cache is not None:
+            self.cache.store(report)
+
+    def _share_stages(self, reports: list[Report]) -> None:
+        if self.stage_graph is not None:
+            # cached reports don't run, so only the stages of the pending reports are shared
+            if len(reports) < len(self.reports):
+                self.stage_graph.compile(reports)
+            self.stage_graph.share()
+
+    def _set_timestamp(self) -> None:
+        # every file saved by a run is named with the time the run started
+        timestamp = dt.now().strftime('%Y%m%d-%H%M%S')
+        for report in self.reports:
+            report.timestamp = timestamp
+
+    def run(self) -> None:
+        self._set_timestamp()
+        unsaved = self._start_journal()
+        pending = self._load_cached(unsaved)
+        lifecycle = ReportLifecycle(pending, self.release_sources)
+        self._share_stages(pending)
+        lifecycle.start(self.stage_graph)
+        # files are written in the background while the next report runs
+        with OutputWriter() as writer:
+            for report in unsaved:
+                if report in pending:
+                    report.run_report()
+                    self._cache_report(report)
+                self._save_report(report, writer)
+                lifecycle.saved(report)
+        self._finish_journal()
+
+    def _save_report(self, report: Report, writer: OutputWriter | None = None) -> None:
+        logging.info(f"Successfully ran {report.report.get_class_name()} report")
+        with measure(f"{report.report.get_class_name()} {report.file_prefix}", "save"):
+            report.save_archive(writer)
+            logging.info(f"Saved archive of {report.report.get_class_name()} report to {report.archive_dir}")
+            if self.archive_index is not None:
+                self.archive_index.add(report)
+            report.save_results(writer)
+            logging.info(f"Saved results of {report.report.get_class_name()} report to {report.results_dir}")
+        if self.journal is not None:
+            if writer is None:
+                self.journal.mark_saved(report)
+            else:
+                writer.when_written(lambda: self.journal.mark_saved(report))
+
+
+class PartitionedReportExecutor(ReportExecutor):
+    """
+    Runs reports on one partition of the students at a time, for files that don't fit in memory together. Every
+    partition's DataSets are loaded by load_partition, and the results of each partition are combined in the order a
+    run on every student gives them before they are saved.
+    """
+    def __init__(self, reports: list[Report], partitions: int, load_partition: Callable[[int], tuple[list[Report], StageGraph]], archive_index: ArchiveIndex | None = None) -> None:
+        super().__init__(reports, archive_index=archive_index)
+        if not isinstance(partitions, int) or partitions < 1:
+            raise ValueError("partitions must be an integer greater than or equal to 1")
+        self.partitions = partitions
+        self.load_partition = load_partition
+
+    def run(self) -> None:
+        timestamp = dt.now().strftime('%Y%m%d-%H%M%S')
+        results: list[list[pd.DataFrame | None]] = [[] for _ in self.reports]
+        # the first error of each report, by its position in the reports
+        errors: dict[int, ValueError] = {}
+        try:
+            for partition in range(self.partitions):
+                logging.info(f"Running reports on partition {partition + 1} of {self.partitions}")
+                print(f'{Fore.CYAN}Running reports on partition {Fore.LIGHTMAGENTA_EX}{partition + 1}{Fore.CYAN} of {Fore.LIGHTMAGENTA_EX}{self.partitions}{Style.RESET_ALL}')
+                # the last partition's reports are let go first, so two partitions are never loaded at once
+                self.reports = []
+                self.reports, self.stage_graph = self.load_partition(partition)
+                if len(self.reports) != len(results):
+                    raise ValueError(f"Partition {partition} loaded {len(self.reports)} reports instead of {len(results)}")
+                self._share_stages(self.reports)
+                with measure(f"partition {partition}", "partition"):
+                    for index, report in enumerate(self.reports):
+                        results[index].append(self._run_partition(report, partition, errors, index))
+            # the last partition's reports save the combined results, since they have the same config
+            with OutputWriter() as writer:
+                for index, (report, partition_results) in enumerate(zip(self.reports, results)):
+                    # a report is only an error if it has no results in any partition, like a run on every student
+                    if index in errors and all(partition_result is None for partition_result in partition_results):
+                        raise errors[index]
+                    report.timestamp = timestamp
+                    report.results = report.report.combine_partitions(partition_results)
+                    self._save_report(report, writer)
+        finally:
+            release_spill_files()
+
+    @staticmethod
+    def _run_partition(report: Report, partition: int, errors: dict[int, ValueError], index: int) -> pd.DataFrame | None:
+        # some partitions may have none of the rows a report needs (like a partition without walk-ins), which the
+        # report treats as an error. Those partitions have no results, and the other partitions' results are saved
+        try:
+            report.run_report()
+        except ValueError as e:
+            errors.setdefault(index, e)
+            logging.warning(f"{report.report.get_class_name()} report has no results in partition {partition + 1}: {str(e)}")
+            print(f'\t{Fore.LIGHTYELLOW_EX}{report.report.get_class_name()} {Fore.YELLOW}report has no results in partition {Fore.LIGHTMAGENTA_EX}{partition + 1}{Fore.YELLOW}: {str(e)}{Style.RESET_ALL}')
+            return None
+        return report.results
+
+
+class ReportOutput():
+    def __init__(self, results: pd.DataFrame | None, stdout: str, records: list[logging.LogRecord], error: BaseException | None = None, metrics: list[StageMetric] | None = None) -> None:
+        self.results = results
+        self.stdout = stdout
+        self.records = records
+        self.error = error
+        self.metrics = metrics or []
+
+
+class ParallelReportExecutor(ReportExecutor):
+    """
+    Runs groups of reports that share stages in worker processes, and saves their results in the main process in the
+    order of a sequential run.
+
+    The loaded files are placed in shared memory once (see SharedFrame). Only their number, boolean and naive date
+    columns are read in place by the workers. String and other object columns (names, emails, appointment types),
+    extension type columns and the index are pickled into the segment, and every worker that runs a report on a file
+    unpickles its own copy of them. Those columns are most of an export, so the memory a run uses grows with the
+    number of workers: about the size of each file's string columns for every worker that uses the file, on top of
+    the one shared copy. They aren't stored as fixed-width strings in the segment, since pandas turns those into
+    Python objects when the DataFrame is made, which is the same copy. Lower workers if a run uses too much memory.
+    """
+    def __init__(self, reports: list[Report], workers: int | None = None, stage_graph: StageGraph | None = None, cache: ResultCache | None = None, archive_index: ArchiveIndex | None = None,
+                 journal: RunJournal | None = None, resume: bool = False) -> None:
+        super().__init__(reports, stage_graph, cache, archive_index, journal, resume)
+        if workers is not None and (not isinstance(workers, int) or workers < 1):
+            raise ValueError("workers must be an integer greater than or equal to 1")
+        self.workers = workers
+
+    def run(self) -> None:
+        self._set_timestamp()
+        with OutputWriter() as writer:
+            self._run(writer)
+        self._finish_journal()
+
+    def _run(self, writer: OutputWriter) -> None:
+        unsaved = self._start_journal()
+        pending = self._load_cached(unsaved)
+        # the DataSets the workers run with are their own, so only the reports' results and copies are let go here
+        lifecycle = ReportLifecycle(pending)
+        for report in unsaved:
+            if report not in pending:
+                self._save_report(report, writer)
+                lifecycle.saved(report)
+        groups = self._group_reports(pending)
+        logging.info(f"Running {len(pending)} reports in {len(groups)} groups with {self.workers or 'all available'} workers")
+        print(f'{Fore.CYAN}Running {Fore.LIGHTMAGENTA_EX}{len(pending)}{Fore.CYAN} reports with {Fore.LIGHTMAGENTA_EX}{self.workers or "all available"}{Fore.CYAN} workers{Style.RESET_ALL}')
+        if not pending:
+            return
+        self._share_stages(pending)
+        lifecycle.start()
+        self._share_datasets(pending)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(),
+                initializer=_init_worker,
+                initargs=(logging.getLogger().getEffectiveLevel(), is_measuring(), tracemalloc.is_tracing(), get_profile_config())
+            ) as pool:
+                futures: list[Future] = [pool.submit(_run_report_group, group) for group in groups]
+                # worker output is replayed in report order, so the console, log and file names match a sequential run
+                for group, future in zip(groups, futures):
+                    for report, output in zip(group, future.result()):
+                        self._replay_output(output)
+                        add_metrics(output.metrics)
+                        if output.error is not None:
+                            raise output.error
+                        report.results = output.results
+                        self._cache_report(report)
+                        self._save_report(report, writer)
+                        lifecycle.saved(report)
+        finally:
+            release_shared_frames()
+
+    def _group_reports(self, reports: list[Report]) -> list[list[Report]]:
+        # reports that share a run (e.g. the surveys of a multi-survey report) are run by the same worker
+        groups: dict[int, list[Report]] = {}
+        for report in reports:
+            groups.setdefault(id(report.report.get_shared_report()), []).append(report)
+        return list(groups.values())
+
+    def _share_datasets(self, reports: list[Report]) -> None:
+        for report in reports:
+            for dataset in report.report.get_datasets():
+                if not dataset.is_copied():
+                    share_frame(dataset.get_origin().get_df())
+
+    @staticmethod
+    def _replay_output(output: ReportOutput) -> None:
+        if output.stdout:
+            print(output.stdout, end='')
+        for record in output.records:
+            logging.getLogger(record.name).handle(record)
+
+
+class _RecordCollector(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # format the message now so the record can be pickled back to the main process
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+_collector = _RecordCollector()
+
+
+def _init_worker(level: int, metrics: bool = False, memory: bool = False, profile_config: ProfileConfig | None = None) -> None:
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_collector)
+    root.setLevel(level)
+    if metrics:
+        start_metrics(memory)
+    if profile_config:
+        start_profiling(profile_config)
+
+
+def _run_report_group(reports: list[Report]) -> list[ReportOutput]:
+    outputs = []
+    for report in reports:
+        _collector.records = []
+        stdout = io.StringIO()
+        try:
+            with redirect_stdout(stdout):
+                report.run_report()
+        except Exception as e:
+            outputs.append(ReportOutput(None, stdout.getvalue(), _collector.records, e, take_metrics()))
+            break
+        outputs.append(ReportOutput(report.results, stdout.getvalue(), _collector.records, metrics=take_metrics()))
+    return outputs
@@ -1,32 +1,49 @@
 import logging
+import numpy as np
 import pandas as pd
 from src.dataset.appointment import AppointmentDataSet
+from src.dataset.dataset import DataSet
+from src.dataset.stage import Stage
 from src.reports.report import Report
-from src.utils.general_utils import get_date_ranges
+from src.utils.engine_utils import ENGINES, PANDAS, POLARS, to_pandas, to_polars
+from src.utils.metrics_utils import measure_step
+from src.utils.general_utils import get_date_ranges, get_labeled_date_ranges
 from src.utils.type_utils import FilterType
 
 
 class Followup(Report):
     def __init__(self, appointments: AppointmentDataSet, valid_schools: FilterType, target_date_ranges: str | None,
-                 require_followup: FilterType, followup_types: FilterType) -> None:
+                 require_followup: FilterType, followup_types: FilterType, partition_terms: bool = False, engine: str = PANDAS) -> None:
         if not isinstance(valid_schools, FilterType):
             raise ValueError("valid_schools must be a FilterType")
         if not isinstance(require_followup, FilterType):
             raise ValueError("require_followup must be a FilterType")
         if not isinstance(followup_types, FilterType):
             raise ValueError("followup_types must be a FilterType")
+        if partition_terms and target_date_ranges is None:
+            raise ValueError("target_date_ranges must be given to partition the results by term")
+        if engine not in ENGINES:
+            raise ValueError(f"Invalid engine {engine}. Must be one of {ENGINES}")
         self._appointments = appointments
         self.results = None
         self._valid_schools = valid_schools
         self.target_date_ranges = target_date_ranges
         self._require_followup = require_followup
         self._latest_followup_col = 'date of last followup appointment'
+        # the timeline's student code of each row of the results, while the report runs with a timeline
+        self._student_code_col = '__student_code'
         self.followup_types = followup_types
+        # every date range is run at once, with each student's appointments in each range kept separate
+        self.partition_terms = partition_terms
+        self.engine = engine
 
     def run_report(self):
-        self._filter_target_date_ranges()
+        self._run_stages()
+        if self.engine == POLARS:
+            self._run_polars()
+            logging.debug("Ran followup report with polars")
+            return
         logging.debug(f"Filtered appointments for target date ranges: {self.target_date_ranges}")
-        self._filter_schools()
         logging.debug(f"Filtered student schools: {self._valid_schools}")
         self._get_all_need_followup()
         logging.debug(f"Filtered students that need a followup {self._latest_followup_col} appointment")
@@ -42,13 +59,47 @@ class Followup(Report):
     def get_results(self):
         return self.results
 
-    def _filter_target_date_ranges(self):
-        if self.target_date_ranges is not None:
-            self._appointments.filter_dates(*get_date_ranges(self.target_date_ranges))
+    def get_datasets(self) -> list[DataSet]:
+        return [self._appointments]
 
-    def _filter_schools(self):
-        self._appointments.filter_schools(self._valid_schools)
+    def get_row_key(self) -> list[str]:
+        # the results have one row for each student (in each term)
+        return self._get_student_keys()
 
+    def combine_partitions(self, results: list[pd.DataFrame | None]) -> pd.DataFrame | None:
+        # students are in the order their groups are in, and a student is only in one partition
+        combined = super().combine_partitions(results)
+        if combined is None:
+            return None
+        return combined.sort_values(by=self._get_student_keys(), kind='stable', ignore_index=True)
+
+    def get_stages(self) -> list[tuple[DataSet, list[Stage]]]:
+        stages = []
+        if self.target_date_ranges is not None and not self.partition_terms:
+            stages.append(Stage('filter_dates', *get_date_ranges(self.target_date_ranges)))
+        stages.append(Stage('filter_schools', self._valid_schools))
+        stages += self._get_projection_stages(self._appointments)
+        if self.partition_terms:
+            # the term column is added after projecting, so the projection doesn't drop it
+            stages.append(Stage('tag_date_ranges', self.term_col, *get_labeled_date_ranges(self.target_date_ranges)))
+        return [(self._appointments, stages)]
+
+    def uses_timeline(self) -> bool:
+        # results partitioned by term are grouped by email and term, and polars groups by email itself
+        return self.engine == PANDAS and not self.partition_terms
+
+    def _get_student_codes(self, df: pd.DataFrame) -> np.ndarray | None:
+        # students are grouped by the timeline's codes instead of their emails if there is a timeline
+        if not self.uses_timeline():
+            return None
+        return self.get_student_codes(self._appointments, df)
+
+    def _get_student_keys(self) -> list[str]:
+        # students are grouped by their email, and by term if the results are partitioned by term
+        email_col = self._appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
+        return [email_col, self.term_col] if self.partition_terms else [email_col]
+
+    @measure_step
     def _get_all_need_followup(self):
         app_type_col = self._appointments.get_col_name(AppointmentDataSet.Column.APPOINTMENT_TYPE)
         if not app_type_col:
@@ -65,6 +116,7 @@ class Followup(Report):
             )
         ]
 
+    @measure_step
     def _remove_followed_up(self):
         date_col = self._appointments.get_col_name(AppointmentDataSet.Column.DATE)
 
@@ -80,6 +132,7 @@ class Followup(Report):
             )
         )]
 
+    @measure_step
     def _keep_max_date(self):
         date_col = self._appointments.get_col_name(AppointmentDataSet.Column.DATE)
         email_col = self._appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
@@ -87,7 +140,13 @@ class Followup(Report):
             raise ValueError("Date or email column is not defined")
         if self.results is None or self.results.empty:
             raise ValueError("Results are undefined. Is the script running in the correct order?")
-        self.results = self.results.loc[self.results.groupby(by=email_col)[date_col].idxmax()]
+        if self._student_code_col in self.results.columns:
+            # codes are in the order of the emails, so students are in the same order as when grouped by email.
+            # Rows without an email (-1) aren't a student's, the same as groupby dropping them
+            max_dates = self.results.groupby(by=self._student_code_col)[date_col].idxmax()
+            self.results = self.results.loc[max_dates.drop(index=-1, errors='ignore')]
+            return
+        self.results = self.results.loc[self.results.groupby(by=self._get_student_keys())[date_col].idxmax()]
 
     def _get_latest_valid_followup_dates(self) -> pd.DataFrame:
         email_col = self._appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
@@ -96,28 +155,68 @@ class Followup(Report):
             raise ValueError("Email or date column is not defined")
         valid_followup = self._get_followup_appointments()
         logging.debug("got valid followup appointments")
-        return valid_followup.groupby(by=email_col)[date_col].max().reset_index(
+        return valid_followup.groupby(by=self._get_student_keys())[date_col].max().reset_index(
             name=self._latest_followup_col
         )
 
+    @measure_step
     def _add_latest_followup(self):
-        email_col = self._appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
         if self.results is None or self.results.empty:
             raise ValueError("Results are undefined. Is the script running in the correct order?")
+        codes = self._get_student_codes(self.results)
+        if codes is not None:
+            followup = self._get_followup_appointments()
+            if not followup.empty and self._add_latest_followup_by_code(codes, followup):
+                return
         self.results = pd.merge(
             left=self.results,
             right=self._get_latest_valid_followup_dates(),
-            on=email_col,
+            on=self._get_student_keys(),
             how='left'
         )
 
+    def _add_latest_followup_by_code(self, codes: np.ndarray, followup: pd.DataFrame) -> bool:
+        # the same as merging the latest followup of each email, found by scanning each student's events in the
+        # timeline instead of grouping the followup appointments. The codes are kept for the next steps
+        date_col = self._appointments.get_col_name(AppointmentDataSet.Column.DATE)
+        latest = self._timeline.get_latest(self._appointments, followup[date_col])
+        if latest is None:
+            return False
+        rows = np.where(codes >= 0, latest[np.maximum(codes, 0)], -1) if len(latest) else np.full(len(codes), -1)
+        self.results = self.results.reset_index(drop=True)
+        self.results[self._latest_followup_col] = followup[date_col].reset_index(drop=True).reindex(rows).to_numpy()
+        self.results[self._student_code_col] = codes
+        return True
+
+    def _add_past_followup_count_by_code(self, col_name: str) -> bool:
+        # each student's followup appointments are counted in their slice of the timeline's events
+        followup = self._get_followup_appointments()
+        counts = self._timeline.get_student_counts(self._appointments, followup.index) if not followup.empty else None
+        if counts is None:
+            return False
+        codes = self.results.pop(self._student_code_col).to_numpy()
+        result_counts = np.where(codes >= 0, counts[np.maximum(codes, 0)], 0) if len(counts) else np.zeros(len(codes), dtype=np.int64)
+        self.results = self.results.reset_index(drop=True)
+        # students without followup appointments have no count, the same as a left merge
+        if (result_counts == 0).any():
+            self.results[col_name] = np.where(result_counts > 0, result_counts, np.nan)
+        else:
+            self.results[col_name] = result_counts.astype(np.int64)
+        return True
+
+    @measure_step
     def _add_past_followup_count(self):
-        email_col = self._appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
+        student_keys = self._get_student_keys()
 
         col_name = '# of past followup appointments'
 
+        if self.results is not None and not self.results.empty and self._student_code_col in self.results.columns:
+            if self._add_past_followup_count_by_code(col_name):
+                return
+            self.results = self.results.drop(columns=self._student_code_col)
+
         duplicate_appointment_count = self._get_followup_appointments().pivot_table(
-            index=[email_col],
+            index=student_keys,
             aggfunc='size'
         ).reset_index().rename(columns={0: col_name})
 
@@ -128,9 +227,51 @@ class Followup(Report):
             left=self.results,
             right=duplicate_appointment_count,
             how="left",
-            on=email_col
+            on=student_keys
         )
 
+    @measure_step
+    def _run_polars(self):
+        # the same steps as the pandas report in one lazy query. The student with the most recent appointment that
+        # needs a followup is found by sorting, and ties keep the first appointment like idxmax does
+        import polars as pl
+        date_col = self._appointments.get_col_name(AppointmentDataSet.Column.DATE)
+        app_type_col = self._appointments.get_col_name(AppointmentDataSet.Column.APPOINTMENT_TYPE)
+        if not date_col or not app_type_col:
+            raise ValueError("Date or appointment type column is not defined")
+        student_keys = self._get_student_keys()
+        row_col = '__row'
+
+        appointments = to_polars(self._appointments.get_df()).lazy().with_columns(pl.col(app_type_col).fill_null('MissingData'))
+        app_types = pl.col(app_type_col)
+        need_followup = appointments.filter(
+            app_types.str.contains(self._require_followup.get_include()) & ~app_types.str.contains(self._require_followup.get_exclude())
+        ).with_row_index(row_col)
+        if not self.followup_types:
+            followup = appointments.filter(
+                ~app_types.str.contains(self._require_followup.get_include()) | app_types.str.contains(self._require_followup.get_exclude())
+            )
+        else:
+            followup = appointments.filter(
+                app_types.str.contains(self.followup_types.get_include()) & ~app_types.str.contains(self.followup_types.get_exclude())
+            )
+        latest_followup = followup.group_by(student_keys).agg(pl.col(date_col).max().alias(self._latest_followup_col))
+        followup_count = followup.group_by(student_keys).agg(pl.len().cast(pl.Int64).alias('# of past followup appointments'))
+
+        results = need_followup.join(latest_followup, on=student_keys, how='left').filter(
+            pl.col(date_col).is_not_null() & (
+                pl.col(self._latest_followup_col).is_null() | (pl.col(date_col) >= pl.col(self._latest_followup_col))
+            ) & pl.all_horizontal([pl.col(key).is_not_null() for key in student_keys])
+        ).sort(student_keys + [row_col]).filter(
+            pl.col(date_col) == pl.col(date_col).max().over(student_keys)
+        ).unique(subset=student_keys, keep='first', maintain_order=True).join(
+            followup_count, on=student_keys, how='left', maintain_order='left'
+        ).drop(row_col).collect()
+        if results.is_empty():
+            raise ValueError("Results are undefined. Is the script running in the correct order?")
+        dtypes = self._appointments.get_df().dtypes.to_dict()
+        self.results = to_pandas(results, {**dtypes, self._latest_followup_col: dtypes[date_col]})
+
     # TODO: this should implement the logic of dataset.py's filter_by_col. A new function for this should be made in dataset.py
     def _get_followup_appointments(self) -> pd.DataFrame:
         if not self.followup_types:
@@ -0,0 +1,74 @@
+import logging
+from collections import Counter
+
+from src.dataset.dataset import DataSet
+from src.reports.report import Report
+from src.reports.stages import StageGraph
+
+
+class ReportLifecycle():
+    """
+    Lets go of each report's DataSets and results once its results are saved, so a run only holds the reports it is
+    running or saving. The DataSets the reports' DataSets are copied from (loaded files, or the filtered DataSets
+    shared between reports) are let go after the last report that uses them is saved, if release_sources is set, so
+    the memory a run needs is closer to that of its largest report than to that of every report together.
+    """
+    def __init__(self, reports: list[Report], release_sources: bool = False) -> None:
+        self.release_sources = release_sources
+        self._reports = {id(report) for report in reports}
+        # reports that share a run (e.g. the surveys of a multi-survey report) are let go after the last one is saved
+        self._runs: Counter = Counter(id(report.report.get_shared_report()) for report in reports)
+        self._shared_reports: dict[int, Report] = {id(report.report.get_shared_report()): report.report.get_shared_report() for report in reports}
+        self._sources: dict[int, DataSet] = {}
+        self._origins: dict[int, list[int]] = {}
+        self._private: dict[int, list[DataSet]] = {}
+        self._consumers: Counter = Counter()
+
+    def start(self, stage_graph: StageGraph | None = None) -> None:
+        """
+        Counts the reports that use each DataSet. Called after the stages are shared, since sharing changes the
+        DataSets the reports' DataSets are copied from.
+
+        Args:
+            stage_graph (StageGraph | None): The stage graph the reports' stages were shared with, if any.
+        """
+        if stage_graph is not None:
+            for dataset in stage_graph.get_datasets():
+                self._sources[id(dataset)] = dataset
+        for key, shared_report in self._shared_reports.items():
+            datasets = shared_report.get_datasets()
+            # DataSets that haven't been used yet are copies the report made for itself
+            self._private[key] = [dataset for dataset in datasets if not dataset.is_copied()]
+            self._origins[key] = []
+            for dataset in datasets:
+                origin = dataset.get_origin()
+                self._sources[id(origin)] = origin
+                self._origins[key].append(id(origin))
+                self._consumers[id(origin)] += 1
+        self._release_unused()
+
+    def saved(self, report: Report) -> None:
+        # the files a report saves are written from frames the writer holds, so the report's own are let go now
+        report.results = None
+        if id(report) not in self._reports:
+            return
+        key = id(report.report.get_shared_report())
+        self._runs[key] -= 1
+        if self._runs[key] > 0:
+            return
+        self._shared_reports.pop(key).release()
+        for dataset in self._private.pop(key, []):
+            dataset.release()
+        for origin in self._origins.pop(key, []):
+            self._consumers[origin] -= 1
+        self._release_unused()
+        logging.debug(f"Released the DataSets and results of {report.report.get_class_name()} report")
+
+    def _release_unused(self) -> None:
+        if not self.release_sources:
+            return
+        for key, dataset in list(self._sources.items()):
+            if self._consumers[key] <= 0:
+                dataset.release()
+                del self._sources[key]
+                logging.debug(f"Released {dataset}, which no other report uses")
@@ -0,0 +1,190 @@
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import pandas as pd
+
+
+def serialize_csv(df: pd.DataFrame, index: bool = True) -> bytes:
+    # the same bytes DataFrame.to_csv writes to a file
+    return df.to_csv(index=index, lineterminator=os.linesep).encode('utf-8')
+
+
+class OutputSink():
+    CSV = 'csv'
+    PARQUET = 'parquet'
+    FEATHER = 'feather'
+    EXTENSIONS = {CSV: '.csv', PARQUET: '.parquet', FEATHER: '.feather'}
+    COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz', 'zstd': '.zst'}
+    # optional packages a format or compression needs
+    REQUIREMENTS = {PARQUET: 'pyarrow', FEATHER: 'pyarrow', 'zstd': 'zstandard'}
+
+    def __init__(self, format: str = CSV, index: bool = True, compression: str | None = None, chunksize: int | None = None) -> None:
+        if format not in OutputSink.EXTENSIONS:
+            raise ValueError(f"Invalid output format {format}. Must be one of {list(OutputSink.EXTENSIONS)}")
+        if compression is not None and (format != OutputSink.CSV or compression not in OutputSink.COMPRESSION_EXTENSIONS):
+            raise ValueError(f"Invalid compression {compression}. CSV files can use one of {list(OutputSink.COMPRESSION_EXTENSIONS)}")
+        if chunksize is not None and (format != OutputSink.CSV or not isinstance(chunksize, int) or chunksize < 1):
+            raise ValueError("chunksize must be a positive integer and can only be used with CSV files")
+        for requirement in (format, compression):
+            package = OutputSink.REQUIREMENTS.get(requirement)
+            if package and importlib.util.find_spec(package) is None:
+                raise ValueError(f"{requirement} output requires the {package} package to be installed")
+        self.format = format
+        self.index = index
+        self.compression = compression
+        self.chunksize = chunksize
+
+    def __repr__(self) -> str:
+        return f"OutputSink({self.format}, index={self.index}, compression={self.compression}, chunksize={self.chunksize})"
+
+    @staticmethod
+    def from_config(config: str | dict | None, index: bool = True) -> "OutputSink":
+        # a format name or a dictionary with "format", "index", "compression" and "chunksize" keys
+        if config is None:
+            return OutputSink(index=index)
+        if isinstance(config, str):
+            return OutputSink(config, index=index)
+        if not isinstance(config, dict):
+            raise ValueError(f"Invalid output config {config}. Must be a format name or a dictionary")
+        return OutputSink(
+            format=config.get("format", OutputSink.CSV),
+            index=config.get("index", index),
+            compression=config.get("compression"),
+            chunksize=config.get("chunksize")
+        )
+
+    def get_extension(self) -> str:
+        return OutputSink.EXTENSIONS[self.format] + OutputSink.COMPRESSION_EXTENSIONS.get(self.compression, '')
+
+    def is_streamed(self) -> bool:
+        # chunked CSV files are written a chunk at a time instead of being serialized in memory first
+        return self.chunksize is not None
+
+    def serialize(self, df: pd.DataFrame) -> bytes:
+        if self.format == OutputSink.CSV and self.compression is None:
+            return serialize_csv(df, self.index)
+        buffer = io.BytesIO()
+        if self.format == OutputSink.CSV:
+            df.to_csv(buffer, index=self.index, lineterminator=os.linesep, compression=self.compression)
+        elif self.format == OutputSink.PARQUET:
+            df.to_parquet(buffer, index=self.index)
+        else:
+            # feather files can't store an index, so it's saved as a column
+            df.reset_index(drop=not self.index).to_feather(buffer)
+        return buffer.getvalue()
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        if self.is_streamed():
+            df.to_csv(path, index=self.index, compression=self.compression, chunksize=self.chunksize)
+        else:
+            write_bytes(path, self.serialize(df))
+
+
+def write_bytes(path: str, data: bytes) -> None:
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def link_or_copy(source: str, path: str) -> None:
+    # existing files are replaced, like they are when written
+    if os.path.lexists(path):
+        os.remove(path)
+    try:
+        os.link(source, path)
+    except OSError:
+        # hard links aren't supported across drives or on some file systems
+        shutil.copyfile(source, path)
+
+
+class OutputWriter():
+    def __init__(self, workers: int = 2) -> None:
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError("workers must be an integer greater than or equal to 1")
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='output_writer')
+        self._futures: list[Future] = []
+        # the first file written with each content hash, so identical outputs are linked instead of written again. The
+        # event is set once that file has been written
+        self._written: dict[str, tuple[str, threading.Event]] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close(raise_errors=exc_type is None)
+
+    def write(self, df: pd.DataFrame, path: str, sink: OutputSink | None = None) -> Future:
+        # the DataFrame must not be modified until the write finishes
+        future = self._pool.submit(self._write_frame, df, path, sink or OutputSink())
+        self._futures.append(future)
+        return future
+
+    def write_csv(self, df: pd.DataFrame, path: str, index: bool = True) -> Future:
+        return self.write(df, path, OutputSink(index=index))
+
+    def submit(self, fn, *args) -> Future:
+        # other saves (like archives stored as chunks) run with the writes, and are waited for the same way
+        future = self._pool.submit(fn, *args)
+        self._futures.append(future)
+        return future
+
+    def _write_frame(self, df: pd.DataFrame, path: str, sink: OutputSink) -> None:
+        if sink.is_streamed():
+            sink.write(df, path)
+            logging.debug(f"Wrote {len(df)} rows to {path}")
+        else:
+            self._write(path, sink.serialize(df))
+
+    def _write(self, path: str, data: bytes) -> None:
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            first = digest not in self._written
+            if first:
+                self._written[digest] = (path, threading.Event())
+            source, written = self._written[digest]
+        if first:
+            try:
+                write_bytes(path, data)
+            finally:
+                written.set()
+            logging.debug(f"Wrote {len(data)} bytes to {path}")
+        elif source != path:
+            written.wait()
+            link_or_copy(source, path)
+            logging.debug(f"Linked {path} to {source}")
+
+    def when_written(self, callback) -> None:
+        # calls callback once every file submitted so far is written, without waiting for them. It isn't called if
+        # any of them fail
+        futures = list(self._futures)
+        remaining = [len(futures)]
+
+        def written(_: Future) -> None:
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            if all(not future.cancelled() and future.exception() is None for future in futures):
+                callback()
+
+        if not futures:
+            callback()
+        for future in futures:
+            future.add_done_callback(written)
+
+    def wait(self) -> None:
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self, raise_errors: bool = True) -> None:
+        try:
+            if raise_errors:
+                self.wait()
+        finally:
+            self._pool.shutdown(wait=True)
@@ -6,20 +6,29 @@ from src.dataset.referral import ReferralDataSet
 
 from src.dataset.appointment_status import AppointmentStatus
 from src.dataset.dataset import DataSet
+from src.dataset.stage import Stage
 from src.reports.report import Report
+from src.utils.engine_utils import ENGINES, PANDAS, POLARS, merge, to_datetime, to_pandas, to_polars
+from src.utils.metrics_utils import measure_step
 from src.utils.type_utils import FilterType
 
 
 class Referrals(Report):
-    def __init__(self, referrals: ReferralDataSet, appointment: AppointmentDataSet, valid_departments: FilterType, complete_types: FilterType, enrollment: DataSet | None = None, merge_on: EnrollmentDataSet.Column | None = None) -> None:
+    # referrals are merged into the results a second time, which copies their columns with a "_" suffix
+    merge_suffixes = {ReferralDataSet.type_name: ['_']}
+
+    def __init__(self, referrals: ReferralDataSet, appointment: AppointmentDataSet, valid_departments: FilterType, complete_types: FilterType, enrollment: DataSet | None = None, merge_on: EnrollmentDataSet.Column | None = None, engine: str = PANDAS) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"Invalid engine {engine}. Must be one of {ENGINES}")
         self._referrals = referrals
         self._appointment = appointment
         self.valid_departments = valid_departments
         self._valid_appointment_pattern = complete_types
         self._enrollment = enrollment
         self._merge_on = merge_on
-        self._appointment_cols = [appointment.get_col(AppointmentDataSet.Column.STUDENT_EMAIL), appointment.get_col(DataSet.Column.DATE),
-                                  appointment.get_col(AppointmentDataSet.Column.STATUS)]
+        for col in [AppointmentDataSet.Column.STUDENT_EMAIL, DataSet.Column.DATE, AppointmentDataSet.Column.STATUS]:
+            appointment.validate_col(col)
+        self.engine = engine
         self.results = pd.DataFrame(None)
 
     @property
@@ -33,11 +42,13 @@ class Referrals(Report):
         self._valid_departments = value
 
     def run_report(self) -> None:
-        self._filter_valid_appointments()
+        self._run_stages()
         logging.debug("Filtered valid appointment types in appointments DataSet")
-
-        self.filter_valid_departments()
         logging.debug("Filtered valid referring departments in referrals DataSet")
+        if self.engine == POLARS:
+            self._run_polars()
+            logging.debug("Ran referrals report with polars")
+            return
         self._remove_duplicate_referrals()
 
         self._normalize_email_col()
@@ -79,19 +90,41 @@ class Referrals(Report):
     def get_results(self) -> pd.DataFrame:
         return self.results
 
+    def get_datasets(self) -> list[DataSet]:
+        if self._enrollment:
+            return [self._referrals, self._appointment, self._enrollment]
+        return [self._referrals, self._appointment]
+
+    def _get_sort_order(self) -> list[str]:
+        return [
+            self._referrals.get_col_name(ReferralDataSet.Column.DATE),
+            self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_EMAIL),
+            self._referrals.get_col_name(ReferralDataSet.Column.UNIQUE_REFERRAL),
+            self._appointment.get_col_name(AppointmentDataSet.Column.DATE_SCHEDULED),
+            "Completed",
+        ]
+
+    def get_row_key(self) -> list[str]:
+        # duplicate referral appointments are removed by these columns, so they identify a row
+        return [
+            self._referrals.get_col_name(ReferralDataSet.Column.UNIQUE_REFERRAL),
+            self._appointment.get_col_name(AppointmentDataSet.Column.ID)
+        ]
+
+    def combine_partitions(self, results: list[pd.DataFrame | None]) -> pd.DataFrame | None:
+        # rows are sorted the way sort_results sorts them. Rows with the same sort values are the same student's, so
+        # they are in one partition and keep their order
+        combined = super().combine_partitions(results)
+        if combined is None:
+            return None
+        return combined.sort_values(by=self._get_sort_order(), kind='stable', ignore_index=True)
+
+    @measure_step
     def sort_results(self) -> None:
         referrals_date_col = self._referrals.get_col_name(ReferralDataSet.Column.DATE)
-        unique_referral_col = self._referrals.get_col_name(ReferralDataSet.Column.UNIQUE_REFERRAL)
-        referrals_email_col = self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_EMAIL)
         appointment_date_col = self._appointment.get_col_name(AppointmentDataSet.Column.DATE_SCHEDULED)
 
-        sort_order = [
-            referrals_date_col,
-            referrals_email_col,
-            unique_referral_col,
-            appointment_date_col,
-            "Completed",
-        ]
+        sort_order = self._get_sort_order()
         ascending_order = [
             True,
             True,
@@ -102,13 +135,17 @@ class Referrals(Report):
         self.results[referrals_date_col] = self.results[referrals_date_col].apply(pd.to_datetime)
         self.results[appointment_date_col] = self.results[appointment_date_col].apply(pd.to_datetime)
 
+        # a stable sort, like every sort of the reports, so rows with the same values keep the order they were merged
+        # in. Sorts by more than one column were already stable, so this doesn't change the order of the results
         self.results.sort_values(
             by=sort_order,
             inplace=True,
-            ascending=ascending_order
+            ascending=ascending_order,
+            kind='stable'
         )
         self.results.reset_index(drop=True, inplace=True)
 
+    @measure_step
     def _remove_duplicate_referrals(self):
         unique_col = self._referrals.get_col_name(ReferralDataSet.Column.UNIQUE_REFERRAL)
         if unique_col is None:
@@ -120,6 +157,7 @@ class Referrals(Report):
         self._referrals.get_df().drop_duplicates(inplace=True, subset=unique_col)
         logging.debug(f"Removed {rows_before - len(self._referrals.get_df())} duplicate referral rows")
 
+    @measure_step
     def _add_scheduled(self):
         dates = self.results[self._appointment.get_col_name(AppointmentDataSet.Column.DATE_SCHEDULED)].values.tolist()
         scheduled = list(map(lambda x: "FALSE" if pd.isna(x) else "TRUE", dates))
@@ -130,6 +168,7 @@ class Referrals(Report):
             value=scheduled
         )
 
+    @measure_step
     def _merge_enrollment(self):
         self._normalize_card_id()
         # make sure card ids are normalized and then merge enrollment data with it, then check that all of the correct data is there and there aren't any key errors
@@ -142,6 +181,7 @@ class Referrals(Report):
                 suffixes=('', '_')
             )
 
+    @measure_step
     def _set_preferred_name(self):
         pref_names = self.results[self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_PREFERRED_NAME)].values.tolist()
         f_names = self.results[self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_FIRST_NAME)].values.tolist()
@@ -152,6 +192,7 @@ class Referrals(Report):
         names = list(map(lambda x: x[1] if pd.isna(x[0]) else x[0], names))
         self.results[self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_FIRST_NAME)] = names
 
+    @measure_step
     def _add_completed(self):
         statuses = self.results[self._appointment.get_col_name(AppointmentDataSet.Column.STATUS)].values.tolist()
         completed = list(map(lambda x: "TRUE" if x in AppointmentStatus.VALID_COMPLETED.value else "FALSE", statuses))
@@ -162,12 +203,20 @@ class Referrals(Report):
             value=completed
         )
 
-    def _filter_valid_appointments(self) -> None:
-        self._appointment.filter_appointment_type(self._valid_appointment_pattern)
+    def get_stages(self) -> list[tuple[DataSet, list[Stage]]]:
+        stages = [
+            (self._appointment, [Stage('filter_appointment_type', self._valid_appointment_pattern)] + self._get_projection_stages(self._appointment)),
+            (self._referrals, [Stage('filter_department', self.valid_departments)] + self._get_projection_stages(self._referrals)),
+        ]
+        if self._enrollment:
+            stages.append((self._enrollment, self._get_projection_stages(self._enrollment)))
+        return stages
 
-    def filter_valid_departments(self) -> None:
-        self._referrals.filter_department(self.valid_departments)
+    def get_required_columns(self, dataset: DataSet) -> set[str]:
+        merge_on = [self._merge_on] if isinstance(self._merge_on, str) else self._merge_on or []
+        return super().get_required_columns(dataset) | set(merge_on)
 
+    @measure_step
     def _merge_referrals(self):
         self.results = pd.merge(
             left=self._referrals.get_df(),
@@ -176,6 +225,7 @@ class Referrals(Report):
             on=self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_EMAIL)
         )
 
+    @measure_step
     def _normalize_email_col(self) -> str:
         appointment_col = self._appointment.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
         referral_col = self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_EMAIL)
@@ -200,6 +250,7 @@ class Referrals(Report):
         self.results[enrollment_col] = self.results[enrollment_col].str.replace(r'^G', '', regex=True).fillna(
             -1).astype(int)
 
+    @measure_step
     def _remove_past_appointments(self):
         # first remove any null referral dates (students that had a valid appointment but not a referral)
         self.results.dropna(subset=[self._referrals.get_col_name(ReferralDataSet.Column.DATE)], inplace=True)
@@ -221,6 +272,7 @@ class Referrals(Report):
         # self._results[self._referrals.get_col(Column.DATE)] = self._results[self._referrals.get_col(Column.DATE)].str.replace(' GMT-0400 (Eastern Daylight Time)', '')
         # self._results[self._referrals.get_col(Column.DATE)] = pd.to_datetime(self._results[self._referrals.get_col(Column.DATE)], format='%a %b %d %Y %H:%M:%S').dt.strftime('%Y-%m-%d')
 
+    @measure_step
     def _re_merge(self):
         referral_email_col = self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_EMAIL)
         self.results = pd.merge(
@@ -238,6 +290,55 @@ class Referrals(Report):
         ])
         logging.debug(f"Removed {rows_before - len(self.results)} duplicate rows from merge")
 
+    @measure_step
+    def _run_polars(self):
+        # the same steps as the pandas report, with merges that name, type and order their rows like pd.merge so the
+        # results are the same. Merges are run eagerly, since pandas only makes integer columns float if a merge has
+        # unmatched rows
+        import polars as pl
+        email_col = self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_EMAIL)
+        appointment_email_col = self._appointment.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
+        if not email_col or not appointment_email_col:
+            raise ValueError("Appointment or referral email column is not defined")
+        referral_date_col = self._referrals.get_col_name(ReferralDataSet.Column.DATE)
+        appointment_date_col = self._appointment.get_col_name(AppointmentDataSet.Column.DATE)
+        scheduled_col = self._appointment.get_col_name(AppointmentDataSet.Column.DATE_SCHEDULED)
+        status_col = self._appointment.get_col_name(AppointmentDataSet.Column.STATUS)
+        unique_col = self._referrals.get_col_name(ReferralDataSet.Column.UNIQUE_REFERRAL)
+        first_name_col = self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_FIRST_NAME)
+        preferred_name_col = self._referrals.get_col_name(ReferralDataSet.Column.STUDENT_PREFERRED_NAME)
+
+        referrals = to_polars(self._referrals.get_df())
+        if unique_col is not None:
+            referrals = referrals.unique(subset=unique_col, keep='first', maintain_order=True)
+        appointments = to_polars(self._appointment.get_df()).rename({appointment_email_col: email_col})
+
+        results = merge(referrals, appointments, on=email_col, how='outer').lazy()
+        # appointment dates are compared as datetimes, and rows without one are kept
+        results = results.filter(pl.col(referral_date_col).is_not_null()).with_columns(to_datetime(results, referral_date_col))
+        results = results.filter(~(to_datetime(results, appointment_date_col) < pl.col(referral_date_col)).fill_null(False)).collect()
+
+        results = merge(referrals, results, on=email_col, how='outer', suffixes=('', '_'))
+        results = results.unique(subset=[unique_col, self._appointment.get_col_name(AppointmentDataSet.Column.ID)], keep='first', maintain_order=True)
+        results = results.lazy().select(
+            pl.when(pl.col(status_col).is_in(AppointmentStatus.VALID_COMPLETED.value).fill_null(False)).then(pl.lit("TRUE")).otherwise(pl.lit("FALSE")).alias("Completed"),
+            pl.when(pl.col(scheduled_col).is_null()).then(pl.lit("FALSE")).otherwise(pl.lit("TRUE")).alias("Scheduled"),
+            pl.all()
+        ).with_columns(
+            pl.coalesce(preferred_name_col, first_name_col).alias(first_name_col)
+        ).collect()
+
+        # sorting before merging enrollment gives the same order, since merging enrollment keeps the results' order
+        results = results.with_columns(to_datetime(results, referral_date_col), to_datetime(results, scheduled_col)).sort(
+            [referral_date_col, email_col, unique_col, scheduled_col, "Completed"], nulls_last=True, maintain_order=True
+        )
+        self.results = to_pandas(results, {
+            col: dtype for df in [self._referrals.get_df(), self._appointment.get_df()] for col, dtype in df.dtypes.items()
+            if col not in [referral_date_col, scheduled_col]
+        })
+        # enrollment is merged with pandas, since its columns can have the same names as the results' suffixed columns
+        self._merge_enrollment()
+
     def _repair_only_past_appointments(self):
         # from referrals add rows for students that are no longer in results
 
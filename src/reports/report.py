@@ -1,12 +1,36 @@
+import json
 import logging
+import re
+import numpy as np
 import pandas as pd
 from colorama import Style, Fore
 
+from src.dataset.checkpoint import StageCheckpoint
+from src.dataset.dataset import DataSet
+from src.dataset.stage import Stage
+from src.dataset.timeline import Timeline
+from src.reports.archive_store import ArchiveStore
+from src.reports.delta import ADDED, CHANGED, DELTA_KINDS, REMOVED, compare_results, find_previous_archives, load_archives, to_text
+from src.reports.output import OutputSink, OutputWriter
 from src.utils.df_utils import remove_columns
+from src.utils.general_utils import get_canonical_hash
+from src.utils.metrics_utils import StageMetric, count_rows, get_peak_rss, measure, reset_peak_rss
+from src.utils.profile_utils import profile
+from src.utils.type_utils import ColumnProjection
 from datetime import datetime as dt
 
 
 class Report:
+    # suffixes merges add to a DataSet's columns (by DataSet type) when they are copied into the results
+    merge_suffixes: dict[str, list[str]] = {}
+    # the column reports that partition their results by date range label each row's range in
+    term_col = 'Term'
+    _projected_columns: dict[int, list[str]] | None = None
+    # the run's timeline of student events, which reports can group and match rows by student with
+    _timeline: Timeline | None = None
+    # DataSets are read from and saved to the checkpoint by their stages, if there is one
+    _checkpoint: StageCheckpoint | None = None
+
     # class Type(Enum):
     #     SURVEY_RESULTS = 'survey_results'
     #     FOLLOWUP = 'followup'
@@ -23,7 +47,14 @@ class Report:
             archive_dir: str | None = None,
             remove_cols: list[str] | None = None,
             rename_cols: dict | None = None,
-            final_cols: list[str] | None = None
+            final_cols: list[str] | None = None,
+            config_hash: str | None = None,
+            results_sink: OutputSink | None = None,
+            archive_sink: OutputSink | None = None,
+            partition_cols: list[str] | None = None,
+            delta: bool = False,
+            delta_key: list[str] | None = None,
+            archive_store: ArchiveStore | None = None
     ) -> None:
         self.file_prefix = file_prefix
         if not results_dir:
@@ -34,6 +65,24 @@ class Report:
         self.remove_cols = remove_cols
         self.rename_cols = rename_cols
         self.final_cols = final_cols
+        self.config_hash = config_hash
+        # results are saved with their index and archives without it, unless configured otherwise
+        self.results_sink = results_sink or OutputSink(index=True)
+        self.archive_sink = archive_sink or OutputSink(index=False)
+        self.timestamp: str | None = None
+        # results are saved to one file for each group of values in partition_cols, if they are given
+        self.partition_cols = partition_cols
+        # only the rows added, removed or changed since the last archive are saved to results_dir, if delta is set.
+        # Rows are matched by delta_key, or the report's own row key if it isn't given
+        if delta and not archive_dir:
+            raise ValueError("delta requires an archive_dir to compare the results with")
+        self.delta = delta
+        self.delta_key = delta_key
+        self._archive_paths: list[str] = []
+        # archives are saved as chunks that are stored once, and a manifest of each archive's chunks, if it is given
+        if archive_store and self.archive_sink.format != OutputSink.CSV:
+            raise ValueError(f"archive_store can only store CSV archives, not {self.archive_sink.format} archives")
+        self.archive_store = archive_store
         self.results = pd.DataFrame()
 
     def get_class_name(self) -> str:
@@ -42,8 +91,12 @@ class Report:
     def run_report(self) -> None:
         logging.debug(f"Running {self.report.get_class_name()} report")
         print(f'{Fore.CYAN}Running {Fore.LIGHTYELLOW_EX}{self.report.get_class_name()}{Fore.CYAN} report{Style.RESET_ALL}')
-        self.report.run_report()
-        self.results = self.report.get_results()
+        reset = reset_peak_rss()
+        with profile(f"{self.report.get_class_name()}_{self.file_prefix}"), \
+                measure(f"{self.report.get_class_name()} {self.file_prefix}", "report", lambda: count_rows(self._results)) as metric:
+            self.report.run_report()
+            self.results = self.report.get_results()
+        self._log_peak_memory(reset, metric)
         if self.results is None or self.results.empty:
             logging.debug(f"\tRan {self.report.get_class_name()} report, but got no results.")
             print(f'\t{Fore.YELLOW}Ran {Fore.LIGHTYELLOW_EX}{self.report.get_class_name()} {Fore.YELLOW}report, but got no results.{Style.RESET_ALL}')
@@ -51,9 +104,137 @@ class Report:
             logging.debug(f"\tSuccessfully ran {self.report.get_class_name()} report with {len(self.results)} results")
             print(f'\t{Fore.GREEN}Successfully ran {Fore.LIGHTYELLOW_EX}{self.report.get_class_name()} {Fore.GREEN}report with {Fore.LIGHTMAGENTA_EX}{len(self.results)} {Fore.GREEN}results{Style.RESET_ALL}')
 
+    def _log_peak_memory(self, reset: bool, metric: StageMetric | None) -> None:
+        # the peak resident memory is logged for every report. Where it can't be reset it's the peak of the run so far
+        peak = get_peak_rss()
+        if peak is not None:
+            scope = "" if reset else " (the peak of the run so far)"
+            logging.info(f"Peak memory of {self.report.get_class_name()} {self.file_prefix} report: {peak / 1024 ** 2:.1f} MiB{scope}")
+        if metric is not None and metric.peak_memory is not None:
+            # Python's allocations are only traced while metrics are recorded
+            logging.info(f"Peak traced memory of {self.report.get_class_name()} {self.file_prefix} report: {(metric.start_memory + metric.peak_memory) / 1024 ** 2:.1f} MiB "
+                         f"({metric.peak_memory / 1024 ** 2:.1f} MiB more than before it ran)")
+
     def get_results(self) -> pd.DataFrame | None:
         return None
 
+    def get_row_key(self) -> list[str]:
+        # the results columns that identify a row between runs, so the results of two runs can be compared
+        return []
+
+    def get_final_results(self) -> pd.DataFrame | None:
+        # the results with remove_cols, rename_cols and final_cols applied, as they are saved
+        return self._get_final_results(self.results)
+
+    def _get_final_results(self, results: pd.DataFrame | None) -> pd.DataFrame | None:
+        if results is None:
+            return None
+        if self.remove_cols:
+            # removed columns may not have been loaded at all
+            results = remove_columns(results, [col for col in self.remove_cols if col in results.columns])
+        if self.rename_cols:
+            results = results.rename(columns=self.rename_cols)
+        if self.final_cols:
+            results = results[self.final_cols]
+        return results
+
+    def get_cache_key(self) -> str | None:
+        # reports are only cached when their config entry and every input file have a fingerprint. The config_hash
+        # leaves out the keys that only change how results are saved, so results are reused when only those change
+        if self.config_hash is None:
+            return None
+        shared_report = self.report.get_shared_report()
+        fingerprints = [dataset.get_fingerprint() for dataset in shared_report.get_datasets()]
+        if not fingerprints or None in fingerprints:
+            return None
+        return get_canonical_hash({
+            "report": self.report.get_class_name(),
+            "config": self.config_hash,
+            "file_prefix": self.file_prefix,
+            "inputs": fingerprints,
+            # stages hold values the config entry doesn't, like the date ranges used when none are configured. The
+            # columns projected depend on the saved columns, so cached results are checked for them instead
+            "stages": [[stage.get_key() for stage in stages if stage.method != 'project_columns'] for _, stages in shared_report.get_stages()]
+        })
+
+    def get_projected_columns(self) -> list[list[str]]:
+        # the columns of each of the report's DataSets it runs with, after the columns it doesn't use are dropped when
+        # the file is loaded and before the report runs
+        shared_report = self.report.get_shared_report()
+        projected_columns = shared_report._projected_columns or {}
+        return [projected_columns.get(id(dataset), [str(col) for col in dataset.get_columns()]) for dataset in shared_report.get_datasets()]
+
+    def get_datasets(self) -> list[DataSet]:
+        return []
+
+    def get_stages(self) -> list[tuple[DataSet, list[Stage]]]:
+        # the filters a report applies to its DataSets before anything else, so reports can share them
+        return []
+
+    def _run_stages(self) -> None:
+        for dataset, stages in self.get_stages():
+            dataset.apply_stages(stages, self._checkpoint)
+
+    def set_checkpoint(self, checkpoint: StageCheckpoint | None) -> None:
+        self._checkpoint = checkpoint
+
+    def get_projection(self) -> ColumnProjection:
+        # the results columns this report saves
+        # the partition columns are kept so the results can be split by them, even if they aren't saved
+        return ColumnProjection.from_report(self.final_cols, self.remove_cols, self._rename_cols, (self.partition_cols or []) + (self.delta_key or []))
+
+    def get_required_columns(self, dataset: DataSet) -> set[str]:
+        # columns a report uses to filter and merge a DataSet, even if they aren't saved
+        return set(dataset.cols.values())
+
+    def set_projection(self, projection: ColumnProjection) -> None:
+        datasets = self.get_datasets()
+        self._projected_columns = {}
+        for dataset in datasets:
+            # columns that are in another DataSet are kept so merges name the results columns the same way
+            required = self.get_required_columns(dataset).union(*(other.get_columns() for other in datasets if other is not dataset))
+            dataset_projection = projection.with_suffixes(self.merge_suffixes.get(dataset.type_name, [])).keep(required)
+            columns = dataset_projection.select(list(dataset.get_columns()))
+            if len(columns) < len(dataset.get_columns()):
+                self._projected_columns[id(dataset)] = columns
+
+    def _get_projection_stages(self, dataset: DataSet) -> list[Stage]:
+        # projecting is the last stage, so reports with the same filters still share them
+        if not self._projected_columns or id(dataset) not in self._projected_columns:
+            return []
+        return [Stage('project_columns', self._projected_columns[id(dataset)])]
+
+    def combine_partitions(self, results: list[pd.DataFrame | None]) -> pd.DataFrame | None:
+        # the results of runs on each partition of the students, in the order one run on every student gives them
+        results = [partition_results for partition_results in results if partition_results is not None]
+        if not results:
+            return None
+        return pd.concat([partition_results for partition_results in results if not partition_results.empty] or results[:1])
+
+    def uses_timeline(self) -> bool:
+        # reports that group or match rows by student with the run's timeline are given it before they run
+        return False
+
+    def set_timeline(self, timeline: Timeline | None) -> None:
+        self._timeline = timeline
+
+    def get_student_codes(self, dataset: DataSet, df: pd.DataFrame | None = None) -> np.ndarray | None:
+        # the timeline's student codes of the rows of df (a DataSet's DataFrame or rows taken from it), or None if
+        # there is no timeline or it doesn't have the DataSet's rows
+        if self._timeline is None:
+            return None
+        return self._timeline.get_codes(dataset, None if df is None else df.index)
+
+    def release(self) -> None:
+        # lets go of the frames the report made while it ran, once its results are saved. Its DataSets are let go by
+        # whatever gave them to it, since they may be used by other reports
+        self._results = None
+        self._timeline = None
+
+    def get_shared_report(self) -> "Report":
+        # reports that share another report's run (e.g. SurveyResultsView) return the report they share
+        return self
+
     @property
     def results(self) -> pd.DataFrame | None:
         if not isinstance(self._results, pd.DataFrame):
@@ -82,10 +263,88 @@ class Report:
             self._rename_cols = None
         self._rename_cols = value
 
-    def get_filename(self) -> str:
-        return self.file_prefix + dt.now().strftime('%Y%m%d-%H%M%S') + '.csv'
+    def get_timestamp(self) -> str:
+        # captured once, so every file of a report (or of a run, when the executor sets it) has the same name
+        if self.timestamp is None:
+            self.timestamp = dt.now().strftime('%Y%m%d-%H%M%S')
+        return self.timestamp
+
+    def get_filename(self, extension: str = '.csv', partition: str | None = None) -> str:
+        if partition is not None:
+            return f"{self.file_prefix}{partition}_{self.get_timestamp()}{extension}"
+        return self.file_prefix + self.get_timestamp() + extension
+
+    def get_archive_paths(self) -> list[str]:
+        # the archive files the last save_archive saved, one for each partition of the results
+        return list(self._archive_paths)
+
+    def get_archive_extension(self) -> str:
+        return ArchiveStore.MANIFEST_EXTENSION if self.archive_store else self.archive_sink.get_extension()
+
+    def get_partition_names(self) -> list[str]:
+        return self._get_results_columns(self.partition_cols or [], "partition")
+
+    def get_delta_key(self) -> list[str]:
+        if not self.delta_key:
+            key = self.report.get_row_key()
+            # the key columns may not be configured for the report's files
+            if not key or None in key:
+                raise ValueError(f"{self.report.get_class_name()} results have no row key. A delta key must be given")
+            return self._get_results_columns(key, "compare")
+        return self._get_results_columns(self.delta_key, "compare")
+
+    def _get_results_columns(self, cols: list[str], action: str) -> list[str]:
+        # cols are named like the saved results, so renamed columns are found by their name in the results
+        renamed = {new: old for old, new in (self.rename_cols or {}).items()}
+        names = []
+        for col in cols:
+            if renamed.get(col) in self.results.columns:
+                names.append(renamed[col])
+            elif col in self.results.columns:
+                names.append(col)
+            else:
+                raise ValueError(f"Cannot {action} {self.report.get_class_name()} results by {col}. The results do not have that column")
+        return names
 
-    def save_archive(self):
+    @staticmethod
+    def get_partition_name(values: tuple) -> str:
+        # the values of a partition's columns, joined into a filename. Missing values are named like the filters fill them
+        slugs = [re.sub(r'[^A-Za-z0-9]+', '_', str(value)).strip('_') if not pd.isna(value) else "None" for value in values]
+        return "_".join(slug or "None" for slug in slugs)
+
+    def get_partitions(self, results: pd.DataFrame) -> list[tuple[str | None, pd.DataFrame]]:
+        """
+        Splits results (the results, or rows taken from them) by the values of partition_cols, with a single groupby
+        of the results. Partitions are in the order their values first appear. Each partition is numbered from 0 like
+        the results of a report of its own, and partitions by term don't keep the term column.
+
+        Args:
+            results (pd.DataFrame): The results or rows taken from them, in the same order as the results.
+
+        Returns:
+            list[tuple[str | None, pd.DataFrame]]: The name of each partition, which can be used in a filename, and its
+            rows. The name is None if the results aren't partitioned.
+        """
+        if not self.partition_cols:
+            return [(None, results)]
+        groups = self.results.groupby(self.get_partition_names(), sort=False, dropna=False).indices
+        # a term's file is the same as the results of a run of that term only, which have no term column
+        term_cols = [Report.term_col, (self.rename_cols or {}).get(Report.term_col)] if Report.term_col in self.partition_cols else []
+        term_cols = [col for col in term_cols if col in results.columns]
+        partitions = []
+        used: set[str] = set()
+        for values, positions in groups.items():
+            name = Report.get_partition_name(values if isinstance(values, tuple) else (values,))
+            # values that only differ in punctuation would have the same filename
+            unique_name, count = name, 1
+            while unique_name.lower() in used:
+                count += 1
+                unique_name = f"{name}_{count}"
+            used.add(unique_name.lower())
+            partitions.append((unique_name, results.iloc[positions].drop(columns=term_cols).reset_index(drop=True)))
+        return partitions
+
+    def save_archive(self, writer: OutputWriter | None = None):
         if not self.archive_dir:
             logging.debug("No archive directory specified. Skipping archive")
             print(f'{Fore.LIGHTBLACK_EX}No archive directory specified. Skipping archive{Style.RESET_ALL}')
@@ -94,23 +353,95 @@ class Report:
             logging.warning("No results to archive. Either this report did not have run correctly or the results were empty")
             print(f'{Fore.LIGHTBLACK_EX}No results to archive. Either this report did not have run correctly or the results were empty{Style.RESET_ALL}')
             return
-        self.results.to_csv(self.archive_dir + "\\" + self.get_filename(), index=False)
-        logging.debug(f"\tSaved archive of {self.report.get_class_name()} to {self.results_dir}\\{self.get_filename()}")
-        print(f'\t{Fore.LIGHTGREEN_EX}Saved archive of {Fore.LIGHTYELLOW_EX}{self.report.get_class_name()} {Fore.LIGHTGREEN_EX}to {Fore.LIGHTBLACK_EX}{self.results_dir}\\{self.get_filename()}{Style.RESET_ALL}')
+        self._archive_paths = []
+        for partition, results in self.get_partitions(self.results):
+            path = self.archive_dir + "\\" + self.get_filename(self.get_archive_extension(), partition)
+            self._archive_paths.append(path)
+            if self.archive_store and writer:
+                writer.submit(self.archive_store.save, results, path, self.archive_sink)
+            elif self.archive_store:
+                self.archive_store.save(results, path, self.archive_sink)
+            elif writer:
+                writer.write(results, path, self.archive_sink)
+            else:
+                self.archive_sink.write(results, path)
+            logging.debug(f"\tSaved archive of {self.report.get_class_name()} to {path}")
+            print(f'\t{Fore.LIGHTGREEN_EX}Saved archive of {Fore.LIGHTYELLOW_EX}{self.report.get_class_name()} {Fore.LIGHTGREEN_EX}to {Fore.LIGHTBLACK_EX}{path}{Style.RESET_ALL}')
 
-    def save_results(self):
+    def save_results(self, writer: OutputWriter | None = None):
+        if self.delta and self.results is not None:
+            self.save_delta(writer)
+            return
         if self.results is None or self.results.empty:
             logging.warning("No results to save. Either this report did not have run correctly or the results were empty")
             print(f'{Fore.LIGHTBLACK_EX}No results to save. Either this report did not have run correctly or the results were empty{Style.RESET_ALL}')
             return
 
-        if self.remove_cols:
-            self.results = remove_columns(self.results, self.remove_cols)
-        if self.rename_cols:
-            self.results = self.results.rename(columns=self.rename_cols)
-        if self.final_cols:
-            self.results = self.results[self.final_cols]
+        # the results are split before final_cols is applied, since it may not keep the partition column
+        final_results = self.get_final_results()
+        partitions = self.get_partitions(final_results)
+        self.results = final_results
+
+        for partition, results in partitions:
+            path = self.results_dir + "\\" + self.get_filename(self.results_sink.get_extension(), partition)
+            if writer:
+                writer.write(results, path, self.results_sink)
+            else:
+                self.results_sink.write(results, path)
+            logging.debug(f"\tSaved results of {self.report.get_class_name()} to {path}")
+            print(f'\t{Fore.LIGHTGREEN_EX}Saved results of {Fore.LIGHTYELLOW_EX}{self.report.get_class_name()} {Fore.LIGHTGREEN_EX}to {Fore.LIGHTBLACK_EX}{path}{Style.RESET_ALL}')
+
+    def save_delta(self, writer: OutputWriter | None = None) -> dict:
+        """
+        Saves the rows added, removed and changed since the last run's archive to results_dir, with a manifest of what
+        was saved. Files are only saved for kinds of changes that have rows, and the manifest is always saved, since it
+        names the archive the next run compares with.
+
+        Args:
+            writer (OutputWriter | None): The writer that saves the files in the background, if any.
 
-        self.results.to_csv(self.results_dir + "\\" + self.get_filename())
-        logging.debug(f"\tSaved results of {self.report.get_class_name()} to {self.results_dir}\\{self.get_filename()}")
-        print(f'\t{Fore.LIGHTGREEN_EX}Saved results of {Fore.LIGHTYELLOW_EX}{self.report.get_class_name()} {Fore.LIGHTGREEN_EX}to {Fore.LIGHTBLACK_EX}{self.results_dir}\\{self.get_filename()}{Style.RESET_ALL}')
+        Returns:
+            dict: The manifest.
+        """
+        timestamp = self.get_timestamp()
+        key = self.get_delta_key()
+        current = to_text(self.results, self.archive_sink)
+        previous_timestamp, archives = find_previous_archives(self.results_dir, self.archive_dir, self.file_prefix, self.get_archive_extension(), timestamp)
+        previous = load_archives(archives)
+        if previous is None:
+            previous_timestamp, previous = None, current.head(0)
+        positions = compare_results(previous, current, key)
+        rows = {
+            ADDED: self.results.iloc[positions[ADDED]],
+            # removed rows are saved as they were archived, with the columns the results have now
+            REMOVED: previous.reindex(columns=self.results.columns).iloc[positions[REMOVED]],
+            CHANGED: self.results.iloc[positions[CHANGED]]
+        }
+        files = {}
+        for kind in DELTA_KINDS:
+            if rows[kind].empty:
+                continue
+            path = self.results_dir + "\\" + f"{self.file_prefix}{kind}_{timestamp}{self.results_sink.get_extension()}"
+            if writer:
+                writer.write(self._get_final_results(rows[kind]), path, self.results_sink)
+            else:
+                self.results_sink.write(self._get_final_results(rows[kind]), path)
+            files[kind] = path
+        manifest = {
+            "report": self.report.get_class_name(),
+            "file_prefix": self.file_prefix,
+            "timestamp": timestamp,
+            "previous": previous_timestamp,
+            "key": key,
+            "rows": len(self.results),
+            **{kind: len(rows[kind]) for kind in DELTA_KINDS},
+            "files": files,
+            "archives": self._archive_paths
+        }
+        path = self.results_dir + "\\" + f"{self.file_prefix}delta_{timestamp}.json"
+        with open(path, 'w') as file:
+            json.dump(manifest, file, indent=4)
+        self.results = self.get_final_results()
+        logging.debug(f"\tSaved {len(rows[ADDED])} added, {len(rows[REMOVED])} removed and {len(rows[CHANGED])} changed rows of {self.report.get_class_name()} to {path}")
+        print(f'\t{Fore.LIGHTGREEN_EX}Saved {Fore.LIGHTMAGENTA_EX}{len(rows[ADDED])}{Fore.LIGHTGREEN_EX} added, {Fore.LIGHTMAGENTA_EX}{len(rows[REMOVED])}{Fore.LIGHTGREEN_EX} removed and {Fore.LIGHTMAGENTA_EX}{len(rows[CHANGED])}{Fore.LIGHTGREEN_EX} changed rows of {Fore.LIGHTYELLOW_EX}{self.report.get_class_name()} {Fore.LIGHTGREEN_EX}to {Fore.LIGHTBLACK_EX}{path}{Style.RESET_ALL}')
+        return manifest
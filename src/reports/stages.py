@@ -0,0 +1,123 @@
+import logging
+from colorama import Fore, Style
+
+from src.dataset.checkpoint import StageCheckpoint
+from src.dataset.dataset import DataSet
+from src.dataset.stage import Stage
+from src.reports.report import Report
+from src.utils.metrics_utils import measure
+
+
+class StageNode():
+    def __init__(self, dataset: DataSet | None = None, parent: "StageNode | None" = None, stage: Stage | None = None) -> None:
+        self.parent = parent
+        self.stage = stage
+        self.children: dict[tuple, StageNode] = {}
+        self.consumers = 0
+        self._dataset = dataset
+
+    def get_stages(self) -> list[Stage]:
+        if self.parent is None or self.stage is None:
+            return []
+        return self.parent.get_stages() + [self.stage]
+
+    def is_computed(self) -> bool:
+        return self._dataset is not None
+
+    def get_depth(self) -> int:
+        if self.parent is None:
+            return 0
+        return self.parent.get_depth() + 1
+
+    def get_dataset(self, checkpoint: StageCheckpoint | None = None) -> DataSet:
+        # the stages are read from the checkpoint, if it has them, and saved to it otherwise
+        if self._dataset is None:
+            # start from the closest computed node without keeping the DataSets of the nodes in between
+            ancestor = self.parent
+            while ancestor is not None and not ancestor.is_computed():
+                ancestor = ancestor.parent
+            if ancestor is None:
+                raise ValueError("Root stage nodes must have a DataSet")
+            dataset = ancestor.get_dataset().deep_copy()
+            dataset.apply_stages(self.get_stages(), checkpoint)
+            self._dataset = dataset
+        return self._dataset
+
+
+class StageGraph():
+    def __init__(self, reports: list[Report], checkpoint: StageCheckpoint | None = None) -> None:
+        self._roots: dict[int, StageNode] = {}
+        self._chains: list[tuple[DataSet, list[Stage]]] = []
+        # the shared DataSets are checkpointed by their stages, if there is a checkpoint
+        self.checkpoint = checkpoint
+        self.compile(reports)
+
+    def compile(self, reports: list[Report]) -> None:
+        self._roots = {}
+        self._chains = []
+        # wrapped reports that share one run (e.g. SurveyResultsView) only consume their stages once
+        seen = set()
+        for report in reports:
+            shared_report = report.report.get_shared_report()
+            if id(shared_report) in seen:
+                continue
+            seen.add(id(shared_report))
+            for dataset, stages in shared_report.get_stages():
+                self._add_chain(dataset, stages)
+        logging.debug(f"Compiled {len(self._chains)} stage chains from {len(seen)} reports over {len(self._roots)} DataSets")
+
+    def _add_chain(self, dataset: DataSet, stages: list[Stage]) -> None:
+        if dataset.is_copied():
+            # DataSets that aren't deep copies of a loaded DataSet can't share stages with other reports
+            return
+        origin = dataset.get_origin()
+        node = self._roots.setdefault(id(origin), StageNode(dataset=origin))
+        node.consumers += 1
+        for stage in stages:
+            node = node.children.setdefault(stage.get_key(), StageNode(parent=node, stage=stage))
+            node.consumers += 1
+        self._chains.append((dataset, stages))
+
+    def get_datasets(self) -> list[DataSet]:
+        # the loaded DataSets the stages start from and the filtered DataSets computed from them
+        datasets = []
+        nodes = list(self._roots.values())
+        while nodes:
+            node = nodes.pop()
+            if node.is_computed():
+                datasets.append(node.get_dataset())
+            nodes.extend(node.children.values())
+        return datasets
+
+    def share(self) -> int:
+        with measure("StageGraph.share", "stage_graph"):
+            return self._share()
+
+    def _share(self) -> int:
+        # finds the longest prefix of each chain that is used by more than one report, computes it once, and bases the
+        # report's DataSet on it so the report only runs its remaining stages
+        targets: list[tuple[DataSet, StageNode]] = []
+        for dataset, stages in self._chains:
+            if dataset.is_copied():
+                continue
+            node = self._roots[id(dataset.get_origin())]
+            shared = None
+            for stage in stages:
+                node = node.children[stage.get_key()]
+                if node.consumers < 2:
+                    break
+                shared = node
+            if shared is not None:
+                targets.append((dataset, shared))
+
+        # shallower nodes are computed first so deeper nodes can start from them
+        shared_nodes = {}
+        for dataset, node in sorted(targets, key=lambda target: target[1].get_depth()):
+            dataset.rebase(node.get_dataset(self.checkpoint))
+            shared_nodes[id(node)] = node
+        for node in shared_nodes.values():
+            logging.debug(f"Shared {node.get_stages()} of {node.get_dataset()} between {node.consumers} reports")
+        if shared_nodes:
+            logging.info(f"Shared {len(shared_nodes)} filtered DataSets between {len(targets)} report stage chains")
+            print(f'{Fore.CYAN}Shared {Fore.LIGHTMAGENTA_EX}{len(shared_nodes)}{Fore.CYAN} filtered DataSets between reports{Style.RESET_ALL}')
+        return len(shared_nodes)
@@ -1,53 +1,143 @@
 import logging
+import numpy as np
 import pandas as pd
+from colorama import Fore, Style
 from src.dataset.appointment import AppointmentDataSet
+from src.dataset.dataset import DataSet
+from src.dataset.stage import Stage
 from src.dataset.survey import SurveyDataSet
-from src.utils.df_utils import filter_by_time_diff
+from src.utils.df_utils import filter_by_time_diff, filter_positive_time_diff, filter_time_diff_window, merge_by_time_diff
 from src.reports.report import Report
-from src.utils.general_utils import get_date_ranges
+from src.utils.metrics_utils import measure_step
+from src.utils.general_utils import get_date_ranges, get_labeled_date_ranges
 from src.utils.type_utils import FilterType
 
 
 class SurveyResults(Report):
-    def __init__(self, appointments: AppointmentDataSet, survey_results: SurveyDataSet, day_range: int, target_date_ranges: str | None, staff_emails: FilterType) -> None:
-        if not isinstance(appointments, AppointmentDataSet) or not isinstance(survey_results, SurveyDataSet):
+    survey_id_col = 'Survey_ID'
+    day_range_col = 'Day_Range'
+    _match_col = '__match'
+
+    def __init__(self, appointments: AppointmentDataSet, survey_results: SurveyDataSet | list[SurveyDataSet], day_range: int | list[int], target_date_ranges: str | None, staff_emails: FilterType, partition_terms: bool = False) -> None:
+        surveys = survey_results if isinstance(survey_results, list) else [survey_results]
+        if not isinstance(appointments, AppointmentDataSet) or not surveys or not all(isinstance(survey, SurveyDataSet) for survey in surveys):
             raise ValueError('Invalid DataSet types provided at filter_appointment_surveys')
+        if partition_terms and target_date_ranges is None:
+            raise ValueError("target_date_ranges must be given to partition the results by term")
         self._appointments = appointments
-        self._survey_results = survey_results
+        self._surveys = surveys
         self.results = pd.DataFrame(None)
+        self._result_sets = {}
+        self._has_run = False
         self._day_range = day_range
         self.target_date_ranges = target_date_ranges
         self._staff_emails = staff_emails
+        # every date range is run at once, and survey responses are matched with the appointments in each range
+        self.partition_terms = partition_terms
 
     def run_report(self) -> None:
-        self.appointments.sort_date()
-        logging.debug("Sorted appointments by date")
-        self.survey_results.sort_date()
-        logging.debug("Sorted survey results by date")
-
-        self.appointments.filter_appointment_status()
-        logging.debug("Filtered valid appointment statuses")
-        if self.target_date_ranges is not None:
-            self._appointments.filter_dates(*get_date_ranges(self.target_date_ranges))
-            logging.debug("Filtered target dates")
-        if self._staff_emails is not None:
-            self._appointments.filter_staff_emails(self._staff_emails)
-            logging.debug("Filtered staff emails")
+        # multi-survey and multi-day_range reports are shared by one SurveyResultsView per result set, so only the
+        # first view runs the report
+        if self._has_run:
+            return
+        self._run_stages()
+        logging.debug(f"Sorted appointments and {len(self.surveys)} survey results by date")
+        logging.debug("Filtered valid appointment statuses, target dates and staff emails")
 
         self._normalize_email_cols()
-        self.results = self._filter_by_time_diff()
+        if len(self.surveys) == 1 and len(self.day_ranges) == 1:
+            self.results = self._filter_by_time_diff()
+        else:
+            self._result_sets = self._filter_surveys_by_time_diff()
+            self.results = pd.concat(
+                [result_set.assign(**{self.survey_id_col: survey_id, self.day_range_col: day_range})
+                 for (survey_id, day_range), result_set in self._result_sets.items()],
+                ignore_index=True
+            )
+            self._log_window_counts()
         logging.debug("Filtered time difference")
+        self._has_run = True
 
     def get_results(self) -> pd.DataFrame | None:
         return self.results
 
+    def get_datasets(self) -> list[DataSet]:
+        return [self.appointments, *self.surveys]
+
+    def release(self) -> None:
+        super().release()
+        self._result_sets = {}
+
+    def get_stages(self) -> list[tuple[DataSet, list[Stage]]]:
+        appointment_stages = [Stage('sort_date'), Stage('filter_appointment_status')]
+        if self.target_date_ranges is not None and not self.partition_terms:
+            appointment_stages.append(Stage('filter_dates', *get_date_ranges(self.target_date_ranges)))
+        if self._staff_emails is not None:
+            appointment_stages.append(Stage('filter_staff_emails', self._staff_emails))
+        appointment_stages += self._get_projection_stages(self.appointments)
+        if self.partition_terms:
+            # the term column is added after projecting, so the projection doesn't drop it
+            appointment_stages.append(Stage('tag_date_ranges', self.term_col, *get_labeled_date_ranges(self.target_date_ranges)))
+        return [(self.appointments, appointment_stages)] + [
+            (survey, [Stage('sort_date')] + self._get_projection_stages(survey)) for survey in self.surveys
+        ]
+
+    def get_row_key(self, survey_id: str | None = None) -> list[str]:
+        # each response is in the results once (in each term)
+        survey = next((survey for survey in self.surveys if survey.get_id() == survey_id), self.survey_results)
+        id_col = survey.get_col_name(SurveyDataSet.Column.ID)
+        return [id_col, self.term_col] if self.partition_terms else [id_col]
+
+    def combine_partitions(self, results: list[pd.DataFrame | None]) -> pd.DataFrame | None:
+        # every partition merges all of the responses, so each response keeps the index it has in one run, and
+        # responses of students in other partitions have no appointment to match
+        combined = super().combine_partitions(results)
+        if combined is None:
+            return None
+        return combined.sort_index(kind='stable')
+
+    def get_survey_results(self, survey_id: str | None = None, day_range: int | None = None) -> pd.DataFrame | None:
+        if len(self.surveys) == 1 and len(self.day_ranges) == 1:
+            return self.results
+        if survey_id is None:
+            survey_id = self.survey_results.get_id()
+        if day_range is None:
+            day_range = self.day_ranges[0]
+        return self._result_sets.get((survey_id, day_range))
+
+    def get_window_counts(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [(survey_id, day_range, len(result_set)) for (survey_id, day_range), result_set in self._result_sets.items()],
+            columns=[self.survey_id_col, self.day_range_col, 'Results']
+        )
+
+    def _log_window_counts(self) -> None:
+        for (survey_id, day_range), result_set in self._result_sets.items():
+            logging.info(f"\tSurvey {survey_id} has {len(result_set)} results within {day_range} days of an appointment")
+            print(f'\t{Fore.LIGHTBLACK_EX}Survey {Fore.LIGHTWHITE_EX}{survey_id} {Fore.LIGHTBLACK_EX}has {Fore.LIGHTMAGENTA_EX}{len(result_set)} {Fore.LIGHTBLACK_EX}results within {Fore.LIGHTMAGENTA_EX}{day_range} {Fore.LIGHTBLACK_EX}days of an appointment{Style.RESET_ALL}')
+
     # ensure the student email columns have the same name. Rename the survey set to match
+    @measure_step
     def _normalize_email_cols(self) -> None:
-        if self.survey_results.get_col_name(SurveyDataSet.Column.STUDENT_EMAIL) != self.appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL):
-            self.survey_results.get_df().rename(
-                {self.survey_results.get_col_name(SurveyDataSet.Column.STUDENT_EMAIL): self.appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)}
-            )
+        for survey in self.surveys:
+            if survey.get_col_name(SurveyDataSet.Column.STUDENT_EMAIL) != self.appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL):
+                survey.get_df().rename(
+                    {survey.get_col_name(SurveyDataSet.Column.STUDENT_EMAIL): self.appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)}
+                )
+
+    def _get_merge_keys(self) -> list[str]:
+        # responses are matched with a student's appointments, in the same term if the results are partitioned by term
+        email_col = self.appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
+        return [email_col, self.term_col] if self.partition_terms else [email_col]
 
+    def _with_terms(self, df: pd.DataFrame) -> pd.DataFrame:
+        # each response is repeated for every term, so it can be matched with an appointment in each of them
+        if not self.partition_terms:
+            return df
+        terms = pd.DataFrame({self.term_col: [label for label, _, _ in get_labeled_date_ranges(self.target_date_ranges)]})
+        return df.merge(terms, how='cross')
+
+    @measure_step
     def _filter_by_time_diff(self) -> pd.DataFrame:
         date_col_1 = self.survey_results.get_col_name(SurveyDataSet.Column.DATE)
         date_col_2 = self.appointments.get_col_name(AppointmentDataSet.Column.DATE)
@@ -56,24 +146,133 @@ class SurveyResults(Report):
             raise ValueError("One or more columns are not defined")
 
         return filter_by_time_diff(
-            df_1=self.survey_results.get_df(),
+            df_1=self._with_terms(self.survey_results.get_df()),
             col_1=date_col_1,
             df_2=self.appointments.get_df(),
             col_2=date_col_2,
-            days=self.day_range,
-            merge_col=merge_col,
+            days=self.day_ranges[0],
+            merge_col=self._get_merge_keys(),
+            matches=self._get_matches([self.survey_results], self.day_ranges[0])
+        )
+
+    def uses_timeline(self) -> bool:
+        # responses repeated for every term are matched by email and term
+        return not self.partition_terms
+
+    def _get_matches(self, surveys: list[SurveyDataSet], days: int | None) -> np.ndarray | None:
+        # responses are matched with appointments by scanning the timeline's events of each student instead of
+        # merging by email, if there is a timeline
+        if not self.uses_timeline() or self._timeline is None:
+            return None
+        date_col = self.appointments.get_col_name(AppointmentDataSet.Column.DATE)
+        return self._timeline.match_latest(
+            [(survey, survey.get_df()[survey.get_col_name(SurveyDataSet.Column.DATE)]) for survey in surveys],
+            (self.appointments, self.appointments.get_df()[date_col]),
+            pd.Timedelta(days=days) if days is not None else None
         )
 
+    @staticmethod
+    def _are_in_order(surveys: list[SurveyDataSet], date_col: str) -> bool:
+        # whether every survey is sorted by its dates and each one's dates start on or after the last one's end
+        last_date = None
+        for survey in surveys:
+            if len(survey.get_df()) == 0:
+                continue
+            date_range = survey.get_range(date_col)
+            if date_range is None or pd.isna(survey.get_df()[date_col]).any():
+                return False
+            if last_date is not None and date_range[0] < last_date:
+                return False
+            last_date = date_range[1]
+        return True
+
+    @measure_step
+    def _filter_surveys_by_time_diff(self) -> dict[tuple[str, int], pd.DataFrame]:
+        date_col_2 = self.appointments.get_col_name(AppointmentDataSet.Column.DATE)
+        merge_col = self.appointments.get_col_name(AppointmentDataSet.Column.STUDENT_EMAIL)
+        if not date_col_2 or not merge_col:
+            raise ValueError("One or more columns are not defined")
+
+        # surveys can only share a merge if merge_asof names their columns the same way they would be named on their own
+        groups: dict[tuple[str, frozenset], list[SurveyDataSet]] = {}
+        for survey in self.surveys:
+            date_col_1 = survey.get_col_name(SurveyDataSet.Column.DATE)
+            if not date_col_1:
+                raise ValueError("One or more columns are not defined")
+            overlap = frozenset(survey.get_df().columns) & frozenset(self.appointments.get_df().columns)
+            groups.setdefault((date_col_1, overlap), []).append(survey)
+
+        # several day ranges share one merge without a tolerance, and each window is taken from its Time_Difference
+        merge_days = self.day_ranges[0] if len(self.day_ranges) == 1 else None
+        result_sets = {}
+        for (date_col_1, _), surveys in groups.items():
+            combined = pd.concat(
+                [survey.get_df().assign(**{self.survey_id_col: survey.get_id()}) for survey in surveys],
+                ignore_index=True
+            )
+            matches = self._get_matches(surveys, merge_days)
+            if matches is not None:
+                # the matches are sorted with the responses
+                combined[self._match_col] = matches
+            # each survey is already sorted, so a stable sort keeps every survey's own row order. Surveys that come
+            # one after another are already in order, and aren't sorted again
+            if not SurveyResults._are_in_order(surveys, date_col_1):
+                combined.sort_values(by=date_col_1, kind='stable', inplace=True)
+            if matches is not None:
+                matches = combined.pop(self._match_col).to_numpy()
+            combined = self._with_terms(combined)
+            merged = merge_by_time_diff(
+                df_1=combined,
+                col_1=date_col_1,
+                df_2=self.appointments.get_df(),
+                col_2=date_col_2,
+                days=merge_days,
+                merge_col=self._get_merge_keys(),
+                matches=matches
+            )
+            logging.debug(f"Merged {len(surveys)} surveys with appointments in a single pass")
+            right_cols = list(merged.columns[len(combined.columns):].drop('Time_Difference'))
+            for survey in surveys:
+                survey_rows = self._slice_survey(merged, survey, date_col_1, date_col_2, merge_col)
+                for day_range in self.day_ranges:
+                    if merge_days is not None:
+                        result_sets[(survey.get_id(), day_range)] = filter_positive_time_diff(survey_rows)
+                    else:
+                        result_sets[(survey.get_id(), day_range)] = filter_time_diff_window(survey_rows, day_range, right_cols)
+        return result_sets
+
+    def _slice_survey(self, merged: pd.DataFrame, survey: SurveyDataSet, date_col_1: str, date_col_2: str, merge_col: str) -> pd.DataFrame:
+        # merge the empty frames to get the columns and dtypes the survey would have had if it was merged on its own
+        layout = pd.merge_asof(self._with_terms(survey.get_df().head(0)), self.appointments.get_df().head(0),
+                               left_on=date_col_1,
+                               right_on=date_col_2,
+                               by=self._get_merge_keys(),
+                               direction='backward')
+        layout['Time_Difference'] = layout[date_col_1] - layout[date_col_2]
+
+        survey_rows = merged[merged[self.survey_id_col] == survey.get_id()][layout.columns].reset_index(drop=True)
+        for col, dtype in layout.dtypes.items():
+            if survey_rows[col].dtype != dtype and not survey_rows[col].isna().any():
+                survey_rows[col] = survey_rows[col].astype(dtype)
+        return survey_rows
+
     @property
-    def day_range(self) -> int:
+    def day_range(self) -> int | list[int]:
         return self._day_range
 
     @day_range.setter
-    def day_range(self, value: int) -> None:
-        if not isinstance(value, int) or value < 0:
-            raise ValueError("day_range must be an integer greater than or equal to 0")
+    def day_range(self, value: int | list[int]) -> None:
+        day_ranges = value if isinstance(value, list) else [value]
+        if not day_ranges or not all(isinstance(day_range, int) and day_range >= 0 for day_range in day_ranges):
+            raise ValueError("day_range must be an integer greater than or equal to 0 or a list of them")
         self._day_range = value
 
+    @property
+    def day_ranges(self) -> list[int]:
+        if isinstance(self._day_range, list):
+            return self._day_range
+        return [self._day_range]
+
     @property
     def years(self) -> str | None:
         return self._years
@@ -117,15 +316,19 @@ class SurveyResults(Report):
 
     @property
     def survey_results(self) -> SurveyDataSet:
-        return self._survey_results
+        return self._surveys[0]
 
     @survey_results.setter
     def survey_results(self, value: SurveyDataSet) -> None:
         if not isinstance(value, SurveyDataSet):
             raise ValueError("survey_results must be a SurveyDataSet")
-        self._survey_results = value
+        self._surveys = [value]
         logging.debug("Survey results updated")
 
+    @property
+    def surveys(self) -> list[SurveyDataSet]:
+        return self._surveys
+
     @property
     def results(self) -> pd.DataFrame:
         return self._results
@@ -136,3 +339,33 @@ class SurveyResults(Report):
             raise ValueError("results must be a DataFrame")
         self._results = value
         logging.debug("Results updated")
+
+
+class SurveyResultsView(Report):
+    def __init__(self, survey_results: SurveyResults, survey_id: str | None = None, day_range: int | None = None) -> None:
+        if not isinstance(survey_results, SurveyResults):
+            raise ValueError("survey_results must be a SurveyResults report")
+        self._survey_results = survey_results
+        self.survey_id = survey_id
+        self.day_range = day_range
+
+    def get_class_name(self) -> str:
+        return self._survey_results.get_class_name()
+
+    def get_datasets(self) -> list[DataSet]:
+        return self._survey_results.get_datasets()
+
+    def get_shared_report(self) -> Report:
+        return self._survey_results
+
+    def run_report(self) -> None:
+        self._survey_results.run_report()
+
+    def get_results(self) -> pd.DataFrame | None:
+        return self._survey_results.get_survey_results(self.survey_id, self.day_range)
+
+    def get_row_key(self) -> list[str]:
+        return self._survey_results.get_row_key(self.survey_id)
+
+    def combine_partitions(self, results: list[pd.DataFrame | None]) -> pd.DataFrame | None:
+        return self._survey_results.combine_partitions(results)
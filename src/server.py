@@ -0,0 +1,260 @@
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+from colorama import Fore, Style
+
+from src.config.report_selection import get_report_name
+from src.config.reports_config import ReportsConfig
+from src.utils.general_utils import get_canonical_hash
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_CACHE_SIZE = 128
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "json": "application/json"
+}
+# the include/exclude filters each report type can be given, like {"include": [...], "exclude": [...]} in the config
+FILTER_PARAMS = {
+    "survey_results": ["emails"],
+    "followup": ["valid_schools", "require_followup", "followup_types"],
+    "referrals": ["valid_departments", "valid_appointments"]
+}
+# the other report keys each report type can be given, and their types
+VALUE_PARAMS = {
+    "survey_results": {"target_date_ranges": str, "survey_id": str, "day_range": int},
+    "followup": {"target_date_ranges": str},
+    "referrals": {}
+}
+
+
+class Response():
+    def __init__(self, status: int, content_type: str, body: bytes, cached: bool = False) -> None:
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.cached = cached
+
+    @staticmethod
+    def error(status: int, message: str) -> "Response":
+        return Response(status, FORMATS["json"], json.dumps({"error": message}).encode('utf-8'))
+
+
+class ReportServer():
+    """
+    Serves reports over HTTP from files that are loaded once. Each report type is an endpoint (like `/followup`) that
+    runs the first configured report of that type (or the one named by the `report` parameter), with its filters
+    and date ranges replaced by the query parameters. Responses are cached by their parameters.
+    """
+
+    def __init__(self, reports_config: ReportsConfig, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        if not isinstance(cache_size, int) or cache_size < 0:
+            raise ValueError("cache_size must be an integer greater than or equal to 0")
+        self._reports_config = reports_config
+        self._reports = {get_report_name(report, report_index): (report_index, report) for report_index, report in reports_config.get_selected_reports()}
+        self._cache: OrderedDict[str, Response] = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        # reports are made from the same loaded files, so they are run one at a time
+        self._run_lock = threading.Lock()
+        self._http = ThreadingHTTPServer((host, port), _ReportRequestHandler)
+        self._http.report_server = self
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._http.server_address[:2]
+
+    def serve_forever(self) -> None:
+        host, port = self.address
+        logging.info(f"Serving reports at http://{host}:{port}")
+        print(f'{Fore.CYAN}Serving reports at {Fore.LIGHTYELLOW_EX}http://{host}:{port}{Fore.CYAN}. Press Ctrl+C to stop{Style.RESET_ALL}')
+        try:
+            self._http.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Stopped serving reports")
+            print(f'{Fore.CYAN}Stopped serving reports{Style.RESET_ALL}')
+        finally:
+            self._http.server_close()
+
+    def shutdown(self) -> None:
+        # stops serve_forever from another thread
+        self._http.shutdown()
+
+    def get_index(self) -> Response:
+        endpoints = {}
+        for name, (_, report) in self._reports.items():
+            report_type = report.get("type")
+            if report_type not in FILTER_PARAMS:
+                continue
+            endpoint = endpoints.setdefault(report_type, {
+                "path": f"/{report_type}",
+                "reports": [],
+                "parameters": ["report", "format"] + FILTER_PARAMS[report_type] + [f"{key}.exclude" for key in FILTER_PARAMS[report_type]] + list(VALUE_PARAMS[report_type])
+            })
+            endpoint["reports"].append(name)
+        return Response(200, FORMATS["json"], json.dumps(endpoints, indent=2).encode('utf-8'))
+
+    def get_response(self, path: str, query: str) -> Response:
+        report_type = path.strip("/")
+        if not report_type:
+            return self.get_index()
+        if report_type not in FILTER_PARAMS:
+            return Response.error(404, f"No endpoint {path}. Must be one of {['/' + name for name in FILTER_PARAMS]}")
+        params = parse_qs(query, keep_blank_values=True)
+        try:
+            report_name, report_config, output_format = self.get_report_config(report_type, params)
+        except ValueError as e:
+            return Response.error(400, str(e))
+        except LookupError as e:
+            return Response.error(404, str(e))
+
+        key = get_canonical_hash({"report": report_name, "config": report_config, "format": output_format})
+        response = self._get_cached(key)
+        if response is not None:
+            return response
+        with self._run_lock:
+            # another request may have run the same report while this one waited
+            response = self._get_cached(key)
+            if response is not None:
+                return response
+            try:
+                results = self.run_report(report_config, self._reports[report_name][0])
+            except ValueError as e:
+                return Response.error(400, str(e))
+            except Exception as e:
+                logging.exception(f"ERROR! Could not run {report_name} with {params}")
+                return Response.error(500, f"Could not run {report_name}: {str(e)}")
+        response = Response(200, FORMATS[output_format], ReportServer.serialize(results, output_format))
+        self._set_cached(key, response)
+        return response
+
+    def get_report_config(self, report_type: str, params: dict[str, list[str]]) -> tuple[str, dict, str]:
+        """
+        Makes a report config entry from a configured report and query parameters.
+
+        Args:
+            report_type (str): The type of report to run.
+            params (dict[str, list[str]]): The query parameters, with every value of each parameter.
+
+        Returns:
+            tuple[str, dict, str]: The name of the configured report, the config entry to run and the output format.
+
+        Raises:
+            ValueError: If a parameter is unknown or invalid.
+            LookupError: If there is no configured report to run.
+        """
+        allowed = {"report", "format"} | set(VALUE_PARAMS[report_type])
+        allowed |= {f"{key}{suffix}" for key in FILTER_PARAMS[report_type] for suffix in ["", ".include", ".exclude"]}
+        unknown = [key for key in params if key not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown parameters {', '.join(unknown)}. Must be one of {sorted(allowed)}")
+
+        report_name = ReportServer.get_value(params, "report")
+        names = [name for name, (_, report) in self._reports.items() if report.get("type") == report_type]
+        if report_name is None:
+            if not names:
+                raise LookupError(f"No {report_type} reports are configured")
+            report_name = names[0]
+        elif report_name not in names:
+            raise LookupError(f"No {report_type} report named {report_name}. Must be one of {names}")
+
+        output_format = ReportServer.get_value(params, "format") or "csv"
+        if output_format not in FORMATS:
+            raise ValueError(f"Invalid format {output_format}. Must be one of {list(FORMATS)}")
+
+        report_config = copy.deepcopy(self._reports[report_name][1])
+        for key in FILTER_PARAMS[report_type]:
+            include = params.get(key, []) + params.get(f"{key}.include", [])
+            exclude = params.get(f"{key}.exclude", [])
+            if not include and not exclude:
+                continue
+            # only the part of the filter that is given is replaced. An empty value includes (or excludes) nothing
+            filter_config = dict(report_config.get(key) or {})
+            if include:
+                filter_config["include"] = ReportServer.split_values(include)
+            if exclude:
+                filter_config["exclude"] = ReportServer.split_values(exclude)
+            report_config[key] = filter_config
+        for key, value_type in VALUE_PARAMS[report_type].items():
+            value = ReportServer.get_value(params, key)
+            if value is None:
+                continue
+            try:
+                report_config[key] = value_type(value)
+            except ValueError:
+                raise ValueError(f"Invalid {key} {value}. Must be {'an integer' if value_type is int else 'a string'}")
+        return report_name, report_config, output_format
+
+    def run_report(self, report_config: dict, report_index: int) -> pd.DataFrame:
+        start = time.perf_counter()
+        reports = self._reports_config.build_reports(report_config, report_index)
+        if len(reports) > 1:
+            raise ValueError(f"The parameters make {len(reports)} reports. Choose one survey_id and day_range")
+        report = reports[0]
+        report.run_report()
+        results = report.get_final_results()
+        logging.info(f"Ran {report.report.get_class_name()} for the server in {time.perf_counter() - start:.3f}s")
+        return results if results is not None else pd.DataFrame()
+
+    @staticmethod
+    def serialize(results: pd.DataFrame, output_format: str) -> bytes:
+        if output_format == "json":
+            return results.to_json(orient="records", date_format="iso").encode('utf-8')
+        return results.to_csv(index=False).encode('utf-8')
+
+    @staticmethod
+    def get_value(params: dict[str, list[str]], key: str) -> str | None:
+        if key not in params:
+            return None
+        if len(params[key]) > 1:
+            raise ValueError(f"{key} can only be given once")
+        return params[key][0]
+
+    @staticmethod
+    def split_values(values: list[str]) -> list[str]:
+        # values can be repeated or comma separated, like the config's include and exclude strings
+        return [value for values_str in values for value in values_str.split(",") if value]
+
+    def _get_cached(self, key: str) -> Response | None:
+        with self._cache_lock:
+            if key not in self._cache:
+                return None
+            self._cache.move_to_end(key)
+            response = self._cache[key]
+        return Response(response.status, response.content_type, response.body, cached=True)
+
+    def _set_cached(self, key: str, response: Response) -> None:
+        if self._cache_size == 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = response
+            # the least recently used responses are dropped first
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+
+class _ReportRequestHandler(BaseHTTPRequestHandler):
+    server: ThreadingHTTPServer
+
+    def do_GET(self) -> None:
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        response = self.server.report_server.get_response(url.path, url.query)
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Content-Length", str(len(response.body)))
+        self.send_header("X-Cache", "hit" if response.cached else "miss")
+        self.end_headers()
+        self.wfile.write(response.body)
+        logging.info(f"Served {self.path} ({response.status}{', cached' if response.cached else ''}) in {time.perf_counter() - start:.3f}s")
+
+    def log_message(self, format: str, *args) -> None:
+        # requests are logged by do_GET instead of printed to stderr
+        logging.debug(format % args)
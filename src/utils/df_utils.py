@@ -1,14 +1,19 @@
 from argparse import ArgumentTypeError
+from collections.abc import Iterator
+import numpy as np
 import pandas as pd
 from src.utils.file_utils import filter_files, get_most_recent_file
 
+# the column rows are joined by when merge_by_time_diff is given their matches
+_MERGE_ROW = '__merge_row'
 
-def load_df(file_dir: str, must_contain: str, rename_columns: dict, date_col: str | None = None) -> pd.DataFrame:
+
+def load_df(file_dir: str, must_contain: str, rename_columns: dict, date_col: str | None = None, usecols: list[str] | None = None) -> pd.DataFrame:
     df = pd.read_csv(file_dir + "\\" + get_most_recent_file(filter_files(
         file_dir=file_dir,
         must_contain=must_contain,
         file_type=".csv"
-    )))
+    )), usecols=usecols)
     if rename_columns:
         df.rename(columns=rename_columns, inplace=True)
     if date_col:
@@ -16,6 +21,28 @@ def load_df(file_dir: str, must_contain: str, rename_columns: dict, date_col: st
     return df
 
 
+def read_df_chunks(file_dir: str, must_contain: str, rename_columns: dict, usecols: list[str] | None = None, chunksize: int = 100000) -> Iterator[pd.DataFrame]:
+    # reads the most recent file a chunk of rows at a time, so files larger than memory can be split
+    with pd.read_csv(file_dir + "\\" + get_most_recent_file(filter_files(
+        file_dir=file_dir,
+        must_contain=must_contain,
+        file_type=".csv"
+    )), usecols=usecols, chunksize=chunksize) as reader:
+        for chunk in reader:
+            if rename_columns:
+                chunk.rename(columns=rename_columns, inplace=True)
+            yield chunk
+
+
+def get_csv_columns(file_dir: str, must_contain: str) -> list[str]:
+    # reads only the header of the most recent file
+    return list(pd.read_csv(file_dir + "\\" + get_most_recent_file(filter_files(
+        file_dir=file_dir,
+        must_contain=must_contain,
+        file_type=".csv"
+    )), nrows=0).columns)
+
+
 def remove_columns(df, cols):
     if not cols:
         return df
@@ -34,24 +61,60 @@ def filter_columns(df, columns_to_display):
 
 def sort_columns_by_date(df, column_name):
     df[column_name] = pd.to_datetime(df[column_name]).dt.tz_localize(None)
-    df.sort_values(by=column_name, inplace=True)
+    # a stable sort keeps rows with the same date in the order they were in, so sorting sorted rows changes nothing
+    if not df[column_name].is_monotonic_increasing:
+        df.sort_values(by=column_name, kind='stable', inplace=True)
     return df
 
 
-def filter_by_time_diff(df_1: pd.DataFrame, col_1: str, df_2: pd.DataFrame, col_2: str, days: int, merge_col: str):
+def merge_by_time_diff(df_1: pd.DataFrame, col_1: str, df_2: pd.DataFrame, col_2: str, days: int | None, merge_col: str | list[str],
+                       matches: np.ndarray | None = None) -> pd.DataFrame:
     df_1[col_1] = pd.to_datetime(df_1[col_1]).dt.tz_localize(None)
     df_2[col_2] = pd.to_datetime(df_2[col_2]).dt.tz_localize(None)
-    merged_df = pd.merge_asof(df_1, df_2,
-                              left_on=col_1,
-                              right_on=col_2,
-                              by=merge_col,
-                              direction='backward',
-                              tolerance=pd.Timedelta(days=days))
+    if matches is not None:
+        # the position in df_2 of each row's match (-1 if it has none) was already found the way merge_asof finds it
+        # (like by a Timeline), so the rows are joined by it instead. Only df_1's merge_col is kept, the same as
+        # merging on it
+        merged_df = df_1.assign(**{_MERGE_ROW: matches}).merge(
+            df_2.drop(columns=merge_col).assign(**{_MERGE_ROW: np.arange(len(df_2))}),
+            on=_MERGE_ROW,
+            how='left'
+        ).drop(columns=_MERGE_ROW)
+    else:
+        merged_df = pd.merge_asof(df_1, df_2,
+                                  left_on=col_1,
+                                  right_on=col_2,
+                                  by=merge_col,
+                                  direction='backward',
+                                  tolerance=pd.Timedelta(days=days) if days is not None else None)
     merged_df['Time_Difference'] = merged_df[col_1] - merged_df[col_2]
+    return merged_df
+
+
+def filter_positive_time_diff(merged_df: pd.DataFrame) -> pd.DataFrame:
     # Filter rows where the survey was completed after the appointment
     return merged_df[merged_df['Time_Difference'] > pd.Timedelta(days=0)]
 
 
+def filter_time_diff_window(merged_df: pd.DataFrame, days: int, right_cols: list[str]) -> pd.DataFrame:
+    # Gives the same rows as merging with a tolerance of days, given a merge_by_time_diff made without a tolerance.
+    # Rows past the tolerance would have been unmatched, so the right columns are upcast the same way the merge does
+    out_of_range = merged_df['Time_Difference'] > pd.Timedelta(days=days)
+    window_df = filter_positive_time_diff(merged_df[~out_of_range])
+    if out_of_range.any():
+        unmatched = pd.Series(False, index=merged_df.index[:1])
+        for col in right_cols:
+            upcast = merged_df[col].head(1).where(unmatched).dtype
+            if window_df[col].dtype != upcast:
+                window_df = window_df.astype({col: upcast})
+    return window_df
+
+
+def filter_by_time_diff(df_1: pd.DataFrame, col_1: str, df_2: pd.DataFrame, col_2: str, days: int, merge_col: str | list[str],
+                        matches: np.ndarray | None = None):
+    return filter_positive_time_diff(merge_by_time_diff(df_1, col_1, df_2, col_2, days, merge_col, matches))
+
+
 def filter_target_isin(df: pd.DataFrame, col: str, li: list) -> None:
     df.drop(
         df[~df[col].isin(li)].index,
@@ -0,0 +1,119 @@
+import importlib.metadata
+import importlib.util
+import re
+import pandas as pd
+
+PANDAS = 'pandas'
+POLARS = 'polars'
+ENGINES = [PANDAS, POLARS]
+# optional packages an engine needs, with the oldest version of each it works with. pyarrow converts the loaded
+# DataFrames to and from polars, and polars 1.24 is the first with join(nulls_equal=...), after join(maintain_order=...)
+REQUIREMENTS = {POLARS: {'polars': '1.24', 'pyarrow': '7.0'}}
+# the positions merge gives each side's rows, so they can be ordered the way pd.merge orders them
+_LEFT_ROW = '__left_row'
+_RIGHT_ROW = '__right_row'
+
+
+def get_engine(config: dict | None) -> str:
+    # the engine reports run with, from the "engine" key of config.json. pandas is used if it isn't set
+    engine = (config or {}).get("engine") or PANDAS
+    if engine not in ENGINES:
+        raise ValueError(f"Invalid engine {engine}. Must be one of {ENGINES}")
+    requirements = REQUIREMENTS.get(engine, {})
+    missing = [package for package in requirements if importlib.util.find_spec(package) is None]
+    if missing:
+        raise ValueError(f"The {engine} engine requires the {', '.join(missing)} package to be installed")
+    for package, minimum in requirements.items():
+        version = importlib.metadata.version(package)
+        if _parse_version(version) < _parse_version(minimum):
+            raise ValueError(f"The {engine} engine requires {package} {minimum} or newer, but {package} {version} is installed")
+    return engine
+
+
+def _parse_version(version: str) -> tuple[int, ...]:
+    # the leading release numbers of a version (1.24.0rc1 is (1, 24, 0)), which is enough to compare with a minimum
+    match = re.match(r'\d+(\.\d+)*', version)
+    return tuple(int(part) for part in match.group(0).split('.')) if match else (0,)
+
+
+def to_polars(df: pd.DataFrame):
+    import polars as pl
+    # reports only use the columns of their DataSets, so the index isn't kept
+    return pl.from_pandas(df, include_index=False)
+
+
+def to_pandas(df, dtypes: dict | None = None) -> pd.DataFrame:
+    # missing strings are None instead of NaN, and integer columns with missing values are float, like pandas makes them
+    results = df.to_pandas()
+    # columns polars reads as another type (like object columns of timestamps) are given back the type they had
+    for col, dtype in (dtypes or {}).items():
+        if col not in results.columns or results[col].dtype == dtype:
+            continue
+        if dtype == object:
+            # the python values polars gives back are the ones the column was read from (like dates)
+            results[col] = pd.Series(df[col].to_list(), index=results.index, dtype=object)
+        elif pd.api.types.is_datetime64_dtype(dtype):
+            results[col] = results[col].astype(dtype)
+    return results
+
+
+def to_datetime(df, col: str):
+    """
+    Makes an expression that parses a column into naive datetimes, like pd.to_datetime(...).dt.tz_localize(None).
+
+    Args:
+        df (pl.DataFrame | pl.LazyFrame): The frame the column is in, which gives its type.
+        col (str): The column to parse.
+
+    Returns:
+        pl.Expr: The parsed column.
+    """
+    import polars as pl
+    dtype = df.collect_schema()[col] if isinstance(df, pl.LazyFrame) else df.schema[col]
+    expr = pl.col(col)
+    if dtype == pl.String:
+        expr = expr.str.to_datetime(time_unit='ns')
+    elif not isinstance(dtype, pl.Datetime):
+        expr = expr.cast(pl.Datetime('ns'))
+    return expr.dt.replace_time_zone(None)
+
+
+def merge(left, right, on: str | list[str], how: str = 'inner', suffixes: tuple[str, str] = ('_x', '_y')):
+    """
+    Joins two polars DataFrames with the same rows, row order, column names and types pd.merge gives: missing keys
+    match each other, overlapping columns get suffixes, left joins keep the left order and outer joins are sorted by
+    their keys. Integer columns of a side with unmatched rows are made float, like pandas does with NaN.
+
+    Args:
+        left (pl.DataFrame): The left DataFrame.
+        right (pl.DataFrame): The right DataFrame.
+        on (str | list[str]): The columns to join on.
+        how (str): "inner", "left" or "outer".
+        suffixes (tuple[str, str]): The suffixes added to overlapping columns of the left and right DataFrames.
+
+    Returns:
+        pl.DataFrame: The merged DataFrame.
+    """
+    import polars as pl
+    if how not in ['inner', 'left', 'outer']:
+        raise ValueError(f"Invalid merge {how}. Must be one of ['inner', 'left', 'outer']")
+    on = [on] if isinstance(on, str) else on
+    overlap = [col for col in left.columns if col in right.columns and col not in on]
+    left = left.rename({col: col + suffixes[0] for col in overlap}).with_row_index(_LEFT_ROW)
+    right = right.rename({col: col + suffixes[1] for col in overlap}).with_row_index(_RIGHT_ROW)
+    merged = left.join(right, on=on, how='full' if how == 'outer' else how, nulls_equal=True, coalesce=True)
+    if how == 'outer':
+        merged = merged.sort(on + [_LEFT_ROW, _RIGHT_ROW], nulls_last=True, maintain_order=True)
+    else:
+        merged = merged.sort([_LEFT_ROW, _RIGHT_ROW], nulls_last=True, maintain_order=True)
+
+    upcast = []
+    if merged[_LEFT_ROW].null_count():
+        upcast += [col for col in left.columns if col not in on]
+    if merged[_RIGHT_ROW].null_count():
+        upcast += [col for col in right.columns if col not in on]
+    columns = [col for col in left.columns if col != _LEFT_ROW] + [col for col in right.columns if col not in on and col != _RIGHT_ROW]
+    return merged.select([
+        pl.col(col).cast(pl.Float64) if col in upcast and merged.schema[col].is_integer() else pl.col(col)
+        for col in columns
+    ])
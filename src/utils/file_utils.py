@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import re
 import shutil
@@ -44,6 +45,20 @@ def filter_files(file_dir, must_contain, file_type):
     return valid_files
 
 
+def get_most_recent_export(file_dir: str, must_contain: str, file_type: str) -> tuple[str, float, int] | None:
+    # the name, modified time and size of the most recent matching file, or None if there isn't one. Unlike
+    # filter_files this doesn't log or raise, so directories can be checked often
+    exports = []
+    with os.scandir(file_dir) as entries:
+        for entry in entries:
+            if must_contain in entry.name and entry.name.endswith(file_type) and entry.is_file():
+                stat = entry.stat()
+                exports.append((entry.name, stat.st_mtime, stat.st_size))
+    if not exports:
+        return None
+    return max(exports, key=lambda x: x[1])
+
+
 def replace(string, replace_arr):
     for replace_obj in replace_arr:
         string = re.sub(replace_obj["replace"], replace_obj["with"], string)
@@ -75,3 +90,12 @@ def dir_format(file_dir: str):
         ROOT_DIR = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
         return os.path.join(ROOT_DIR, file_dir[3:])
     return file_dir
+
+
+def get_file_fingerprint(path: str, chunk_size: int = 1 << 20) -> str:
+    # hash of the file's contents, so re-exported files with the same data have the same fingerprint
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
@@ -1,4 +1,6 @@
 from datetime import date
+import hashlib
+import json
 import logging
 import re
 
@@ -82,6 +84,32 @@ def get_date_ranges(str_date_ranges: str) -> list[tuple[date, date]]:
     return date_ranges
 
 
+def get_labeled_date_ranges(str_date_ranges: str) -> list[tuple[str, date, date]]:
+    """
+    Parses a string of date ranges like `get_date_ranges`, labeling each range with its text.
+
+    Args:
+        str_date_ranges (str): The string of comma separated date ranges.
+
+    Returns:
+        list[tuple[str, date, date]]: The label, start date and (exclusive) end date of each range.
+
+    Example:
+        ```python
+        get_labeled_date_ranges("September 2023 - December 2023, January 2024 - April 2024")
+        # Output: [("September 2023 - December 2023", date(2023, 9, 1), date(2024, 1, 1)), ("January 2024 - April 2024", date(2024, 1, 1), date(2024, 5, 1))]
+        ```
+    """
+    labeled_ranges = []
+    for str_date_range in str_date_ranges.split(','):
+        label = str_date_range.strip()
+        if not label:
+            continue
+        start_date, end_date = get_date_ranges(label)[0]
+        labeled_ranges.append((label, start_date, end_date))
+    return labeled_ranges
+
+
 months = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
           "November", "December"]
 
@@ -108,3 +136,9 @@ def int_month_to_str(month: int) -> str:
 
 def list_to_regex_includes(li: set[str] | list[str] | tuple[str]) -> re.Pattern[str]:
     return re.compile('|'.join(li))
+
+
+def get_canonical_hash(obj: object) -> str:
+    # key order and whitespace don't change the hash of a config entry
+    canonical = json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
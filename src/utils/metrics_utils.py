@@ -0,0 +1,243 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator
+import pandas as pd
+
+
+class StageMetric():
+    def __init__(self, name: str, category: str, rows_in: int | None = None) -> None:
+        self.name = name
+        self.category = category
+        self.rows_in = rows_in
+        self.rows_out: int | None = None
+        self.start = time.time()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory: int | None = None
+        # the traced memory when the stage started, so the stage's peak is start_memory + peak_memory
+        self.start_memory: int | None = None
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "category": self.category,
+            "start": self.start,
+            "wall_seconds": self.wall,
+            "cpu_seconds": self.cpu,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "peak_memory_delta": self.peak_memory,
+            "pid": self.pid,
+        }
+
+    def to_trace_event(self) -> dict:
+        # a complete ("X") event in the Chrome trace event format
+        return {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": int(self.start * 1_000_000),
+            "dur": int(self.wall * 1_000_000),
+            "pid": self.pid,
+            "tid": self.tid,
+            "args": {"rows_in": self.rows_in, "rows_out": self.rows_out, "cpu_seconds": self.cpu, "peak_memory_delta": self.peak_memory},
+        }
+
+
+class _Frame():
+    def __init__(self, start_memory: int) -> None:
+        self.start_memory = start_memory
+        self.peak_memory = start_memory
+
+
+# metrics are only recorded while started, so measuring costs nothing otherwise
+_metrics: list[StageMetric] | None = None
+_frames: list[_Frame] = []
+_lock = threading.Lock()
+
+
+def start_metrics(memory: bool = True) -> None:
+    global _metrics
+    _metrics = []
+    _frames.clear()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop_metrics() -> list[StageMetric]:
+    global _metrics
+    metrics = take_metrics()
+    _metrics = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return metrics
+
+
+def is_measuring() -> bool:
+    return _metrics is not None
+
+
+def take_metrics() -> list[StageMetric]:
+    # returns the metrics recorded so far and keeps recording
+    if _metrics is None:
+        return []
+    with _lock:
+        metrics = _metrics.copy()
+        _metrics.clear()
+    return metrics
+
+
+def add_metrics(metrics: list[StageMetric]) -> None:
+    # adds metrics recorded by another process
+    if _metrics is None:
+        return
+    with _lock:
+        _metrics.extend(metrics)
+
+
+def _enter_frame() -> _Frame | None:
+    if not tracemalloc.is_tracing():
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    # the peak is reset for each stage, so the enclosing stage keeps the highest peak seen before it was reset
+    if _frames:
+        _frames[-1].peak_memory = max(_frames[-1].peak_memory, peak)
+    tracemalloc.reset_peak()
+    frame = _Frame(current)
+    _frames.append(frame)
+    return frame
+
+
+def _exit_frame(frame: _Frame | None) -> int | None:
+    if frame is None or not tracemalloc.is_tracing():
+        return None
+    _, peak = tracemalloc.get_traced_memory()
+    frame.peak_memory = max(frame.peak_memory, peak)
+    _frames.remove(frame)
+    if _frames:
+        _frames[-1].peak_memory = max(_frames[-1].peak_memory, frame.peak_memory)
+    return frame.peak_memory - frame.start_memory
+
+
+@contextmanager
+def measure(name: str, category: str, rows: Callable[[], int | None] | None = None) -> Iterator[StageMetric | None]:
+    # rows is called before and after the stage to count the rows it was given and the rows it made
+    if _metrics is None:
+        yield None
+        return
+    metric = StageMetric(name, category, rows() if rows else None)
+    frame = _enter_frame()
+    metric.start_memory = frame.start_memory if frame is not None else None
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield metric
+    finally:
+        metric.wall = time.perf_counter() - wall_start
+        metric.cpu = time.thread_time() - cpu_start
+        metric.peak_memory = _exit_frame(frame)
+        if rows:
+            metric.rows_out = rows()
+        with _lock:
+            _metrics.append(metric)
+        logging.debug(f"{category} {name} took {metric.wall:.3f}s ({metric.cpu:.3f}s CPU), {metric.rows_in} rows in, {metric.rows_out} rows out")
+
+
+def count_rows(df: pd.DataFrame | None) -> int | None:
+    if not isinstance(df, pd.DataFrame):
+        return None
+    return len(df)
+
+
+def reset_peak_rss() -> bool:
+    # Linux can reset the peak resident memory of the process, so the next peak is the peak of what runs after this
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss() -> int | None:
+    """
+    The peak resident memory of the process in bytes, which needs no tracing. On Linux it's the peak since
+    reset_peak_rss was last called, and on other platforms the peak since the process started.
+
+    Returns:
+        int | None: The peak resident memory, or None if the platform doesn't report it.
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        if hasattr(info, 'peak_wset'):
+            return info.peak_wset
+    except ImportError:
+        pass
+    if sys.platform == 'win32':
+        return _get_windows_peak_rss()
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS and in KB everywhere else
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _get_windows_peak_rss() -> int | None:
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in ["PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                                                 "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage"]
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(ProcessMemoryCounters)
+    try:
+        kernel32 = ctypes.WinDLL('kernel32')
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def measure_step(func: Callable) -> Callable:
+    # measures a report method, counting the rows of the report's results before and after it
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with measure(f"{self.get_class_name()}.{func.__name__}", "report_step", lambda: count_rows(getattr(self, '_results', None))):
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+def save_metrics(metrics: list[StageMetric], metrics_dir: str, run_name: str, trace: bool = False) -> str:
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, f"metrics_{run_name}.json")
+    with open(path, 'w') as file:
+        json.dump({"run": run_name, "metrics": [metric.to_dict() for metric in metrics]}, file, indent=2)
+    if trace:
+        with open(os.path.join(metrics_dir, f"trace_{run_name}.json"), 'w') as file:
+            json.dump({"traceEvents": [metric.to_trace_event() for metric in metrics]}, file)
+    return path
@@ -0,0 +1,139 @@
+import cProfile
+import importlib.util
+import logging
+import os
+import pstats
+import re
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator
+
+CPROFILE = 'cprofile'
+PYINSTRUMENT = 'pyinstrument'
+AUTO = 'auto'
+PROFILERS = [AUTO, CPROFILE, PYINSTRUMENT]
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 40
+
+
+class ProfileConfig():
+    def __init__(self, profile_dir: str, run_name: str, profiler: str = AUTO) -> None:
+        if profiler not in PROFILERS:
+            raise ValueError(f"Invalid profiler {profiler}. Must be one of {PROFILERS}")
+        if profiler == PYINSTRUMENT and importlib.util.find_spec(PYINSTRUMENT) is None:
+            raise ValueError("The pyinstrument profiler requires the pyinstrument package to be installed")
+        if profiler == AUTO:
+            # the sampling profiler slows reports down much less than cProfile, so it's used if it's installed
+            profiler = PYINSTRUMENT if importlib.util.find_spec(PYINSTRUMENT) is not None else CPROFILE
+        self.profile_dir = profile_dir
+        self.run_name = run_name
+        self.profiler = profiler
+
+    def get_path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.profile_dir, f"{self.run_name}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_')}{suffix}")
+
+
+# profiles are only made while profiling is started, and only the outermost profiled section is profiled since
+# profilers can't be nested
+_config: ProfileConfig | None = None
+_active = False
+_paths: list[str] = []
+
+
+def start_profiling(config: ProfileConfig) -> None:
+    global _config
+    _config = config
+    _paths.clear()
+    os.makedirs(config.profile_dir, exist_ok=True)
+    logging.info(f"Profiling with {config.profiler}, saving profiles to {config.profile_dir}")
+
+
+def stop_profiling() -> list[str]:
+    global _config
+    _config = None
+    paths = _paths.copy()
+    _paths.clear()
+    return paths
+
+
+def get_profile_config() -> ProfileConfig | None:
+    return _config
+
+
+def _start_profiler(profiler: str):
+    if profiler == PYINSTRUMENT:
+        from pyinstrument import Profiler
+        sampler = Profiler()
+        sampler.start()
+        return sampler
+    cpu_profiler = cProfile.Profile()
+    cpu_profiler.enable()
+    return cpu_profiler
+
+
+def _stop_profiler(profiler) -> None:
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+
+def _save_profile(profiler, name: str) -> list[str]:
+    if isinstance(profiler, cProfile.Profile):
+        path = _config.get_path(name, ".prof")
+        profiler.dump_stats(path)
+        summary_path = _config.get_path(name, "_functions.txt")
+        with open(summary_path, 'w') as file:
+            pstats.Stats(profiler, stream=file).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        return [path, summary_path]
+    path = _config.get_path(name, "_pyinstrument.txt")
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(profiler.output_text(unicode=True, color=False))
+    return [path]
+
+
+def _save_allocations(start: tracemalloc.Snapshot, end: tracemalloc.Snapshot, name: str, peak: int | None) -> str:
+    # the lines that allocated the most memory that was still allocated at the end of the section
+    stats = end.compare_to(start, 'lineno')
+    path = _config.get_path(name, "_allocations.txt")
+    with open(path, 'w') as file:
+        file.write(f"Top {TOP_ALLOCATIONS} allocations made while running {name}, by size\n")
+        file.write(f"Still allocated at the end: {sum(stat.size_diff for stat in stats) / 1024 ** 2:.1f} MiB\n")
+        if peak is not None:
+            file.write(f"Peak traced memory: {peak / 1024 ** 2:.1f} MiB\n")
+        file.write("\n")
+        for stat in stats[:TOP_ALLOCATIONS]:
+            file.write(f"{stat}\n")
+    return path
+
+
+@contextmanager
+def profile(name: str) -> Iterator[None]:
+    global _active
+    if _config is None or _active:
+        yield
+        return
+    _active = True
+    # tracemalloc may already be tracing for stage metrics, in which case it's left running
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    profiler = _start_profiler(_config.profiler)
+    try:
+        yield
+    finally:
+        try:
+            _stop_profiler(profiler)
+            # the peak is only known when nothing else (like stage metrics) resets it
+            peak = tracemalloc.get_traced_memory()[1] if started_tracing else None
+            # the profiler's own allocations aren't counted
+            end = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, cProfile.__file__), tracemalloc.Filter(False, tracemalloc.__file__)])
+            paths = _save_profile(profiler, name)
+            paths.append(_save_allocations(start, end, name, peak))
+            _paths.extend(paths)
+            logging.debug(f"Saved profiles of {name} to {', '.join(paths)}")
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            _active = False
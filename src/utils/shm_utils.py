@@ -0,0 +1,126 @@
+import logging
+import pickle
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+# columns are placed at offsets that are a multiple of this, so every column's values are aligned
+_ALIGNMENT = 64
+
+
+class SharedFrame():
+    """
+    A DataFrame placed in a shared memory segment. Columns with a numpy dtype (numbers, booleans and naive dates) are
+    written as their raw values, which every process that attaches the segment reads in place instead of copying.
+    The other columns (strings and other objects, and extension types) and the index are pickled into the segment
+    after them, so each process that attaches it has its own copy of only those.
+    """
+    def __init__(self, name: str, rows: int, arrays: list[tuple[int, str, int]], pickle_offset: int, pickle_size: int) -> None:
+        self.name = name
+        self.rows = rows
+        # the position, dtype and offset of each column read in place
+        self.arrays = arrays
+        self.pickle_offset = pickle_offset
+        self.pickle_size = pickle_size
+
+    def __repr__(self) -> str:
+        return f"SharedFrame({self.name}: {len(self.arrays)} shared columns)"
+
+
+# DataFrames shared by this process, keyed by id(df). The DataFrame is kept so its id cannot be reused while shared
+_shared: dict[int, tuple[pd.DataFrame, SharedFrame]] = {}
+_segments: list[shared_memory.SharedMemory] = []
+# DataFrames attached by this process, keyed by SharedFrame name, with the segment their columns are read from
+_attached: dict[str, tuple[pd.DataFrame, shared_memory.SharedMemory]] = {}
+
+
+def share_frame(df: pd.DataFrame) -> SharedFrame:
+    if id(df) in _shared:
+        return _shared[id(df)][1]
+    handle = _share_memory(df)
+    _shared[id(df)] = (df, handle)
+    logging.debug(f"Shared DataFrame with {len(df)} rows as {handle}")
+    return handle
+
+
+def get_shared_handle(df: pd.DataFrame) -> SharedFrame | None:
+    if id(df) not in _shared:
+        return None
+    return _shared[id(df)][1]
+
+
+def attach_frame(handle: SharedFrame) -> pd.DataFrame:
+    """
+    The DataFrame of a SharedFrame. Its shared columns are read-only views of the segment, so a process can't change
+    the values every other process reads. DataSets copy the DataFrame before they change it.
+
+    Args:
+        handle (SharedFrame): The shared DataFrame.
+
+    Returns:
+        pd.DataFrame: The DataFrame, which is attached once per process.
+    """
+    if handle.name in _attached:
+        return _attached[handle.name][0]
+    segment = shared_memory.SharedMemory(name=handle.name)
+    columns, rest = pickle.loads(segment.buf[handle.pickle_offset:handle.pickle_offset + handle.pickle_size])
+    values = {}
+    for position, dtype, offset in handle.arrays:
+        array = np.ndarray((handle.rows,), dtype=np.dtype(dtype), buffer=segment.buf, offset=offset)
+        array.flags.writeable = False
+        values[position] = array
+    rest_positions = [position for position in range(len(columns)) if position not in values]
+    for position, (_, series) in zip(rest_positions, rest.items()):
+        values[position] = series
+    # copy=False keeps the shared columns as views of the segment instead of copying them into blocks
+    df = pd.DataFrame({position: values[position] for position in range(len(columns))}, index=rest.index, copy=False)
+    df.columns = columns
+    # the segment stays open while the DataFrame's columns use it
+    _attached[handle.name] = (df, segment)
+    return df
+
+
+def release_shared_frames() -> None:
+    for df, segment in _attached.values():
+        try:
+            segment.close()
+        except BufferError:
+            # columns still in use keep the segment mapped until they are let go
+            pass
+    _attached.clear()
+    for segment in _segments:
+        segment.close()
+        segment.unlink()
+    _segments.clear()
+    _shared.clear()
+
+
+def _is_shared_column(series: pd.Series) -> bool:
+    # only numpy dtypes with fixed-size values can be read from a buffer. Timezone-aware dates, categories and the
+    # other extension types are pickled
+    return isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM'
+
+
+def _share_memory(df: pd.DataFrame) -> SharedFrame:
+    arrays = []
+    offset = 0
+    rest_positions = []
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        if _is_shared_column(series):
+            arrays.append((position, series.dtype.str, offset))
+            offset += -(-series.dtype.itemsize * len(df) // _ALIGNMENT) * _ALIGNMENT
+        else:
+            rest_positions.append(position)
+    # the other columns are pickled with the index, and the column labels are kept separately so duplicate labels
+    # are put back in their place
+    rest = df.iloc[:, rest_positions]
+    data = pickle.dumps((df.columns, rest), protocol=pickle.HIGHEST_PROTOCOL)
+    segment = shared_memory.SharedMemory(create=True, size=max(offset + len(data), 1))
+    for position, dtype, array_offset in arrays:
+        values = np.ndarray((len(df),), dtype=np.dtype(dtype), buffer=segment.buf, offset=array_offset)
+        values[:] = df.iloc[:, position].to_numpy()
+        del values
+    segment.buf[offset:offset + len(data)] = data
+    _segments.append(segment)
+    return SharedFrame(segment.name, len(df), arrays, offset, len(data))
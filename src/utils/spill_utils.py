@@ -0,0 +1,190 @@
+import atexit
+import logging
+import math
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable
+import numpy as np
+import pandas as pd
+
+# a loaded file takes about this many times its size on disk in memory, with the copies and merges reports make of it
+MEMORY_FACTOR = 5
+# the number of bytes sampled from the start of a file to estimate its row size
+_SAMPLE_BYTES = 1 << 20
+_MIN_CHUNKSIZE = 1000
+_spill_dirs: list[str] = []
+
+
+class SpilledFrame():
+    def __init__(self, name: str, paths: list[list[str]], dtypes: dict, columns: pd.DataFrame, rows: int) -> None:
+        self.name = name
+        # the spill files of each partition, in the order their rows are in the file
+        self.paths = paths
+        # the types the columns have when the whole file is read at once
+        self.dtypes = dtypes
+        # an empty DataFrame with the file's columns, for partitions without any rows
+        self.columns = columns
+        self.rows = rows
+
+
+class LinkedKeys():
+    """
+    Groups keys that share a link value, like the students a unique referral was saved for, so every row of a group
+    can be put in the same partition.
+    """
+    def __init__(self) -> None:
+        self._parents: dict = {}
+        self._links: dict = {}
+
+    def add(self, keys: pd.Series, links: pd.Series) -> None:
+        pairs = pd.DataFrame({"key": keys.to_numpy(), "link": links.to_numpy()}).dropna().drop_duplicates()
+        for key, link in zip(pairs["key"], pairs["link"]):
+            if link in self._links:
+                self._union(self._links[link], key)
+            else:
+                self._links[link] = key
+
+    def get_map(self) -> dict:
+        # each key that is linked to another key, mapped to the key its group is partitioned by
+        return {key: self._find(key) for key in self._parents}
+
+    def _find(self, key):
+        while self._parents.get(key, key) != key:
+            self._parents[key] = self._parents.get(self._parents[key], self._parents[key])
+            key = self._parents[key]
+        return key
+
+    def _union(self, key, other) -> None:
+        root, other_root = self._find(key), self._find(other)
+        if root != other_root:
+            self._parents.setdefault(root, root)
+            self._parents[other_root] = root
+
+
+def get_memory_budget(config: dict | None) -> int | None:
+    # the memory reports can use in MB, from the "memory_budget" key of config.json. Files are loaded whole if it isn't set
+    memory_budget = (config or {}).get("memory_budget")
+    if memory_budget is None:
+        return None
+    if not isinstance(memory_budget, int) or isinstance(memory_budget, bool) or memory_budget < 1:
+        raise ValueError(f"Invalid memory_budget {memory_budget}. Must be a number of MB greater than or equal to 1")
+    return memory_budget
+
+
+def get_partition_count(partitioned_bytes: int, whole_bytes: int, memory_budget: int) -> int:
+    """
+    Finds how many partitions the files that are split by student need, so one partition and the files that are loaded
+    whole fit in the memory budget.
+
+    Args:
+        partitioned_bytes (int): The size on disk of the files that can be split by student.
+        whole_bytes (int): The size on disk of the files every partition loads whole.
+        memory_budget (int): The memory reports can use, in MB.
+
+    Returns:
+        int: The number of partitions, 1 if every file fits in the memory budget.
+
+    Raises:
+        ValueError: If the files that are loaded whole don't fit in the memory budget on their own.
+    """
+    available = memory_budget * (1 << 20) - whole_bytes * MEMORY_FACTOR
+    if available <= 0:
+        raise ValueError(f"The files loaded by every partition need more than the memory_budget of {memory_budget} MB")
+    return max(1, math.ceil(partitioned_bytes * MEMORY_FACTOR / available))
+
+
+def get_chunksize(path: str, memory_budget: int) -> int:
+    # the rows read at a time while a file is split, so a chunk uses a small part of the memory budget
+    with open(path, 'rb') as file:
+        sample = file.read(_SAMPLE_BYTES)
+    row_bytes = len(sample) / max(1, sample.count(b'\n'))
+    return max(_MIN_CHUNKSIZE, int(memory_budget * (1 << 20) / MEMORY_FACTOR / 4 / max(1.0, row_bytes)))
+
+
+def make_spill_dir(spill_dir: str | None = None) -> str:
+    # spill files are written to a new directory in spill_dir (or the system temp directory), removed when released
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+    path = tempfile.mkdtemp(prefix='handshake_reports_spill_', dir=spill_dir or None)
+    _spill_dirs.append(path)
+    return path
+
+
+def release_spill_files() -> None:
+    for path in _spill_dirs:
+        shutil.rmtree(path, ignore_errors=True)
+    _spill_dirs.clear()
+
+
+atexit.register(release_spill_files)
+
+
+def get_partitions(keys: pd.Series, partitions: int, key_map: dict | None = None) -> np.ndarray:
+    # the partition of each row. Rows with the same key (or keys key_map maps to the same key) are always in the same
+    # partition, whatever file they are in
+    if key_map:
+        keys = keys.map(key_map).fillna(keys)
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy() % partitions
+
+
+def spill_frame(chunks: Iterable[pd.DataFrame], key: str, partitions: int, spill_dir: str, name: str, key_map: dict | None = None) -> SpilledFrame:
+    """
+    Splits the chunks of a file into partitions by a key column and writes each partition's rows to spill files, so
+    only one chunk is in memory at a time.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): The chunks of the file, in order.
+        key (str): The column rows are partitioned by.
+        partitions (int): The number of partitions.
+        spill_dir (str): The directory the spill files are written to.
+        name (str): The name the spill files start with.
+        key_map (dict | None): Keys mapped to the key they are partitioned by, from LinkedKeys.
+
+    Returns:
+        SpilledFrame: The spill files of each partition.
+    """
+    paths: list[list[str]] = [[] for _ in range(partitions)]
+    chunk_dtypes: dict[str, list] = {}
+    columns = None
+    rows = 0
+    for index, chunk in enumerate(chunks):
+        if key not in chunk.columns:
+            raise ValueError(f"Cannot split {name} by {key}. The column is not in the file")
+        if columns is None:
+            columns = chunk.head(0)
+        for col, dtype in chunk.dtypes.items():
+            chunk_dtypes.setdefault(col, []).append(dtype)
+        rows += len(chunk)
+        chunk_partitions = get_partitions(chunk[key], partitions, key_map)
+        for partition in range(partitions):
+            rows_in_partition = chunk[chunk_partitions == partition]
+            if rows_in_partition.empty:
+                continue
+            path = os.path.join(spill_dir, f"{name}_{partition}_{index}.pkl")
+            rows_in_partition.to_pickle(path)
+            paths[partition].append(path)
+    logging.debug(f"Split {rows} rows of {name} into {partitions} partitions")
+    dtypes = {col: _get_common_dtype(col_dtypes) for col, col_dtypes in chunk_dtypes.items()}
+    return SpilledFrame(name, paths, dtypes, columns if columns is not None else pd.DataFrame(), rows)
+
+
+def read_partition(spilled: SpilledFrame, partition: int) -> pd.DataFrame:
+    # rows keep the index they have when the whole file is read, and columns the type they have
+    pieces = [pd.read_pickle(path) for path in spilled.paths[partition]]
+    df = pd.concat(pieces) if pieces else spilled.columns.copy()
+    changed = {col: dtype for col, dtype in spilled.dtypes.items() if df[col].dtype != dtype}
+    if changed:
+        df = df.astype(changed)
+    return df
+
+
+def _get_common_dtype(dtypes: list) -> np.dtype:
+    # the type a column has when every chunk of it is read at once. Integer chunks are float if another chunk has
+    # missing values, and any other mix is object
+    unique = set(dtypes)
+    if len(unique) == 1:
+        return dtypes[0]
+    if all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) for dtype in unique):
+        return np.result_type(*unique)
+    return np.dtype(object)
@@ -59,6 +59,9 @@ class FilterType():
 
         return FilterType(include, exclude)
 
+    def get_key(self) -> tuple[tuple[str, ...], tuple[str, ...]]:
+        return (tuple(sorted(FilterType.get_set(self.include))), tuple(sorted(FilterType.get_set(self.exclude))))
+
     def get_include(self) -> str:
         if self.include is None:
             return ".*?"
@@ -68,3 +71,62 @@ class FilterType():
         if self.exclude is None:
             return "a^"
         return list_to_regex_includes(FilterType.get_set(self.exclude)).pattern
+
+
+class ColumnProjection():
+    # the columns a report keeps: only the included columns, or every column that isn't excluded
+    def __init__(self, include: list[str] | set[str] | None = None, exclude: list[str] | set[str] | None = None) -> None:
+        self.include = set(include) if include is not None else None
+        self.exclude = set(exclude) if exclude is not None else set()
+
+    def __repr__(self) -> str:
+        if self.include is not None:
+            return f"ColumnProjection(include={sorted(self.include)})"
+        return f"ColumnProjection(exclude={sorted(self.exclude)})"
+
+    @staticmethod
+    def from_report(final_cols: list[str] | None, remove_cols: list[str] | None, rename_cols: dict[str, str] | None,
+                    keep_cols: list[str] | None = None) -> "ColumnProjection":
+        # final_cols and keep_cols (columns the results are partitioned by) are named after rename_cols is applied
+        renamed = {new: old for old, new in (rename_cols or {}).items()}
+        if final_cols:
+            projection = ColumnProjection(include=[renamed.get(col, col) for col in final_cols])
+        else:
+            projection = ColumnProjection(exclude=remove_cols)
+        if keep_cols:
+            projection = projection.keep([renamed.get(col, col) for col in keep_cols])
+        return projection
+
+    def is_all(self) -> bool:
+        return self.include is None and not self.exclude
+
+    def wants(self, col: str) -> bool:
+        if self.include is not None:
+            return col in self.include
+        return col not in self.exclude
+
+    def keep(self, cols: set[str] | list[str]) -> "ColumnProjection":
+        if self.include is not None:
+            return ColumnProjection(include=self.include | set(cols))
+        return ColumnProjection(exclude=self.exclude - set(cols))
+
+    def with_suffixes(self, suffixes: list[str]) -> "ColumnProjection":
+        # a column that merges copy with a suffix is kept if any of its copies are wanted
+        if not suffixes:
+            return self
+        if self.include is not None:
+            return ColumnProjection(include=self.include | {
+                col[:-len(suffix)] for col in self.include for suffix in suffixes if col.endswith(suffix) and len(col) > len(suffix)
+            })
+        return ColumnProjection(exclude={col for col in self.exclude if all(col + suffix in self.exclude for suffix in suffixes)})
+
+    def union(self, other: "ColumnProjection") -> "ColumnProjection":
+        if self.include is not None and other.include is not None:
+            return ColumnProjection(include=self.include | other.include)
+        if self.include is None and other.include is None:
+            return ColumnProjection(exclude=self.exclude & other.exclude)
+        include, exclude = (self.include, other.exclude) if self.include is not None else (other.include, self.exclude)
+        return ColumnProjection(exclude=exclude - include)
+
+    def select(self, columns: list[str]) -> list[str]:
+        return [col for col in columns if self.wants(col)]
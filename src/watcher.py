@@ -0,0 +1,89 @@
+from src.driver import Driver
+from src.utils.file_utils import dir_format, get_most_recent_export
+from colorama import Fore, Style
+import logging
+import time
+
+DEFAULT_INTERVAL = 5.0
+
+
+class Watcher():
+    """
+    Keeps the loaded files in memory and checks their directories for new exports. When a file has a new export,
+    only that file is loaded again and only the reports that use it are run again.
+
+    A new export is only loaded once it has been the same (name, modified time and size) for two checks in a row,
+    so files that are still being downloaded or copied aren't loaded.
+    """
+
+    def __init__(self, driver: Driver, interval: float = DEFAULT_INTERVAL) -> None:
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            raise ValueError("interval must be a number of seconds greater than 0")
+        self._driver = driver
+        self.interval = interval
+        # the exports seen in the last check that haven't been loaded yet (by file id)
+        self._pending: dict[str, tuple[str, float, int]] = {}
+        # exports that could not be loaded, which aren't tried again until they change
+        self._failed: dict[str, tuple[str, float, int]] = {}
+
+    def run(self) -> None:
+        self._driver.run()
+        files = self._driver.get_files_config()
+        logging.info(f"Watching {len(files.exports)} files for new exports every {self.interval} seconds")
+        print(f'{Fore.CYAN}Watching {Fore.LIGHTMAGENTA_EX}{len(files.exports)}{Fore.CYAN} files for new exports every '
+              f'{Fore.LIGHTMAGENTA_EX}{self.interval}{Fore.CYAN} seconds. Press Ctrl+C to stop{Style.RESET_ALL}')
+        try:
+            while True:
+                time.sleep(self.interval)
+                self.check()
+        except KeyboardInterrupt:
+            logging.info("Stopped watching for new exports")
+            print(f'{Fore.CYAN}Stopped watching for new exports{Style.RESET_ALL}')
+
+    def check(self) -> list[str]:
+        """
+        Checks for new exports once and runs the reports that use them.
+
+        Returns:
+            list[str]: The names of the reports that were run.
+        """
+        exports = self.get_changed_files()
+        file_ids = list(exports)
+        if not file_ids:
+            return []
+        logging.info(f"Found new exports of {', '.join(file_ids)}")
+        print(f'{Fore.CYAN}Found new exports of {Fore.LIGHTYELLOW_EX}{", ".join(file_ids)}{Style.RESET_ALL}')
+        try:
+            report_names = self._driver.rerun(file_ids)
+        except Exception as e:
+            # a bad export shouldn't stop the watcher. The files that did load stay loaded
+            self._failed.update(exports)
+            logging.exception(f"ERROR! Could not run the reports that use {', '.join(file_ids)}")
+            print(f'{Fore.RED}ERROR! {Fore.LIGHTRED_EX}Could not run the reports that use {", ".join(file_ids)}: {str(e)}{Style.RESET_ALL}')
+            return []
+        if report_names:
+            logging.info(f"Ran {len(report_names)} reports: {', '.join(report_names)}")
+            print(f'{Fore.GREEN}Ran {Fore.LIGHTMAGENTA_EX}{len(report_names)}{Fore.GREEN} reports: {Fore.LIGHTYELLOW_EX}{", ".join(report_names)}{Style.RESET_ALL}')
+        return report_names
+
+    def get_changed_files(self) -> dict[str, tuple[str, float, int]]:
+        # the new exports of loaded files (by file id) that have finished being written
+        files = self._driver.get_files_config()
+        changed = {}
+        for file_id, loaded_export in files.exports.items():
+            file = files.get_file_config(file_id)
+            if file is None:
+                continue
+            try:
+                export = get_most_recent_export(dir_format(file["dir"]), file["must_contain"], ".csv")
+            except OSError as e:
+                logging.warning(f"WARNING! Could not check {file['dir']} for new {file_id} exports: {str(e)}")
+                continue
+            if export is None or export == loaded_export or export == self._failed.get(file_id):
+                self._pending.pop(file_id, None)
+            elif self._pending.get(file_id) != export:
+                self._pending[file_id] = export
+            else:
+                self._pending.pop(file_id)
+                changed[file_id] = export
+        return changed
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.config.report_selection import get_file_prefixes
+from src.reports.archive_index import MAX_GROUPS, ArchiveIndex, parse_date
+from src.reports.report import Report
+
+
+class TestArchiveIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.dir.name, "archive")
+        self.index = ArchiveIndex(os.path.join(self.dir.name, "index.sqlite"))
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def results(self, rows: int) -> pd.DataFrame:
+        return pd.DataFrame({
+            "Student Email": [f"student{i}@oakland.edu" for i in range(rows)],
+            "Student College": ["School of Nursing" if i % 3 == 0 else "School of Business Administration" for i in range(rows)]
+        })
+
+    def save(self, timestamp: str, results: pd.DataFrame, **kwargs) -> Report:
+        # the report's own report is only used for its name
+        report = Report("followup_", self.dir.name, Report("inner_", self.dir.name, None), archive_dir=self.archive_dir, **kwargs)
+        report.results = results
+        report.timestamp = timestamp
+        report.save_archive()
+        self.index.add(report)
+        return report
+
+    def test_runs_are_counted_from_the_index(self):
+        self.save("20240101-000000", self.results(30))
+        self.save("20240201-000000", self.results(60), partition_cols=["Student College"])
+        runs = self.index.query("followup_")
+        self.assertEqual(list(runs["rows"]), [30, 60])
+        by_college = self.index.query("followup_", "Student College", start=parse_date("2024-02-01"))
+        self.assertEqual(list(by_college["Student College"]), ["School of Business Administration", "School of Nursing"])
+        self.assertEqual(list(by_college["rows"]), [40, 20])
+
+    def test_columns_with_many_values_are_read_when_asked_for(self):
+        self.save("20240101-000000", self.results(MAX_GROUPS + 1))
+        # the archive is read for the counts, and they are kept in the index
+        runs = self.index.query("followup_", "Student Email")
+        self.assertEqual(len(runs), MAX_GROUPS + 1)
+        os.remove(self.archive_dir + "\\" + "followup_20240101-000000.csv")
+        pd.testing.assert_frame_equal(self.index.query("followup_", "Student Email"), runs)
+
+    def test_archives_saved_before_the_index_are_synced(self):
+        self.results(30).to_csv(self.archive_dir + "\\" + "followup_20240101-000000.csv", index=False)
+        self.results(9).to_csv(self.archive_dir + "\\" + "followup_nursing_20240101-000000.csv", index=False)
+        self.assertEqual(self.index.sync(self.archive_dir, "followup_", "Followup", ["followup_nursing_"]), 1)
+        self.assertEqual(self.index.sync(self.archive_dir, "followup_", "Followup", ["followup_nursing_"]), 0)
+        runs = self.index.query("followup_", "Student College")
+        self.assertEqual(list(runs["rows"]), [20, 10])
+
+    def test_file_prefixes(self):
+        self.assertEqual(get_file_prefixes({"type": "followup", "file_prefix": "followup_"}), ["followup_"])
+        report = {"type": "survey_results", "file_prefix": "survey_", "survey_id": ["a", "b"], "day_range": [7, 14]}
+        self.assertEqual(get_file_prefixes(report), ["survey_a_7days_", "survey_a_14days_", "survey_b_7days_", "survey_b_14days_"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import glob
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.config.report_selection import get_archive_store
+from src.reports.archive_store import ArchiveStore
+from src.reports.delta import read_archive
+from src.reports.output import OutputSink, serialize_csv
+from src.reports.report import Report
+
+
+class TestArchiveStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.dir.name, "archive")
+        self.store = ArchiveStore(rows_per_chunk=16)
+        self.df = pd.DataFrame({
+            "Email": [f"student{i}@oakland.edu" for i in range(1000)],
+            "Note": [f'line one\nline "{i}", two' if i % 7 == 0 else str(i) for i in range(1000)],
+            "Date": pd.date_range("2024-01-01", periods=1000, freq="D")
+        })
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def chunk_files(self) -> list[str]:
+        return glob.glob(glob.escape(self.archive_dir + "\\") + "chunk_*")
+
+    def test_archives_are_restored_exactly(self):
+        path = self.archive_dir + "\\" + "followup_20240101-000000.manifest.json"
+        manifest = self.store.save(self.df, path)
+        self.assertGreater(len(manifest["chunks"]), 1)
+        self.assertEqual(ArchiveStore.load(path), serialize_csv(self.df, index=False))
+        pd.testing.assert_frame_equal(read_archive(path), self.df.astype(str))
+
+    def test_unchanged_chunks_are_stored_once(self):
+        self.store.save(self.df, self.archive_dir + "\\" + "followup_20240101-000000.manifest.json")
+        first_chunks = len(self.chunk_files())
+        self.store.save(self.df, self.archive_dir + "\\" + "followup_20240102-000000.manifest.json")
+        self.assertEqual(len(self.chunk_files()), first_chunks)
+
+        # a row added near the start only changes the chunk it is added to
+        changed = pd.concat([self.df.iloc[:10], self.df.iloc[[500]], self.df.iloc[10:]], ignore_index=True)
+        path = self.archive_dir + "\\" + "followup_20240103-000000.manifest.json"
+        manifest = self.store.save(changed, path)
+        self.assertLessEqual(len(self.chunk_files()) - first_chunks, 2)
+        self.assertGreater(len(manifest["chunks"]), 10)
+        self.assertEqual(ArchiveStore.load(path), serialize_csv(changed, index=False))
+
+    def test_missing_chunks_are_errors(self):
+        path = self.archive_dir + "\\" + "followup_20240101-000000.manifest.json"
+        self.store.save(self.df, path)
+        os.remove(self.chunk_files()[0])
+        with self.assertRaises(ValueError):
+            ArchiveStore.load(path)
+
+    def test_report_archives(self):
+        # the report's own report is only used for its name
+        report = Report("followup_", self.dir.name, Report("inner_", self.dir.name, None), archive_dir=self.archive_dir, archive_store=self.store)
+        report.results = self.df
+        report.timestamp = "20240101-000000"
+        report.save_archive()
+        path = self.archive_dir + "\\" + "followup_20240101-000000.manifest.json"
+        self.assertEqual(ArchiveStore.load(path), serialize_csv(self.df, index=False))
+        with self.assertRaises(ValueError):
+            Report("followup_", self.dir.name, None, archive_dir=self.archive_dir, archive_store=self.store, archive_sink=OutputSink("parquet"))
+
+    def test_archive_store_config(self):
+        self.assertIsNone(get_archive_store({}))
+        self.assertEqual(get_archive_store({"archive_store": True}), 256)
+        self.assertEqual(get_archive_store({"archive_store": {"rows_per_chunk": 50}}), 50)
+        with self.assertRaises(ValueError):
+            get_archive_store({"archive_store": {"rows_per_chunk": 0}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from benchmarks.benchmark import BENCHMARKS, BenchmarkResult, get_scaling, project_seconds, run_benchmarks
+from benchmarks.synthetic import BENCHMARK_FILES_CONFIG, generate_files, load_datasets, open_files_config
+from src.dataset.enrollment import EnrollmentDataSet
+from src.dataset.referral import ReferralDataSet
+
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self) -> None:
+        self.files = open_files_config(BENCHMARK_FILES_CONFIG)
+
+    def test_exports_have_the_configured_headers(self):
+        exports = generate_files(self.files, 1000)
+        for file in self.files:
+            headers = {config.get("map", config["name"]) for config in file["column_names"].values()}
+            self.assertTrue(headers <= set(exports[file["id"]].columns), file["id"])
+        self.assertEqual(len(exports["appointments"]), 1000)
+
+    def test_same_seed_generates_the_same_exports(self):
+        first = generate_files(self.files, 500, seed=1)
+        second = generate_files(self.files, 500, seed=1)
+        for file_id in first:
+            self.assertTrue(first[file_id].equals(second[file_id]), file_id)
+
+    def test_referral_card_ids_match_enrollment(self):
+        datasets = load_datasets(self.files, generate_files(self.files, 1000))
+        card_ids = datasets["referrals"].get_col(ReferralDataSet.Column.STUDENT_CARD_ID).str.replace('G', '').astype(int)
+        self.assertTrue(card_ids.isin(datasets["enrollment"].get_col(EnrollmentDataSet.Column.STUDENT_CARD_ID)).all())
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_every_benchmark_runs(self):
+        results = run_benchmarks([1000, 2000], repeat=1)
+        self.assertEqual(len(results), 2 * len(BENCHMARKS))
+        for result in results:
+            self.assertGreater(result.rows_out, 0, result.name)
+
+    def test_scaling_fits_the_curve(self):
+        results = [BenchmarkResult("linear", rows, rows / 1000, 0, None, None) for rows in [1000, 10_000, 100_000]]
+        self.assertAlmostEqual(get_scaling(results)["linear"], 1.0)
+        self.assertAlmostEqual(project_seconds(results, "linear", 200_000), 200.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import glob
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.config.report_selection import get_run_config
+from src.dataset.dataset import DataSet
+from src.reports.cache import ResultCache, RunJournal
+from src.reports.executor import ReportExecutor
+from src.reports.report import Report
+
+
+class CountingReport(Report):
+    def __init__(self, dataset: DataSet) -> None:
+        self.dataset = dataset
+        self.runs = 0
+        self.fail = False
+        self.results = pd.DataFrame()
+
+    def run_report(self) -> None:
+        self.runs += 1
+        if self.fail:
+            raise RuntimeError("The run stopped")
+        self.results = self.dataset.get_df().copy()
+
+    def get_results(self) -> pd.DataFrame:
+        return self.results
+
+    def get_datasets(self) -> list[DataSet]:
+        return [self.dataset]
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.cache_dir.name)
+        self.dataset = DataSet("test", pd.DataFrame({"id": [1, 2, 3]}), {"id": "id"})
+        self.dataset.fingerprint = "file"
+
+    def tearDown(self) -> None:
+        self.cache_dir.cleanup()
+
+    def _report(self, config_hash: str | None = "config", file_prefix: str = "test_") -> Report:
+        return Report(file_prefix, os.path.join(self.cache_dir.name, "results"), CountingReport(self.dataset.deep_copy()), config_hash=config_hash)
+
+    def test_cached_results_are_reused(self):
+        report = self._report()
+        self.assertFalse(self.cache.load(report))
+        report.run_report()
+        self.cache.store(report)
+
+        cached = self._report()
+        self.assertTrue(self.cache.load(cached))
+        self.assertEqual(cached.report.runs, 0)
+        pd.testing.assert_frame_equal(cached.results, report.results)
+
+    def test_changed_inputs_are_not_reused(self):
+        report = self._report()
+        report.run_report()
+        self.cache.store(report)
+
+        self.assertFalse(self.cache.load(self._report("other config")))
+        self.dataset.fingerprint = "other file"
+        self.assertFalse(self.cache.load(self._report()))
+
+    def test_reports_without_fingerprints_are_not_cached(self):
+        self.assertIsNone(self._report(None).get_cache_key())
+        self.dataset.fingerprint = None
+        self.assertIsNone(self._report().get_cache_key())
+
+    def test_output_keys_are_not_part_of_the_run_config(self):
+        report = {"type": "followup", "file_prefix": "followup_", "results_dir": "results", "rename_cols": {"a": "b"},
+                  "final_cols": ["b"], "results_format": "parquet", "target_date_ranges": "January 2024 - April 2024"}
+        self.assertEqual(get_run_config(report), {"type": "followup", "file_prefix": "followup_", "target_date_ranges": "January 2024 - April 2024"})
+
+    def test_cached_results_must_have_the_loaded_columns(self):
+        # results cached with every column can be saved with fewer, but not the other way around
+        self.assertTrue(ResultCache.has_columns([["a", "b"], ["c"]], [["a"], ["c"]]))
+        self.assertFalse(ResultCache.has_columns([["a"]], [["a", "b"]]))
+        report = self._report()
+        report.run_report()
+        self.cache.store(report)
+        self.dataset = DataSet("test", pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"]}), {"id": "id"})
+        self.dataset.fingerprint = "file"
+        self.assertFalse(self.cache.load(self._report()))
+
+    def test_stopped_runs_are_resumed(self):
+        reports = [self._report(file_prefix="first_"), self._report(file_prefix="second_")]
+        reports[1].report.fail = True
+        with self.assertRaises(RuntimeError):
+            ReportExecutor(reports, cache=self.cache, journal=RunJournal(self.cache_dir.name, reports)).run()
+        timestamp = reports[0].timestamp
+
+        resumed = [self._report(file_prefix="first_"), self._report(file_prefix="second_")]
+        ReportExecutor(resumed, cache=self.cache, journal=RunJournal(self.cache_dir.name, resumed), resume=True).run()
+        # the saved report isn't saved again, and the other is saved with the stopped run's timestamp
+        self.assertEqual(resumed[0].report.runs, 0)
+        self.assertEqual(resumed[1].report.runs, 1)
+        self.assertEqual(resumed[1].timestamp, timestamp)
+        results = sorted(os.path.basename(path) for path in glob.glob(os.path.join(self.cache_dir.name, "results*")))
+        self.assertEqual(results, [f"results\\first_{timestamp}.csv", f"results\\second_{timestamp}.csv"])
+        # a finished run has nothing to resume
+        self.assertFalse(os.path.exists(RunJournal(self.cache_dir.name, resumed).path))
@@ -0,0 +1,89 @@
+import pickle
+from datetime import date
+import unittest
+import numpy as np
+import pandas as pd
+from src.dataset.dataset import DataSet
+from src.utils.shm_utils import attach_frame, release_shared_frames, share_frame
+
+
+class TestDataSetCopies(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dataset = DataSet("test", pd.DataFrame({"date": ["2024-01-02", "2024-01-01"], "id": [1, 2]}), {"date": "date", "id": "id"})
+
+    def tearDown(self) -> None:
+        release_shared_frames()
+
+    def test_deep_copy_is_made_on_first_use(self):
+        copy = self.dataset.deep_copy()
+        self.assertFalse(copy.is_copied())
+        self.assertIs(copy.get_origin(), self.dataset)
+        self.assertEqual(list(copy.get_columns()), ["date", "id"])
+        self.assertFalse(copy.is_copied())
+
+        copy.sort_date()
+        self.assertTrue(copy.is_copied())
+        self.assertIs(copy.get_origin(), copy)
+        self.assertEqual(list(copy.get_df()["id"]), [2, 1])
+        self.assertEqual(list(self.dataset.get_df()["id"]), [1, 2])
+
+    def test_copy_of_copy_uses_the_same_origin(self):
+        copy = self.dataset.deep_copy().deep_copy()
+        self.assertIs(copy.get_origin(), self.dataset)
+
+    def test_pickle_shared_dataset(self):
+        share_frame(self.dataset.get_df())
+        copy = pickle.loads(pickle.dumps(self.dataset.deep_copy()))
+        pd.testing.assert_frame_equal(copy.get_df(), self.dataset.get_df())
+        self.assertEqual(copy.cols, self.dataset.cols)
+
+    def test_shared_columns_are_read_in_place(self):
+        df = pd.DataFrame({"value": np.arange(1000.0), "date": pd.date_range("2024-01-01", periods=1000), "name": ["a"] * 1000})
+        attached = attach_frame(share_frame(df))
+        pd.testing.assert_frame_equal(attached, df)
+        # numeric and date columns are views of the shared memory, which no process can change
+        for col in ["value", "date"]:
+            values = attached[col].to_numpy()
+            self.assertIsNotNone(values.base)
+            self.assertFalse(values.flags.writeable)
+        copy = DataSet("test", attached, {"value": "value"}).deep_copy()
+        copy.get_df().loc[0, "value"] = -1
+        self.assertEqual(attached.loc[0, "value"], 0)
+
+
+class TestDataSetOrder(unittest.TestCase):
+    def setUp(self) -> None:
+        dates = ["2024-01-03", None, "2024-01-01", "2024-02-01", "2024-01-01", "2024-01-15"]
+        self.dataset = DataSet("test", pd.DataFrame({"date": dates, "id": range(6)}), {"date": "date", "id": "id"})
+
+    def test_sorted_datasets_are_not_sorted_again(self):
+        self.assertFalse(self.dataset.is_sorted(["date"]))
+        self.dataset.sort_date()
+        # rows with the same date stay in their order, and missing dates are last
+        self.assertEqual(list(self.dataset.get_df()["id"]), [2, 4, 0, 5, 3, 1])
+        self.assertTrue(self.dataset.is_sorted(["date"]))
+        self.assertEqual(self.dataset.get_range("date"), (pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-01")))
+
+        copy = self.dataset.deep_copy()
+        self.assertTrue(copy.is_sorted(["date"]))
+        copy.sort_date()
+        self.assertFalse(copy.is_copied())
+        copy.set_df(copy.get_df().iloc[::-1])
+        self.assertFalse(copy.is_sorted(["date"]))
+
+    def test_date_ranges_of_sorted_datasets_are_sliced(self):
+        date_ranges = [(date(2024, 1, 1), date(2024, 2, 1)), (date(2024, 1, 2), date(2024, 3, 1))]
+        self.dataset.sort_date()
+        # a new DataSet isn't known to be sorted, so its rows are compared with every range
+        sliced, filtered = self.dataset.deep_copy(), DataSet("test", self.dataset.get_df().copy(), self.dataset.cols)
+        for copy in [sliced, filtered]:
+            copy.filter_dates(*date_ranges)
+        self.assertTrue(sliced.is_sorted(["date"]))
+        self.assertFalse(filtered.is_sorted(["date"]))
+        pd.testing.assert_frame_equal(sliced.get_df(), filtered.get_df())
+        self.assertEqual(list(sliced.get_df()["id"]), [0, 5])
+
+        tagged, untagged = self.dataset.deep_copy(), DataSet("test", self.dataset.get_df().copy(), self.dataset.cols)
+        for copy in [tagged, untagged]:
+            copy.tag_date_ranges("term", ("January", date(2024, 1, 1), date(2024, 2, 1)), ("All", date(2024, 1, 1), date(2025, 1, 1)))
+        pd.testing.assert_frame_equal(tagged.get_df(), untagged.get_df())
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+import unittest
+import pandas as pd
+from benchmarks.synthetic import BENCHMARK_FILES_CONFIG, generate_files, load_datasets, open_files_config
+from src.config.report_selection import get_delta
+from src.reports.delta import ADDED, CHANGED, REMOVED, compare_results, read_archive
+from src.reports.followup import Followup
+from src.reports.report import Report
+from src.utils.type_utils import FilterType
+
+
+class TestCompareResults(unittest.TestCase):
+    def test_rows_are_matched_by_key(self):
+        previous = pd.DataFrame({"Email": ["a", "b", "c", "c"], "Staff": ["x", "y", "z", "z"]})
+        current = pd.DataFrame({"Email": ["c", "b", "d", "c", "c"], "Staff": ["z", "w", "x", "z", "z"]})
+        positions = compare_results(previous, current, ["Email"])
+        self.assertEqual(list(positions[ADDED]), [2, 4])
+        self.assertEqual(list(positions[REMOVED]), [0])
+        self.assertEqual(list(positions[CHANGED]), [1])
+
+    def test_new_columns_are_changes(self):
+        previous = pd.DataFrame({"Email": ["a"]})
+        current = pd.DataFrame({"Email": ["a"], "Staff": ["x"]})
+        self.assertEqual(list(compare_results(previous, current, ["Email"])[CHANGED]), [0])
+
+    def test_delta_config(self):
+        self.assertEqual(get_delta({}), (False, None))
+        self.assertEqual(get_delta({"delta": True}), (True, None))
+        self.assertEqual(get_delta({"delta": {"key": "Email"}}), (True, ["Email"]))
+        with self.assertRaises(ValueError):
+            get_delta({"delta": {"key": []}})
+
+
+class TestSaveDelta(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        files = open_files_config(BENCHMARK_FILES_CONFIG)
+        cls.datasets = load_datasets(files, generate_files(files, 2000))
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.results_dir = os.path.join(self.dir.name, "results")
+        self.archive_dir = os.path.join(self.dir.name, "archive")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def run_report(self, timestamp: str, change=None) -> dict:
+        followup = Followup(self.datasets["appointments"].deep_copy(), FilterType(None, None), None,
+                            FilterType("Walk-In", "Headshot"), FilterType(None, None))
+        report = Report("followup_", self.results_dir, followup, archive_dir=self.archive_dir, delta=True,
+                        rename_cols={"Student Email": "Email"}, final_cols=["Email", "Staff Member Email Address"])
+        report.run_report()
+        if change:
+            report.results = change(report.results)
+        report.timestamp = timestamp
+        report.save_archive()
+        report.save_results()
+        with open(self.results_dir + "\\" + f"followup_delta_{timestamp}.json") as file:
+            return json.load(file)
+
+    def test_only_changes_are_saved(self):
+        first = self.run_report("20240101-000000")
+        self.assertEqual((first["previous"], first[ADDED], first[REMOVED]), (None, first["rows"], 0))
+        self.assertEqual(first["key"], ["Student Email"])
+
+        unchanged = self.run_report("20240102-000000")
+        self.assertEqual((unchanged["previous"], unchanged[ADDED], unchanged[REMOVED], unchanged[CHANGED]), ("20240101-000000", 0, 0, 0))
+        self.assertEqual(unchanged["files"], {})
+
+        def change(results: pd.DataFrame) -> pd.DataFrame:
+            results = results.iloc[3:].copy()
+            results.iloc[0, results.columns.get_loc("Staff Member Email Address")] = "new@oakland.edu"
+            return results
+        changed = self.run_report("20240103-000000", change)
+        self.assertEqual((changed["previous"], changed[ADDED], changed[REMOVED], changed[CHANGED]), ("20240102-000000", 0, 3, 1))
+        removed = read_archive(changed["files"][REMOVED])
+        self.assertEqual(list(removed.columns), ["Unnamed: 0", "Email", "Staff Member Email Address"])
+        self.assertEqual(len(removed), 3)
+        self.assertEqual(list(read_archive(changed["files"][CHANGED])["Staff Member Email Address"]), ["new@oakland.edu"])
+
+    def test_delta_requires_an_archive(self):
+        with self.assertRaises(ValueError):
+            Report("followup_", self.results_dir, None, delta=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
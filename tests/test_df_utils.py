@@ -0,0 +1,29 @@
+import unittest
+import pandas as pd
+from src.utils.df_utils import filter_by_time_diff, filter_time_diff_window, merge_by_time_diff
+
+
+class TestTimeDiffWindows(unittest.TestCase):
+    def setUp(self) -> None:
+        self.surveys = pd.DataFrame({
+            "email": ["c", "a", "b", "a"],
+            "survey_date": ["2024-01-02", "2024-01-03", "2024-01-05", "2024-01-20"],
+        })
+        self.appointments = pd.DataFrame({
+            "email": ["b", "a", "c", "b"],
+            "appointment_date": ["2023-12-01", "2024-01-01", "2024-01-01", "2024-01-04"],
+            "appointment_id": [1, 2, 3, 4],
+        })
+
+    def test_windows_match_tolerance_merges(self):
+        merged = merge_by_time_diff(self.surveys.copy(), "survey_date", self.appointments.copy(), "appointment_date", None, "email")
+        for days in [0, 1, 3, 30]:
+            expected = filter_by_time_diff(self.surveys.copy(), "survey_date", self.appointments.copy(), "appointment_date", days, "email")
+            window = filter_time_diff_window(merged, days, ["appointment_date", "appointment_id"])
+            pd.testing.assert_frame_equal(window, expected)
+
+    def test_unmatched_rows_upcast_right_columns(self):
+        merged = merge_by_time_diff(self.surveys.copy(), "survey_date", self.appointments.copy(), "appointment_date", None, "email")
+        self.assertEqual(merged["appointment_id"].dtype, "int64")
+        window = filter_time_diff_window(merged, 3, ["appointment_date", "appointment_id"])
+        self.assertEqual(window["appointment_id"].dtype, "float64")
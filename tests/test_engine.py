@@ -0,0 +1,84 @@
+import importlib.util
+import unittest
+from unittest import mock
+import pandas as pd
+from benchmarks.benchmark import TARGET_DATE_RANGES
+from benchmarks.synthetic import BENCHMARK_FILES_CONFIG, generate_files, load_datasets, open_files_config
+from src.reports.followup import Followup
+from src.reports.referrals import Referrals
+from src.utils.engine_utils import PANDAS, POLARS, get_engine, merge, to_pandas, to_polars
+from src.utils.type_utils import FilterType
+
+HAS_POLARS = importlib.util.find_spec("polars") is not None and importlib.util.find_spec("pyarrow") is not None
+
+
+class TestGetEngine(unittest.TestCase):
+    def test_pandas_is_the_default(self):
+        self.assertEqual(get_engine(None), PANDAS)
+        self.assertEqual(get_engine({"workers": 2}), PANDAS)
+
+    def test_invalid_engine(self):
+        with self.assertRaises(ValueError):
+            get_engine({"engine": "spark"})
+
+    def test_invalid_engine_for_a_report(self):
+        files = open_files_config(BENCHMARK_FILES_CONFIG)
+        datasets = load_datasets(files, generate_files(files, 100))
+        with self.assertRaises(ValueError):
+            Followup(datasets["appointments"], FilterType(None, None), None, FilterType("Walk-In", None), FilterType(None, None), engine="spark")
+
+    def test_old_polars_is_rejected(self):
+        versions = {"polars": "1.10.0", "pyarrow": "15.0.0"}
+        with mock.patch("importlib.util.find_spec", return_value=object()), \
+                mock.patch("importlib.metadata.version", side_effect=versions.get):
+            with self.assertRaisesRegex(ValueError, "polars 1.24 or newer"):
+                get_engine({"engine": POLARS})
+            versions["polars"] = "1.24.0rc1"
+            self.assertEqual(get_engine({"engine": POLARS}), POLARS)
+
+
+@unittest.skipUnless(HAS_POLARS, "polars and pyarrow are not installed")
+class TestPolarsEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        files = open_files_config(BENCHMARK_FILES_CONFIG)
+        cls.datasets = load_datasets(files, generate_files(files, 5000))
+
+    def assert_same_results(self, make_report) -> None:
+        # the saved results are the same, though missing strings are None instead of NaN
+        reports = {engine: make_report(engine) for engine in [PANDAS, POLARS]}
+        for report in reports.values():
+            report.run_report()
+        pandas_results, polars_results = reports[PANDAS].get_results(), reports[POLARS].get_results()
+        self.assertGreater(len(pandas_results), 0)
+        self.assertEqual(list(pandas_results.dtypes), list(polars_results.dtypes))
+        self.assertEqual(pandas_results.to_csv(), polars_results.to_csv())
+
+    def test_followup(self):
+        self.assert_same_results(lambda engine: Followup(
+            self.datasets["appointments"].deep_copy(), FilterType(None, None), TARGET_DATE_RANGES,
+            FilterType("Walk-In", "Headshot"), FilterType(None, None), engine=engine
+        ))
+
+    def test_followup_by_term(self):
+        self.assert_same_results(lambda engine: Followup(
+            self.datasets["appointments"].deep_copy(), FilterType(None, None), "September 2023 - December 2023, December 2023 - August 2024",
+            FilterType("Walk-In", "Headshot"), FilterType(None, None), True, engine=engine
+        ))
+
+    def test_referrals(self):
+        self.assert_same_results(lambda engine: Referrals(
+            self.datasets["referrals"].deep_copy(), self.datasets["appointments"].deep_copy(), FilterType(None, None),
+            FilterType(None, None), self.datasets["enrollment"].deep_copy(), "Card ID", engine=engine
+        ))
+
+    def test_merge_is_like_pandas(self):
+        left = pd.DataFrame({"key": ["b", "a", None, "c", "a"], "x": [1, 2, 3, 4, 5], "both": [1, 1, 1, 1, 1]})
+        right = pd.DataFrame({"key": ["a", "d", None, "b", "a"], "y": [10, 20, 30, 40, 50], "both": [2, 2, 2, 2, 2]})
+        for how in ["inner", "left", "outer"]:
+            expected = pd.merge(left, right, on="key", how=how, suffixes=("", "_"))
+            pd.testing.assert_frame_equal(to_pandas(merge(to_polars(left), to_polars(right), "key", how, ("", "_"))), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import tracemalloc
+import unittest
+import numpy as np
+import pandas as pd
+from src.dataset.dataset import DataSet
+from src.dataset.timeline import Timeline
+from src.reports.executor import ReportExecutor
+from src.reports.report import Report
+
+
+class CopyReport(Report):
+    def __init__(self, dataset: DataSet) -> None:
+        self.dataset = dataset
+        self.results = pd.DataFrame()
+
+    def run_report(self) -> None:
+        # the report's copy is made when it is first used
+        self.results = self.dataset.get_df().head(10).copy()
+
+    def get_results(self) -> pd.DataFrame:
+        return self.results
+
+    def get_datasets(self) -> list[DataSet]:
+        return [self.dataset]
+
+
+class TestReportLifecycle(unittest.TestCase):
+    def setUp(self) -> None:
+        self.results_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.results_dir.cleanup()
+
+    def _report(self, source: DataSet, file_prefix: str) -> Report:
+        return Report(file_prefix, os.path.join(self.results_dir.name, "results"), CopyReport(source.deep_copy()))
+
+    def _run(self, release_sources: bool) -> tuple[list[DataSet], list[Report], int, int]:
+        tracemalloc.start()
+        try:
+            sources = [DataSet(f"file {index}", pd.DataFrame({"value": np.arange(200_000, dtype=np.float64)}), {"value": "value"}) for index in range(4)]
+            reports = [self._report(source, f"report{index}_") for index, source in enumerate(sources)]
+            # the second file is used by two reports
+            reports.insert(2, self._report(sources[1], "shared_"))
+            for report in reports:
+                report.report.set_timeline(Timeline.build(sources))
+            tracemalloc.reset_peak()
+            ReportExecutor(reports, release_sources=release_sources).run()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return sources, reports, current, peak
+
+    def test_reports_are_released_once_saved(self):
+        sources, reports, _, peak = self._run(release_sources=False)
+        for report in reports:
+            self.assertIsNone(report._results)
+            self.assertIsNone(report.report._timeline)
+            self.assertTrue(report.report.dataset.is_released())
+            with self.assertRaises(ValueError):
+                report.report.dataset.get_df()
+        # loaded files are kept unless they're released
+        self.assertFalse(any(source.is_released() for source in sources))
+        self.assertEqual(list(sources[1].get_df()["value"].head(2)), [0, 1])
+        # the run holds the files and one report's copy, instead of every report's copy
+        frame_size = sources[0].get_df().memory_usage().sum()
+        self.assertLess(peak, len(sources) * frame_size + 2 * frame_size)
+
+    def test_peak_memory_is_logged_for_every_report(self):
+        source = DataSet("file", pd.DataFrame({"value": np.arange(1000.0)}), {"value": "value"})
+        with self.assertLogs(level='INFO') as logs:
+            self._report(source, "report_").run_report()
+        self.assertTrue(any("Peak memory of CopyReport report_ report" in message for message in logs.output))
+
+    def test_sources_are_released_after_their_last_report(self):
+        sources, _, released, _ = self._run(release_sources=True)
+        self.assertTrue(all(source.is_released() for source in sources))
+        kept_sources, _, kept, _ = self._run(release_sources=False)
+        frame_size = kept_sources[0].get_df().memory_usage().sum()
+        self.assertLess(released, kept - len(sources) * frame_size / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
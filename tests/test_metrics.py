@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src.dataset.dataset import DataSet
+from src.dataset.stage import Stage
+from src.utils.metrics_utils import get_peak_rss, measure, measure_step, reset_peak_rss, save_metrics, start_metrics, stop_metrics, take_metrics
+
+
+class DeduplicatedDataSet(DataSet):
+    def drop_duplicates(self, column: str) -> None:
+        self.df = self.df.drop_duplicates(column)
+
+
+class StepReport():
+    def __init__(self) -> None:
+        self._results = pd.DataFrame({"id": range(10)})
+
+    def get_class_name(self) -> str:
+        return "StepReport"
+
+    @measure_step
+    def keep_even(self) -> None:
+        self._results = self._results[self._results["id"] % 2 == 0]
+
+
+class TestMetrics(unittest.TestCase):
+    def tearDown(self) -> None:
+        stop_metrics()
+
+    def test_nothing_is_recorded_when_stopped(self):
+        with measure("stage", "test") as metric:
+            pass
+        self.assertIsNone(metric)
+        self.assertEqual(take_metrics(), [])
+
+    def test_stage_rows_and_time_are_recorded(self):
+        start_metrics(memory=False)
+        dataset = DeduplicatedDataSet("test", pd.DataFrame({"id": [1, 2, 2, 3]}), {"id": "id"})
+        Stage("drop_duplicates", "id").apply(dataset)
+        metrics = take_metrics()
+        self.assertEqual(len(metrics), 1)
+        self.assertEqual(metrics[0].name, "test.drop_duplicates")
+        self.assertEqual((metrics[0].rows_in, metrics[0].rows_out), (4, 3))
+        self.assertGreaterEqual(metrics[0].wall, 0)
+
+    def test_report_steps_are_recorded(self):
+        start_metrics(memory=False)
+        StepReport().keep_even()
+        metric = take_metrics()[0]
+        self.assertEqual(metric.name, "StepReport.keep_even")
+        self.assertEqual((metric.rows_in, metric.rows_out), (10, 5))
+
+    def test_enclosing_stage_keeps_the_nested_peak(self):
+        start_metrics()
+        with measure("outer", "test"):
+            with measure("inner", "test"):
+                data = bytearray(1_000_000)
+            del data
+        inner, outer = take_metrics()
+        self.assertGreaterEqual(inner.peak_memory, 1_000_000)
+        self.assertGreaterEqual(outer.peak_memory, inner.peak_memory)
+
+    def test_peak_rss_is_read_without_tracing(self):
+        reset_peak_rss()
+        before = get_peak_rss()
+        self.assertGreater(before, 0)
+        values = np.ones(32 * 1024 ** 2 // 8)
+        values[:] = 2
+        self.assertGreaterEqual(get_peak_rss(), before + 16 * 1024 ** 2)
+        del values
+
+    def test_saved_metrics_and_trace(self):
+        start_metrics(memory=False)
+        with measure("stage", "test"):
+            pass
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            path = save_metrics(stop_metrics(), metrics_dir, "run", trace=True)
+            with open(path) as file:
+                saved = json.load(file)
+            with open(os.path.join(metrics_dir, "trace_run.json")) as file:
+                trace = json.load(file)
+        self.assertEqual(saved["metrics"][0]["name"], "stage")
+        self.assertEqual(trace["traceEvents"][0]["ph"], "X")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.reports.output import OutputSink, OutputWriter
+
+
+class TestOutputWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame({"id": [1, 2], "name": ["a", "b"]})
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dir.name, name)
+
+    def test_writes_the_same_bytes_as_to_csv(self):
+        self.df.to_csv(self._path("expected.csv"), index=False)
+        with OutputWriter() as writer:
+            writer.write_csv(self.df, self._path("written.csv"), index=False)
+        with open(self._path("expected.csv"), 'rb') as expected, open(self._path("written.csv"), 'rb') as written:
+            self.assertEqual(expected.read(), written.read())
+
+    def test_identical_outputs_are_linked(self):
+        with OutputWriter() as writer:
+            writer.write_csv(self.df, self._path("first.csv"))
+            writer.write_csv(self.df.copy(), self._path("second.csv"))
+            writer.write_csv(self.df, self._path("no_index.csv"), index=False)
+        self.assertTrue(os.path.samefile(self._path("first.csv"), self._path("second.csv")))
+        self.assertFalse(os.path.samefile(self._path("first.csv"), self._path("no_index.csv")))
+
+    def test_write_errors_are_raised(self):
+        with self.assertRaises(OSError):
+            with OutputWriter() as writer:
+                writer.write_csv(self.df, self._path(os.path.join("missing", "results.csv")))
+
+
+class TestOutputSink(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"]}, index=[4, 5, 6])
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dir.name, name)
+
+    def test_from_config(self):
+        self.assertEqual(OutputSink.from_config(None).get_extension(), ".csv")
+        self.assertFalse(OutputSink.from_config(None, index=False).index)
+        sink = OutputSink.from_config({"format": "csv", "compression": "gzip", "index": False})
+        self.assertEqual(sink.get_extension(), ".csv.gz")
+        self.assertFalse(sink.index)
+        with self.assertRaises(ValueError):
+            OutputSink.from_config("xlsx")
+        with self.assertRaises(ValueError):
+            OutputSink.from_config({"format": "csv", "chunksize": 0})
+
+    def test_compressed_csv(self):
+        sink = OutputSink.from_config({"compression": "gzip"})
+        with OutputWriter() as writer:
+            writer.write(self.df, self._path("results" + sink.get_extension()), sink)
+        pd.testing.assert_frame_equal(pd.read_csv(self._path("results.csv.gz"), index_col=0), self.df)
+
+    def test_chunked_csv_matches_csv(self):
+        sink = OutputSink.from_config({"chunksize": 2})
+        with OutputWriter() as writer:
+            writer.write(self.df, self._path("chunked.csv"), sink)
+        with open(self._path("chunked.csv"), 'rb') as file:
+            self.assertEqual(file.read(), OutputSink().serialize(self.df))
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_columnar_formats(self):
+        for format in ["parquet", "feather"]:
+            sink = OutputSink(format, index=False)
+            path = self._path("results" + sink.get_extension())
+            sink.write(self.df, path)
+            results = pd.read_parquet(path) if format == "parquet" else pd.read_feather(path)
+            pd.testing.assert_frame_equal(results, self.df.reset_index(drop=True))
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+import pandas as pd
+from benchmarks.synthetic import BENCHMARK_FILES_CONFIG, generate_files, load_datasets, open_files_config
+from src.config.report_selection import get_partition_by
+from src.dataset.appointment import AppointmentDataSet
+from src.reports.followup import Followup
+from src.reports.report import Report
+from src.reports.survey_results import SurveyResults
+from src.utils.general_utils import get_labeled_date_ranges
+from src.utils.type_utils import ColumnProjection, FilterType
+
+TERMS = ["September 2023 - December 2023", "January 2024 - April 2024", "December 2023 - August 2024"]
+
+
+class TestTagDateRanges(unittest.TestCase):
+    def test_labeled_date_ranges(self):
+        self.assertEqual(get_labeled_date_ranges("September 2023 - December 2023, January 2024 - April 2024,"), [
+            ("September 2023 - December 2023", date(2023, 9, 1), date(2024, 1, 1)),
+            ("January 2024 - April 2024", date(2024, 1, 1), date(2024, 5, 1))
+        ])
+
+    def test_rows_are_tagged_with_every_range_they_are_in(self):
+        df = pd.DataFrame({"Date": ["2023-10-01", "2023-12-15", "2024-02-01", "2025-01-01"], "Email": ["a", "b", "c", "d"]})
+        dataset = AppointmentDataSet("appointments", df, {"date": "Date", "stu_email": "Email"})
+        dataset.tag_date_ranges("Term", *get_labeled_date_ranges(", ".join(TERMS)))
+        self.assertEqual(list(dataset.get_df()["Email"]), ["a", "b", "b", "c", "c"])
+        self.assertEqual(list(dataset.get_df()["Term"]), [TERMS[0], TERMS[0], TERMS[2], TERMS[1], TERMS[2]])
+        self.assertTrue(dataset.get_df().index.is_unique)
+
+
+class TestPartitionTerms(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        files = open_files_config(BENCHMARK_FILES_CONFIG)
+        cls.datasets = load_datasets(files, generate_files(files, 5000))
+
+    def followup(self, target_date_ranges: str, partition_terms: bool = False) -> Followup:
+        return Followup(self.datasets["appointments"].deep_copy(), FilterType(None, None), target_date_ranges,
+                        FilterType("Walk-In", "Headshot"), FilterType(None, None), partition_terms)
+
+    def survey_results(self, target_date_ranges: str, partition_terms: bool = False) -> SurveyResults:
+        return SurveyResults(self.datasets["appointments"].deep_copy(), [self.datasets["appointment_survey"].deep_copy(), self.datasets["walk_in_survey"].deep_copy()],
+                             [3, 7], target_date_ranges, FilterType(None, None), partition_terms)
+
+    def assert_same_as_each_term(self, make_report, get_results) -> None:
+        # the results of a partitioned run are the results each term would have on its own
+        partitioned = make_report(", ".join(TERMS), True)
+        partitioned.run_report()
+        results = get_results(partitioned)
+        for term in TERMS:
+            report = make_report(term)
+            report.run_report()
+            term_results = results[results[Report.term_col] == term].drop(columns=Report.term_col).reset_index(drop=True)
+            pd.testing.assert_frame_equal(term_results, get_results(report).reset_index(drop=True))
+
+    def test_followup(self):
+        self.assert_same_as_each_term(self.followup, lambda report: report.get_results())
+
+    def test_survey_results(self):
+        self.assert_same_as_each_term(self.survey_results, lambda report: report.get_survey_results("walk_in_survey", 3))
+
+    def test_partition_terms_requires_date_ranges(self):
+        with self.assertRaises(ValueError):
+            self.followup(None, True)
+
+    def test_results_are_saved_by_term(self):
+        report = Report("followup_", "results", self.followup(", ".join(TERMS), True), partition_cols=[Report.term_col], final_cols=["Student Email"])
+        report.run_report()
+        report.timestamp = "20240101-000000"
+        partitions = report.get_partitions(report.get_final_results())
+        self.assertEqual(sorted(partition for partition, _ in partitions), sorted(Report.get_partition_name((term,)) for term in TERMS))
+        self.assertEqual(sum(len(results) for _, results in partitions), len(report.results))
+        self.assertEqual(report.get_filename(".csv", partitions[0][0]), f"followup_{partitions[0][0]}_20240101-000000.csv")
+        self.assertIn("September_2023_December_2023", [partition for partition, _ in partitions])
+
+    def test_term_files_are_the_same_as_a_run_of_each_term(self):
+        # a term's file has the rows and row labels of a report of that term only, and no term column
+        report = Report("followup_", "results", self.followup(", ".join(TERMS), True), partition_cols=[Report.term_col])
+        report.run_report()
+        partitions = dict(report.get_partitions(report.get_final_results()))
+        with tempfile.TemporaryDirectory() as directory:
+            for term in TERMS:
+                term_report = Report("followup_", "results", self.followup(term))
+                term_report.run_report()
+                partitioned_path, term_path = os.path.join(directory, "partitioned.csv"), os.path.join(directory, "term.csv")
+                report.results_sink.write(partitions[Report.get_partition_name((term,))], partitioned_path)
+                term_report.results_sink.write(term_report.get_final_results(), term_path)
+                with open(partitioned_path, 'rb') as partitioned_file, open(term_path, 'rb') as term_file:
+                    self.assertEqual(partitioned_file.read(), term_file.read())
+
+
+class TestPartitionBy(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        files = open_files_config(BENCHMARK_FILES_CONFIG)
+        cls.datasets = load_datasets(files, generate_files(files, 5000))
+
+    def followup(self, **kwargs) -> Report:
+        followup = Followup(self.datasets["appointments"].deep_copy(), FilterType(None, None), ", ".join(TERMS),
+                            FilterType("Walk-In", "Headshot"), FilterType(None, None), True)
+        return Report("followup_", "results", followup, **kwargs)
+
+    def test_results_are_split_by_renamed_columns(self):
+        # College is only in the saved results under its new name, and final_cols doesn't keep it
+        report = self.followup(partition_cols=[Report.term_col, "College"], rename_cols={"Student College": "College"}, final_cols=["Student Email"])
+        report.run_report()
+        partitions = report.get_partitions(report.get_final_results())
+        groups = report.results.groupby([Report.term_col, "Student College"]).size()
+        self.assertEqual(len(partitions), len(groups))
+        self.assertEqual(sum(len(results) for _, results in partitions), len(report.results))
+        self.assertTrue(all(list(results.columns) == ["Student Email"] for _, results in partitions))
+        self.assertEqual(len({name for name, _ in partitions}), len(partitions))
+
+    def test_unknown_column(self):
+        report = self.followup(partition_cols=["Department"])
+        report.run_report()
+        with self.assertRaises(ValueError):
+            report.get_partitions(report.results)
+
+    def test_partition_names_are_unique(self):
+        report = self.followup(partition_cols=["Student College"])
+        report.results = pd.DataFrame({"Student College": ["Arts & Science", "Arts Science", None, "arts-science"], "n": [1, 2, 3, 4]})
+        names = [name for name, _ in report.get_partitions(report.results)]
+        self.assertEqual(names, ["Arts_Science", "Arts_Science_2", "None", "arts_science_3"])
+
+    def test_partition_columns_are_loaded(self):
+        projection = ColumnProjection.from_report(["Email"], None, {"Student Email": "Email", "Student College": "College"}, ["College"])
+        self.assertEqual(projection.include, {"Student Email", "Student College"})
+        self.assertEqual(get_partition_by({"partition_by": "College"}), ["College"])
+        with self.assertRaises(ValueError):
+            get_partition_by({"partition_by": []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import pstats
+import tempfile
+import unittest
+from src.utils.profile_utils import CPROFILE, ProfileConfig, profile, start_profiling, stop_profiling
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        stop_profiling()
+        self.dir.cleanup()
+
+    def test_nothing_is_saved_when_stopped(self):
+        with profile("report"):
+            pass
+        self.assertEqual(stop_profiling(), [])
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_profile_and_allocations_are_saved(self):
+        start_profiling(ProfileConfig(self.dir.name, "run", CPROFILE))
+        with profile("Followup followup_"):
+            data = [bytearray(1000) for _ in range(100)]
+        paths = stop_profiling()
+        names = sorted(os.path.basename(path) for path in paths)
+        self.assertEqual(names, ["run_Followup_followup.prof", "run_Followup_followup_allocations.txt", "run_Followup_followup_functions.txt"])
+        pstats.Stats(os.path.join(self.dir.name, "run_Followup_followup.prof"))
+        with open(os.path.join(self.dir.name, "run_Followup_followup_allocations.txt")) as file:
+            self.assertIn("test_profile.py", file.read())
+        del data
+
+    def test_only_the_outermost_section_is_profiled(self):
+        start_profiling(ProfileConfig(self.dir.name, "run", CPROFILE))
+        with profile("load"):
+            with profile("inner"):
+                pass
+        self.assertTrue(all("load" in os.path.basename(path) for path in stop_profiling()))
+
+    def test_invalid_profiler(self):
+        with self.assertRaises(ValueError):
+            ProfileConfig(self.dir.name, "run", "perf")
+
+
+if __name__ == '__main__':
+    unittest.main()
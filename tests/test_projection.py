@@ -0,0 +1,39 @@
+import unittest
+from src.config.files_config import FilesConfig
+from src.utils.type_utils import ColumnProjection
+
+
+class TestColumnProjection(unittest.TestCase):
+    def test_from_report(self):
+        projection = ColumnProjection.from_report(["Name", "Major"], ["College"], {"First Name": "Name"})
+        self.assertEqual(projection.include, {"First Name", "Major"})
+        projection = ColumnProjection.from_report(None, ["College"], None)
+        self.assertFalse(projection.wants("College"))
+        self.assertTrue(projection.wants("Major"))
+        self.assertTrue(ColumnProjection.from_report(None, None, None).is_all())
+
+    def test_keep_and_suffixes(self):
+        projection = ColumnProjection(include=["Major_"]).with_suffixes(["_"]).keep(["Email"])
+        self.assertEqual(projection.select(["Email", "Major", "College"]), ["Email", "Major"])
+        projection = ColumnProjection(exclude=["Major", "College", "College_"]).with_suffixes(["_"])
+        self.assertEqual(projection.select(["Email", "Major", "College"]), ["Email", "Major"])
+
+    def test_union(self):
+        include = ColumnProjection(include=["Major"])
+        exclude = ColumnProjection(exclude=["Major", "College"])
+        self.assertEqual(include.union(ColumnProjection(include=["College"])).include, {"Major", "College"})
+        self.assertEqual(include.union(exclude).select(["Email", "Major", "College"]), ["Email", "Major"])
+        self.assertEqual(exclude.union(ColumnProjection(exclude=["College"])).select(["Major", "College"]), ["Major"])
+
+
+class TestFilesConfigUsecols(unittest.TestCase):
+    def test_usecols_keep_configured_and_shared_columns(self):
+        files_config = FilesConfig()
+        files_config.projections = {"surveys": ColumnProjection(include=["How was it"])}
+        file = {"id": "surveys", "column_names": {"stu_email": {"name": "Email", "map": "Email Address"}}}
+        headers = {
+            "surveys": {"Email Address": "Email", "Name": "Name", "1. How was it": "How was it", "2. Rate": "Rate"},
+            "appointments": {"Email": "Email", "Name": "Name", "Start": "Start"},
+        }
+        self.assertEqual(files_config.get_usecols(file, headers), ["Email Address", "Name", "1. How was it"])
+        self.assertIsNone(files_config.get_usecols({**file, "id": "appointments"}, headers))
@@ -0,0 +1,70 @@
+import subprocess
+import sys
+import unittest
+from src.config.report_selection import FILE_TYPES, REPORT_TYPE_NAMES, get_report_name, get_used_files, select_reports, validate_configs
+
+FILES = [
+    {"id": "appointments", "type": "appointments", "dir": "tests", "must_contain": "appointments", "column_names": {"date": {"name": "Date"}}},
+    {"id": "survey_1", "type": "survey_results", "dir": "tests", "must_contain": "survey_1", "column_names": {"date": {"name": "Date"}}},
+    {"id": "survey_2", "type": "survey_results", "dir": "tests", "must_contain": "survey_2", "column_names": {"date": {"name": "Date"}}},
+    {"id": "referrals", "type": "referral", "dir": "tests", "must_contain": "referrals", "column_names": {"date": {"name": "Date"}}},
+]
+REPORTS = [
+    {"name": "walk_ins", "type": "followup", "file_prefix": "followup_", "results_dir": "results", "require_followup": None},
+    {"type": "survey_results", "file_prefix": "survey_", "results_dir": "results", "survey_id": "survey_2", "day_range": 7},
+    {"type": "survey_results", "file_prefix": {"survey_1": "first_"}, "results_dir": "results", "survey_id": ["survey_1"], "day_range": 7},
+]
+
+
+class TestReportSelection(unittest.TestCase):
+    def test_report_names(self):
+        self.assertEqual([get_report_name(report, index) for index, report in select_reports(REPORTS)], ["walk_ins", "survey_", "survey_results_3"])
+
+    def test_selected_reports_keep_their_index(self):
+        self.assertEqual([index for index, _ in select_reports(REPORTS, ["survey_results_3", "walk_ins"])], [1, 3])
+
+    def test_unknown_report_name(self):
+        with self.assertRaises(ValueError):
+            select_reports(REPORTS, ["missing"])
+
+    def test_only_used_files_are_loaded(self):
+        self.assertEqual([file["id"] for file in get_used_files([REPORTS[1]], FILES)], ["appointments", "survey_2"])
+        self.assertEqual([file["id"] for file in get_used_files([REPORTS[0]], FILES)], ["appointments"])
+
+    def test_type_names_match_the_datasets_and_reports(self):
+        from src.config.files_config import FilesConfig
+        from src.config.reports_config import REPORT_TYPES
+        for file_type in FILE_TYPES:
+            self.assertIsNotNone(FilesConfig.get_dataset_class(file_type), file_type)
+        self.assertEqual(sorted(REPORT_TYPE_NAMES), sorted(REPORT_TYPES))
+
+
+class TestValidateConfigs(unittest.TestCase):
+    def test_valid_configs(self):
+        self.assertEqual(validate_configs({"reports": REPORTS}, {"files": FILES}), [])
+
+    def test_invalid_configs(self):
+        reports = REPORTS + [
+            {"type": "survey_results", "file_prefix": "missing_", "results_dir": "results", "survey_id": "survey_3", "day_range": 7},
+            {"type": "referrals", "file_prefix": "referrals_", "results_dir": "results"},
+            {"type": "followup", "file_prefix": "followup_2_", "results_dir": "results"},
+            {"type": "unknown", "file_prefix": "unknown_", "results_dir": "results"},
+        ]
+        files = FILES + [{"id": "survey_1", "type": "survey", "dir": "missing_dir", "must_contain": "survey", "column_names": {}}]
+        errors = validate_configs({"reports": reports}, {"files": files})
+        self.assertEqual(len(errors), 7)
+
+    def test_missing_configs(self):
+        self.assertEqual(len(validate_configs(None, None)), 2)
+
+
+class TestCommandLine(unittest.TestCase):
+    def test_cli_does_not_import_pandas(self):
+        # --help, --list and --validate only read the configs, so they shouldn't wait for pandas to import
+        code = "import sys, main; print('pandas' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+
+if __name__ == '__main__':
+    unittest.main()
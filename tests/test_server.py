@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.parse
+import urllib.request
+from benchmarks.benchmark import TARGET_DATE_RANGES
+from benchmarks.synthetic import BENCHMARK_FILES_CONFIG, COLLEGES, generate_files, load_datasets, open_files_config
+from src.config.reports_config import ReportsConfig
+from src.server import ReportServer
+
+REPORTS = [
+    {"name": "walk_ins", "type": "followup", "file_prefix": "followup_", "results_dir": "results", "archive_dir": "archive",
+     "target_date_ranges": TARGET_DATE_RANGES, "require_followup": {"include": "Walk-In", "exclude": "Headshot"}},
+    {"type": "survey_results", "file_prefix": "survey_", "results_dir": "results", "archive_dir": "archive",
+     "survey_id": "appointment_survey", "day_range": 7, "target_date_ranges": TARGET_DATE_RANGES}
+]
+
+
+class TestReportServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.dir = tempfile.TemporaryDirectory()
+        config_file = os.path.join(cls.dir.name, "reports.config.json")
+        with open(config_file, 'w') as file:
+            json.dump({"reports": REPORTS}, file)
+        files = open_files_config(BENCHMARK_FILES_CONFIG)
+        reports_config = ReportsConfig(config_file, BENCHMARK_FILES_CONFIG)
+        # the files are made in memory instead of loaded, so the server is tested without any exports
+        reports_config.get_files_config().files = list(load_datasets(files, generate_files(files, 2000)).values())
+        reports_config.load_files()
+        cls.server = ReportServer(reports_config, port=0)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.thread.join()
+        cls.dir.cleanup()
+
+    def get(self, path: str) -> tuple[int, str, bytes]:
+        host, port = self.server.address
+        try:
+            with urllib.request.urlopen(f"http://{host}:{port}{path}") as response:
+                return response.status, response.headers["X-Cache"], response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers["X-Cache"], e.read()
+
+    def test_index_lists_the_report_types(self):
+        status, _, body = self.get("/")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["followup"]["reports"], ["walk_ins"])
+        self.assertNotIn("referrals", json.loads(body))
+
+    def test_responses_are_cached_by_their_parameters(self):
+        status, cache, csv = self.get("/followup?valid_schools=School%20of%20Nursing")
+        self.assertEqual((status, cache), (200, "miss"))
+        self.assertEqual(self.get("/followup?valid_schools=School%20of%20Nursing")[1:], ("hit", csv))
+        self.assertEqual(self.get("/followup?valid_schools=School%20of%20Nursing&format=json")[1], "miss")
+
+    def test_filters_apply_to_the_results(self):
+        _, _, body = self.get(f"/followup?valid_schools={urllib.parse.quote(COLLEGES[0])}&format=json")
+        rows = json.loads(body)
+        self.assertGreater(len(rows), 0)
+        self.assertTrue(all(row["Student College"] == COLLEGES[0] for row in rows))
+        _, _, body = self.get(f"/followup?valid_schools.exclude={urllib.parse.quote(COLLEGES[0])}&format=json")
+        self.assertTrue(all(row["Student College"] != COLLEGES[0] for row in json.loads(body)))
+
+    def test_value_parameters(self):
+        status, _, body = self.get("/survey_results?day_range=3&format=json")
+        self.assertEqual(status, 200)
+        self.assertIsInstance(json.loads(body), list)
+        self.assertEqual(self.get("/survey_results?day_range=soon")[0], 400)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.get("/unknown")[0], 404)
+        self.assertEqual(self.get("/referrals")[0], 404)
+        self.assertEqual(self.get("/followup?report=missing")[0], 404)
+        self.assertEqual(self.get("/followup?school=Nursing")[0], 400)
+        self.assertEqual(self.get("/followup?format=xml")[0], 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import io
+import os
+import tempfile
+import unittest
+import pandas as pd
+from benchmarks.benchmark import TARGET_DATE_RANGES
+from benchmarks.synthetic import BENCHMARK_FILES_CONFIG, generate_files, open_files_config
+from src.config.files_config import FilesConfig
+from src.dataset.appointment import AppointmentDataSet
+from src.dataset.referral import ReferralDataSet
+from src.reports.executor import PartitionedReportExecutor
+from src.reports.followup import Followup
+from src.reports.referrals import Referrals
+from src.reports.report import Report
+from src.reports.survey_results import SurveyResults
+from src.utils.spill_utils import LinkedKeys, get_partition_count, read_partition, spill_frame
+from src.utils.type_utils import FilterType
+
+PARTITIONS = 4
+
+
+class TestSpill(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.dir = tempfile.TemporaryDirectory()
+        cls.files = {file["id"]: file for file in open_files_config(BENCHMARK_FILES_CONFIG)}
+        cls.exports = generate_files(list(cls.files.values()), 5000)
+        cls.whole, cls.spilled = cls.spill(cls.exports, "")
+
+    @classmethod
+    def spill(cls, exports: dict[str, pd.DataFrame], name: str) -> tuple[dict, dict]:
+        # the exports are read from CSV, so the column types are the ones a loaded file has
+        csvs = {file_id: export.to_csv(index=False) for file_id, export in exports.items()}
+        whole = {file_id: cls.dataset(file_id, pd.read_csv(io.StringIO(csv))) for file_id, csv in csvs.items()}
+        linked = LinkedKeys()
+        referrals = whole["referrals"]
+        linked.add(referrals.get_col(ReferralDataSet.Column.STUDENT_EMAIL), referrals.get_col(ReferralDataSet.Column.UNIQUE_REFERRAL))
+        spilled = {
+            file_id: spill_frame(cls.chunks(file_id, csvs[file_id]), whole[file_id].cols["stu_email"], PARTITIONS, cls.dir.name, name + file_id, linked.get_map())
+            for file_id in ["appointments", "referrals"]
+        }
+        return whole, spilled
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.dir.cleanup()
+
+    @classmethod
+    def dataset(cls, file_id: str, df: pd.DataFrame):
+        rename_cols, cols = FilesConfig.map_column_config(cls.files[file_id]["column_names"])
+        return FilesConfig.get_dataset_class(cls.files[file_id]["type"])(file_id, df.rename(columns=rename_cols), cols)
+
+    @classmethod
+    def chunks(cls, file_id: str, csv: str):
+        rename_cols, _ = FilesConfig.map_column_config(cls.files[file_id]["column_names"])
+        for chunk in pd.read_csv(io.StringIO(csv), chunksize=700):
+            yield chunk.rename(columns=rename_cols)
+
+    def partition(self, partition: int, whole: dict | None = None, spilled: dict | None = None) -> dict:
+        whole, spilled = whole or self.whole, spilled or self.spilled
+        _, appointment_cols = FilesConfig.map_column_config(self.files["appointments"]["column_names"])
+        _, referral_cols = FilesConfig.map_column_config(self.files["referrals"]["column_names"])
+        return {
+            **whole,
+            "appointments": type(whole["appointments"])("appointments", read_partition(spilled["appointments"], partition), appointment_cols),
+            "referrals": type(whole["referrals"])("referrals", read_partition(spilled["referrals"], partition), referral_cols)
+        }
+
+    def assert_same_results(self, make_report, whole: dict | None = None, spilled: dict | None = None) -> None:
+        # the combined results of every partition are saved the same way as the results of one run
+        report = make_report(whole or self.whole)
+        report.run_report()
+        results = []
+        for partition in range(PARTITIONS):
+            partition_report = make_report(self.partition(partition, whole, spilled))
+            partition_report.run_report()
+            results.append(partition_report.get_results())
+        combined = report.combine_partitions(results)
+        self.assertGreater(len(combined), 0)
+        self.assertEqual(list(report.get_results().dtypes), list(combined.dtypes))
+        self.assertEqual(report.get_results().to_csv(), combined.to_csv())
+
+    def test_partitions_have_every_row(self):
+        for file_id, spilled in self.spilled.items():
+            df = pd.concat([read_partition(spilled, partition) for partition in range(PARTITIONS)]).sort_index()
+            pd.testing.assert_frame_equal(df, self.whole[file_id].get_df())
+
+    def test_followup(self):
+        self.assert_same_results(lambda datasets: Followup(
+            datasets["appointments"].deep_copy(), FilterType(None, None), TARGET_DATE_RANGES,
+            FilterType("Walk-In", "Headshot"), FilterType(None, None)
+        ))
+
+    def test_survey_results(self):
+        self.assert_same_results(lambda datasets: SurveyResults(
+            datasets["appointments"].deep_copy(), datasets["walk_in_survey"].deep_copy(), 7, TARGET_DATE_RANGES, FilterType(None, None)
+        ))
+
+    @staticmethod
+    def referrals(datasets: dict) -> Referrals:
+        return Referrals(
+            datasets["referrals"].deep_copy(), datasets["appointments"].deep_copy(), FilterType(None, None),
+            FilterType(None, None), datasets["enrollment"].deep_copy(), "Card ID"
+        )
+
+    def test_referrals(self):
+        self.assert_same_results(TestSpill.referrals)
+
+    def test_referrals_with_ties(self):
+        # every referral is on the same date and every appointment was scheduled at the same time, so most rows tie on
+        # the sort columns, and rows that tie on all of them keep their order
+        exports = {file_id: export.copy() for file_id, export in self.exports.items()}
+        exports["referrals"]["Referral Date"] = "2024-01-01 00:00:00"
+        exports["referrals"]["Unique Referral"] = exports["referrals"]["Student Email"]
+        exports["appointments"]["Appointments Created At Date Time"] = "2024-01-01 00:00:00"
+        whole, spilled = self.spill(exports, "ties_")
+        referrals = TestSpill.referrals(whole)
+        referrals.run_report()
+        sort_order = referrals._get_sort_order()
+        self.assertTrue(referrals.get_results().duplicated(subset=sort_order, keep=False).any())
+        self.assert_same_results(TestSpill.referrals, whole, spilled)
+
+    def test_partitions_without_results_are_skipped(self):
+        def followup(datasets: dict) -> Followup:
+            return Followup(datasets["appointments"].deep_copy(), FilterType(None, None), TARGET_DATE_RANGES,
+                            FilterType("Walk-In", "Headshot"), FilterType(None, None))
+
+        def load_partition(partition: int, empty: set[int]) -> dict:
+            datasets = self.partition(partition)
+            if partition in empty:
+                # a partition whose students never had a walk-in has no appointments that need a followup
+                appointments = datasets["appointments"]
+                types = appointments.get_col(AppointmentDataSet.Column.APPOINTMENT_TYPE).fillna("")
+                datasets["appointments"] = type(appointments)("appointments", appointments.get_df()[~types.str.contains("Walk-In")], appointments.cols)
+            return datasets
+
+        with self.assertRaises(ValueError):
+            followup(load_partition(0, {0})).run_report()
+        expected = []
+        for partition in range(1, PARTITIONS):
+            report = followup(load_partition(partition, set()))
+            report.run_report()
+            expected.append(report.get_results())
+
+        with tempfile.TemporaryDirectory() as results_dir:
+            def run(empty: set[int]) -> PartitionedReportExecutor:
+                executor = PartitionedReportExecutor([Report("followup_", os.path.join(results_dir, "results"), followup(self.whole))], PARTITIONS, lambda partition: (
+                    [Report("followup_", os.path.join(results_dir, "results"), followup(load_partition(partition, empty)))], None
+                ))
+                executor.run()
+                return executor
+
+            # the partition without walk-ins has no results, and the other partitions' results are saved
+            executor = run({0})
+            self.assertEqual(executor.reports[0].results.to_csv(), followup(self.whole).combine_partitions(expected).to_csv())
+            # a report with no results in any partition is an error, like it is without partitions
+            with self.assertRaises(ValueError):
+                run(set(range(PARTITIONS)))
+
+    def test_partition_count(self):
+        self.assertEqual(get_partition_count(1 << 20, 0, 100), 1)
+        self.assertEqual(get_partition_count(100 << 20, 10 << 20, 100), 10)
+        with self.assertRaises(ValueError):
+            get_partition_count(1 << 20, 100 << 20, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
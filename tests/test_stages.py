@@ -0,0 +1,129 @@
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from src.dataset.appointment import AppointmentDataSet
+from src.dataset.checkpoint import StageCheckpoint
+from src.dataset.stage import Stage
+from src.reports.report import Report
+from src.reports.stages import StageGraph
+from src.utils.type_utils import FilterType
+
+
+class StageReport(Report):
+    def __init__(self, dataset: AppointmentDataSet, stages: list[Stage]) -> None:
+        self.dataset = dataset
+        self.stages = stages
+
+    def get_stages(self) -> list:
+        return [(self.dataset, self.stages)]
+
+    def run_report(self) -> None:
+        self._run_stages()
+        self.results = self.dataset.get_df()
+
+    def get_results(self) -> pd.DataFrame:
+        return self.results
+
+
+class TestStageGraph(unittest.TestCase):
+    def setUp(self) -> None:
+        self.appointments = AppointmentDataSet("appointments", pd.DataFrame({
+            "Start": ["2024-01-01", "2024-01-02", "2024-01-03"],
+            "Type": ["Walk-In", "Walk-In Headshot", "Career Advising"],
+            "Status": ["completed", "completed", "cancelled"],
+        }), {"date": "Start", "type": "Type", "status": "Status"})
+
+    def _report(self, *stages: Stage) -> Report:
+        return Report("test_", "results", StageReport(self.appointments.deep_copy(), list(stages)))
+
+    def test_shared_stages_are_computed_once(self):
+        walk_ins = Stage('filter_appointment_type', FilterType('Walk-In', None))
+        reports = [
+            self._report(walk_ins, Stage('filter_appointment_status')),
+            self._report(walk_ins),
+            self._report(Stage('filter_appointment_type', FilterType('Career', None))),
+        ]
+        self.assertEqual(StageGraph(reports).share(), 1)
+        self.assertIs(reports[0].report.dataset.get_origin(), reports[1].report.dataset.get_origin())
+        self.assertIs(reports[2].report.dataset.get_origin(), self.appointments)
+
+        for report in reports:
+            report.run_report()
+        self.assertEqual(list(reports[0].results["Type"]), ["Walk-In", "Walk-In Headshot"])
+        self.assertEqual(list(reports[1].results["Type"]), ["Walk-In", "Walk-In Headshot"])
+        self.assertEqual(list(reports[2].results["Type"]), ["Career Advising"])
+        self.assertEqual(len(self.appointments.get_df()), 3)
+
+    def test_stages_must_continue_applied_stages(self):
+        dataset = self.appointments.deep_copy()
+        dataset.apply_stages([Stage('filter_appointment_type', FilterType('Walk-In', None))])
+        with self.assertRaises(ValueError):
+            dataset.apply_stages([Stage('filter_appointment_type', FilterType('Career', None))])
+
+
+class TestStageCheckpoint(unittest.TestCase):
+    def setUp(self) -> None:
+        self.checkpoint_dir = tempfile.TemporaryDirectory()
+        self.checkpoint = StageCheckpoint(self.checkpoint_dir.name)
+
+    def tearDown(self) -> None:
+        self.checkpoint_dir.cleanup()
+
+    def _appointments(self) -> AppointmentDataSet:
+        # a new load of the same file, like the next run's
+        appointments = AppointmentDataSet("appointments", pd.DataFrame({
+            "Start": ["2024-01-03", "2024-01-01", "2024-01-02", "2024-01-04"],
+            "Type": ["Walk-In", "Walk-In Headshot", "Career Advising", np.nan],
+            "Status": ["completed", "completed", "cancelled", "completed"],
+        }), {"date": "Start", "type": "Type", "status": "Status"})
+        appointments.load_key = "file"
+        return appointments
+
+    def _run(self, *chains: list[Stage]) -> tuple[list[Report], int]:
+        # the results of reports with the stage chains, and the number of stages applied to make them
+        appointments = self._appointments()
+        reports = [Report("test_", "results", StageReport(appointments.deep_copy(), list(stages))) for stages in chains]
+        for report in reports:
+            report.report.set_checkpoint(self.checkpoint)
+        with mock.patch.object(Stage, 'apply', autospec=True, side_effect=Stage.apply) as apply:
+            StageGraph(reports, self.checkpoint).share()
+            for report in reports:
+                report.run_report()
+        return reports, apply.call_count
+
+    def test_stages_are_read_from_the_checkpoint(self):
+        walk_ins = Stage('filter_appointment_type', FilterType('Walk-In', None))
+        chains = [[Stage('sort_date'), walk_ins, Stage('filter_appointment_status')], [Stage('sort_date'), walk_ins]]
+        reports, applied = self._run(*chains)
+        self.assertEqual(applied, 3)
+        checkpointed, applied = self._run(*chains)
+        self.assertEqual(applied, 0)
+        for report, checkpointed_report in zip(reports, checkpointed):
+            pd.testing.assert_frame_equal(checkpointed_report.results, report.results)
+            self.assertEqual(checkpointed_report.report.dataset.get_sort_keys(), report.report.dataset.get_sort_keys())
+
+    def test_later_stages_continue_from_the_checkpoint(self):
+        walk_ins = Stage('filter_appointment_type', FilterType('Walk-In', None))
+        self._run([Stage('sort_date'), walk_ins, Stage('filter_appointment_status')], [Stage('sort_date'), walk_ins])
+        # only the changed last stage is applied, to the checkpoint of the stages before it
+        reports, applied = self._run([Stage('sort_date'), walk_ins, Stage('filter_appointment_type', FilterType(None, 'Headshot'))])
+        self.assertEqual(applied, 1)
+        self.assertEqual(list(reports[0].results["Type"]), ["Walk-In"])
+
+    def test_changed_files_are_not_read_from_the_checkpoint(self):
+        chain = [Stage('filter_appointment_type', FilterType('Walk-In', None))]
+        self._run(chain)
+        appointments = self._appointments()
+        appointments.load_key = "changed file"
+        with mock.patch.object(Stage, 'apply', autospec=True, side_effect=Stage.apply) as apply:
+            appointments.apply_stages(chain, self.checkpoint)
+        self.assertEqual(apply.call_count, 1)
+
+    def test_missing_values_are_read_back(self):
+        df = self._appointments().get_df()
+        self.checkpoint.store("key", df, {})
+        loaded, _ = self.checkpoint.load("key")
+        pd.testing.assert_frame_equal(loaded, df)
+        self.assertTrue(np.isnan(loaded["Type"].iloc[3]))
@@ -0,0 +1,151 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import BENCHMARK_FILES_CONFIG, generate_files, load_datasets, open_files_config
+from src.dataset.timeline import Timeline, get_timeline
+from src.reports.followup import Followup
+from src.reports.survey_results import SurveyResults
+from src.utils.general_utils import get_date_ranges
+from src.utils.type_utils import FilterType
+
+TERM = "September 2023 - April 2024"
+
+
+class TestTimeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        files = open_files_config(BENCHMARK_FILES_CONFIG)
+        cls.datasets = load_datasets(files, generate_files(files, 5000))
+        # rows without a student email aren't any student's events
+        appointments = cls.datasets["appointments"]
+        email_col = Timeline.get_email_col(appointments)
+        appointments.get_df().loc[appointments.get_df().index[::97], email_col] = np.nan
+        cls.timeline = Timeline.build(list(cls.datasets.values()))
+
+    def followup(self) -> Followup:
+        return Followup(self.datasets["appointments"].deep_copy(), FilterType(None, None), TERM,
+                        FilterType("Walk-In", "Headshot"), FilterType(None, None))
+
+    def survey_results(self) -> SurveyResults:
+        return SurveyResults(self.datasets["appointments"].deep_copy(), [self.datasets["appointment_survey"].deep_copy(), self.datasets["walk_in_survey"].deep_copy()],
+                             [3, 7], TERM, FilterType(None, None))
+
+    def assert_same_with_timeline(self, make_report, get_results) -> None:
+        report = make_report()
+        report.run_report()
+        with_timeline = make_report()
+        self.assertTrue(with_timeline.uses_timeline())
+        with_timeline.set_timeline(self.timeline)
+        with_timeline.run_report()
+        pd.testing.assert_frame_equal(get_results(with_timeline), get_results(report))
+
+    def test_followup(self):
+        self.assert_same_with_timeline(self.followup, lambda report: report.get_results())
+
+    def test_survey_results(self):
+        for survey_id in ["appointment_survey", "walk_in_survey"]:
+            self.assert_same_with_timeline(self.survey_results, lambda report: report.get_survey_results(survey_id, 7))
+
+    def test_single_survey_results(self):
+        def survey_results() -> SurveyResults:
+            return SurveyResults(self.datasets["appointments"].deep_copy(), self.datasets["walk_in_survey"].deep_copy(), 7, TERM, FilterType(None, None))
+        self.assert_same_with_timeline(survey_results, lambda report: report.get_results())
+
+    def test_events_are_in_order_by_student(self):
+        events = self.timeline.events
+        self.assertEqual(self.timeline.get_event_count(), sum((codes >= 0).sum() for codes in self.timeline.codes.values()))
+        self.assertTrue((np.diff(events["student"]) >= 0).all())
+        offsets = events["offsets"]
+        self.assertEqual(len(offsets), self.timeline.get_student_count() + 1)
+        code = 3
+        times = events["time"][offsets[code]:offsets[code + 1]]
+        self.assertTrue((events["student"][offsets[code]:offsets[code + 1]] == code).all())
+        self.assertTrue((np.diff(times[~np.isnat(times)].view(np.int64)) >= 0).all())
+
+    def test_scans_match_grouping_by_email(self):
+        appointments = self.datasets["appointments"].deep_copy()
+        appointments.filter_dates(*get_date_ranges(TERM))
+        df = appointments.get_df()
+        email_col, date_col = Timeline.get_email_col(appointments), appointments.get_col_name(appointments.Column.DATE)
+        walk_ins = df[df[appointments.get_col_name(appointments.Column.APPOINTMENT_TYPE)].str.contains("Walk-In")]
+        codes = self.timeline.get_codes(appointments, walk_ins.index)
+        by_email = walk_ins.groupby(email_col)[date_col]
+
+        counts = self.timeline.get_student_counts(appointments, walk_ins.index)
+        self.assertTrue(np.array_equal(counts[codes[codes >= 0]], by_email.transform('size')[codes >= 0].to_numpy()))
+        latest = self.timeline.get_latest(appointments, walk_ins[date_col])
+        self.assertTrue((walk_ins[date_col].to_numpy()[latest[codes[codes >= 0]]] == by_email.transform('max')[codes >= 0].to_numpy()).all())
+
+    def test_matches_are_the_same_as_merge_asof(self):
+        appointments, survey = self.datasets["appointments"].deep_copy(), self.datasets["walk_in_survey"].deep_copy()
+        appointments.sort_date()
+        survey.sort_date()
+        appointments.filter_dates(*get_date_ranges(TERM))
+        email_col = Timeline.get_email_col(appointments)
+        appointment_dates = pd.to_datetime(appointments.get_col(appointments.Column.DATE))
+        survey_dates = survey.get_col(survey.Column.DATE)
+        matches = self.timeline.match_latest([(survey, survey_dates)], (appointments, appointments.get_col(appointments.Column.DATE)), pd.Timedelta(days=7))
+        merged = pd.merge_asof(
+            pd.DataFrame({"date": survey_dates.to_numpy(), "email": survey.get_df()[Timeline.get_email_col(survey)].to_numpy()}),
+            pd.DataFrame({"date": appointment_dates.to_numpy(), "email": appointments.get_df()[email_col].to_numpy(), "match": np.arange(len(appointment_dates))}),
+            on="date", by="email", direction='backward', tolerance=pd.Timedelta(days=7)
+        )
+        self.assertTrue((matches >= 0).any())
+        self.assertTrue(np.array_equal(matches, merged["match"].fillna(-1).astype(np.int64).to_numpy()))
+
+    def test_relabeled_rows_have_no_codes(self):
+        # rows numbered again can't be found by their labels, so reports merge them by email instead
+        appointments = self.datasets["appointments"].deep_copy()
+        appointments.filter_dates((pd.Timestamp("2024-01-01").date(), pd.Timestamp("2024-03-01").date()))
+        appointments.reset_index()
+        self.assertIsNone(self.timeline.get_codes(appointments))
+        self.assertIsNone(self.timeline.get_student_counts(appointments, appointments.get_df().index))
+
+    def test_students_have_the_same_code_in_every_file(self):
+        appointments, survey = self.datasets["appointments"], self.datasets["walk_in_survey"]
+        appointment_emails = appointments.get_df()[Timeline.get_email_col(appointments)]
+        survey_emails = survey.get_df()[Timeline.get_email_col(survey)]
+        appointment_codes, survey_codes = self.timeline.get_codes(appointments), self.timeline.get_codes(survey)
+        self.assertTrue((appointment_codes[appointment_emails.isna().to_numpy()] == -1).all())
+        email = survey_emails.iloc[0]
+        self.assertEqual(set(appointment_codes[(appointment_emails == email).to_numpy()]), {survey_codes[0]})
+        self.assertEqual(self.timeline.students[survey_codes[0]], email)
+
+    def test_filtered_rows_have_the_codes_of_their_rows(self):
+        appointments = self.datasets["appointments"].deep_copy()
+        appointments.filter_dates((pd.Timestamp("2024-01-01").date(), pd.Timestamp("2024-03-01").date()))
+        codes = self.timeline.get_codes(appointments)
+        self.assertEqual(len(codes), len(appointments.get_df()))
+        self.assertTrue(np.array_equal(codes, self.timeline.get_codes(self.datasets["appointments"])[appointments.get_df().index]))
+
+    def test_timelines_are_saved_by_their_files(self):
+        with tempfile.TemporaryDirectory() as timeline_dir:
+            datasets = list(self.datasets.values())
+            # files are loaded with a fingerprint of their contents
+            for dataset in datasets:
+                dataset.fingerprint = dataset.get_id()
+            saved = get_timeline(datasets, timeline_dir)
+            self.assertEqual(len(os.listdir(timeline_dir)), 1)
+            loaded = get_timeline(datasets, timeline_dir)
+            self.assertEqual(len(os.listdir(timeline_dir)), 1)
+            self.assertTrue(np.array_equal(loaded.students, saved.students))
+            appointments = self.datasets["appointments"]
+            self.assertTrue(np.array_equal(loaded.get_codes(appointments), saved.get_codes(appointments)))
+
+    def test_saved_timelines_are_loaded(self):
+        with tempfile.TemporaryDirectory() as timeline_dir:
+            path = os.path.join(timeline_dir, "timeline.npz")
+            self.timeline.save(path)
+            loaded = Timeline.load(path)
+            self.assertEqual(loaded.kinds, self.timeline.kinds)
+            self.assertTrue(np.array_equal(loaded.students, self.timeline.students))
+            for name, values in self.timeline.events.items():
+                self.assertTrue(np.array_equal(loaded.events[name], values, equal_nan=name == "time"))
+            survey = self.datasets["walk_in_survey"]
+            self.assertTrue(np.array_equal(loaded.get_codes(survey), self.timeline.get_codes(survey)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from src.config.files_config import FilesConfig
+from src.utils.file_utils import get_most_recent_export
+from src.watcher import Watcher
+
+
+class FakeDriver():
+    def __init__(self, files: FilesConfig, error: Exception | None = None) -> None:
+        self.files = files
+        self.error = error
+        self.reruns: list[list[str]] = []
+
+    def run(self) -> None:
+        pass
+
+    def rerun(self, file_ids: list[str]) -> list[str]:
+        self.reruns.append(file_ids)
+        if self.error:
+            raise self.error
+        return [f"{file_id}_report" for file_id in file_ids]
+
+    def get_files_config(self) -> FilesConfig:
+        return self.files
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.write("survey_1.csv", "a\n1\n", 100)
+        self.files = FilesConfig()
+        self.files.config = {"files": [{"id": "survey", "dir": self.dir.name, "must_contain": "survey"}]}
+        self.files.exports = {"survey": get_most_recent_export(self.dir.name, "survey", ".csv")}
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def write(self, name: str, contents: str, modified: float) -> None:
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w') as file:
+            file.write(contents)
+        os.utime(path, (modified, modified))
+
+    def test_most_recent_export(self):
+        self.write("survey_2.csv", "a\n1\n2\n", 200)
+        self.write("survey_3.txt", "a\n", 300)
+        self.assertEqual(get_most_recent_export(self.dir.name, "survey", ".csv"), ("survey_2.csv", 200, 6))
+        self.assertIsNone(get_most_recent_export(self.dir.name, "referrals", ".csv"))
+
+    def test_nothing_runs_without_a_new_export(self):
+        driver = FakeDriver(self.files)
+        self.assertEqual(Watcher(driver, 1).check(), [])
+        self.assertEqual(driver.reruns, [])
+
+    def test_new_export_runs_once_it_stops_changing(self):
+        driver = FakeDriver(self.files)
+        watcher = Watcher(driver, 1)
+        self.write("survey_2.csv", "a\n1\n", 200)
+        self.assertEqual(watcher.check(), [])
+        self.write("survey_2.csv", "a\n1\n2\n", 200)
+        self.assertEqual(watcher.check(), [])
+        self.assertEqual(watcher.check(), ["survey_report"])
+        self.assertEqual(driver.reruns, [["survey"]])
+
+    def test_failed_export_is_not_tried_again(self):
+        driver = FakeDriver(self.files, ValueError("bad export"))
+        watcher = Watcher(driver, 1)
+        self.write("survey_2.csv", "a\n1\n", 200)
+        watcher.check()
+        self.assertEqual(watcher.check(), [])
+        watcher.check()
+        watcher.check()
+        self.assertEqual(driver.reruns, [["survey"]])
+
+    def test_invalid_interval(self):
+        with self.assertRaises(ValueError):
+            Watcher(FakeDriver(self.files), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()